@@ -1754,13 +1754,24 @@ class WindowsFirewallManager(QMainWindow):
                 merge = (reply == QMessageBox.Yes)
                 
                 # Call the firewall manager to handle the import
-                if self.firewall.import_rules(file_path, merge=merge):
+                result = self.firewall.import_rules(file_path, merge=merge)
+                if result:
                     self.load_rules()
                     QMessageBox.information(
                         self,
                         self.translations[self.current_language].get('success', 'Success'),
                         self.translations[self.current_language].get('import_success', 'Rules imported successfully')
                     )
+                elif result.saved and result.applied:
+                    # Partial import: the applied rules are kept
+                    self.load_rules()
+                    QMessageBox.warning(
+                        self,
+                        self.translations[self.current_language].get('warning', 'Warning'),
+                        self.translations[self.current_language].get(
+                            'import_partial', 'Imported {applied} of {total} rules; {failed} could not be applied'
+                        ).format(applied=result.applied, total=result.applied + result.failed, failed=result.failed)
+                    )
                 else:
                     raise Exception("Failed to import rules")
                     
@@ -21,8 +21,8 @@ class MonitoringTab(QWidget):
         # Chart state
         self._chart_time = 0
         self._chart_window = 60  # last N points
-        self._last_bytes = {"bytes_recv": None, "bytes_sent": None}
-        self._last_ts = None
+        # Connections table: connection key -> row
+        self._connection_rows = {}
         self.setup_ui()
         self.setup_connections()
         
@@ -196,9 +196,17 @@ class MonitoringTab(QWidget):
         country_layout.addWidget(self.blocked_country_list)
         country_group.setLayout(country_layout)
 
+        # Port knocking group (sources that opened a port, read from the kernel)
+        knock_group = QGroupBox("Port Knocking")
+        knock_layout = QVBoxLayout()
+        self.knock_client_list = QListWidget()
+        knock_layout.addWidget(self.knock_client_list)
+        knock_group.setLayout(knock_layout)
+
         # Add groups
         layout.addWidget(ip_group)
         layout.addWidget(country_group)
+        layout.addWidget(knock_group)
 
         return tab
     
@@ -419,11 +427,13 @@ class MonitoringTab(QWidget):
         # Connect to firewall manager signals if available
         if self.firewall and hasattr(self.firewall, 'signals'):
             self.firewall.signals.network_stats_updated.connect(self.update_network_stats)
-            self.firewall.signals.connection_detected.connect(self.add_connection)
+            self.firewall.signals.connections_changed.connect(self.apply_connection_changes)
             self.firewall.signals.intrusion_detected.connect(self.add_alert)
             self.firewall.signals.vpn_status_changed.connect(self.update_vpn_status)
             if hasattr(self.firewall.signals, 'vpn_log_line'):
                 self.firewall.signals.vpn_log_line.connect(self.vpn_log.append)
+            if hasattr(self.firewall.signals, 'ips_unblocked'):
+                self.firewall.signals.ips_unblocked.connect(self.on_ips_unblocked)
         
         # Connect UI controls
         self.refresh_btn.clicked.connect(self.refresh_connections)
@@ -478,42 +488,29 @@ class MonitoringTab(QWidget):
             self.stats_table.setItem(i, 2, QTableWidgetItem(f"{data['bytes_sent'] / (1024*1024):.2f} MB"))
             self.stats_table.setItem(i, 3, QTableWidgetItem(str(data.get('connections', 0))))
 
-        # Compute bandwidth and update charts (Mbps)
+        # Update charts (Mbps) from the rates computed by the network monitor
         sel = self.interface_combo.currentText()
-        sum_recv = 0
-        sum_sent = 0
         if sel and sel != "All Interfaces" and sel in stats['interfaces']:
-            sum_recv = stats['interfaces'][sel].get('bytes_recv', 0)
-            sum_sent = stats['interfaces'][sel].get('bytes_sent', 0)
+            rates = stats['interfaces'][sel].get('rates', {})
         else:
-            for d in stats['interfaces'].values():
-                sum_recv += d.get('bytes_recv', 0)
-                sum_sent += d.get('bytes_sent', 0)
-
-        now = datetime.now().timestamp()
-        rate_down_mbps = 0.0
-        rate_up_mbps = 0.0
-        if self._last_bytes['bytes_recv'] is not None and self._last_ts is not None and now > self._last_ts:
-            delta_t = now - self._last_ts
-            delta_down = max(0, sum_recv - self._last_bytes['bytes_recv'])
-            delta_up = max(0, sum_sent - self._last_bytes['bytes_sent'])
-            # bytes to Mbps
-            rate_down_mbps = (delta_down * 8.0) / (1_000_000.0 * delta_t)
-            rate_up_mbps = (delta_up * 8.0) / (1_000_000.0 * delta_t)
-
-        self._last_bytes['bytes_recv'] = sum_recv
-        self._last_bytes['bytes_sent'] = sum_sent
-        self._last_ts = now
-
-        self._append_chart_points(rate_down_mbps, rate_up_mbps)
+            rates = stats.get('total_rates', {})
+        if rates:
+            self._append_chart_points(self._to_mbps(rates.get('bytes_recv', 0.0)),
+                                      self._to_mbps(rates.get('bytes_sent', 0.0)))
     
     @Slot(dict)
     def add_connection(self, conn):
         """Add a new connection to the connections table"""
         row = self.connections_table.rowCount()
         self.connections_table.insertRow(row)
-        
-        self.connections_table.setItem(row, 0, QTableWidgetItem(conn.get('protocol', '')))
+        self._set_connection_row(row, conn)
+        self._connection_rows[conn.get('key')] = row
+
+    def _set_connection_row(self, row, conn):
+        """Fill a connections table row"""
+        protocol_item = QTableWidgetItem(conn.get('protocol', ''))
+        protocol_item.setData(Qt.ItemDataRole.UserRole, conn.get('key'))
+        self.connections_table.setItem(row, 0, protocol_item)
         self.connections_table.setItem(row, 1, QTableWidgetItem(conn.get('local_addr', '')))
         self.connections_table.setItem(row, 2, QTableWidgetItem(conn.get('remote_addr', '')))
         
@@ -524,9 +521,37 @@ class MonitoringTab(QWidget):
         
         self.connections_table.setItem(row, 4, QTableWidgetItem(conn.get('process_name', '')))
         self.connections_table.setItem(row, 5, QTableWidgetItem(str(conn.get('pid', ''))))
-        
-        # Auto-scroll to bottom
-        self.connections_table.scrollToBottom()
+
+    @Slot(dict)
+    def apply_connection_changes(self, changes):
+        """Update the connections table in place from a batch of added/updated/removed connections"""
+        table = self.connections_table
+        table.setUpdatesEnabled(False)
+        try:
+            removed_rows = sorted(
+                (self._connection_rows.pop(key) for key in changes.get('removed', []) if key in self._connection_rows),
+                reverse=True
+            )
+            for row in removed_rows:
+                table.removeRow(row)
+            if removed_rows:
+                # Rows below the removed ones moved up
+                self._connection_rows = {
+                    table.item(row, 0).data(Qt.ItemDataRole.UserRole): row for row in range(table.rowCount())
+                }
+            for conn in changes.get('updated', []):
+                row = self._connection_rows.get(conn.get('key'))
+                if row is None:
+                    self.add_connection(conn)
+                else:
+                    self._set_connection_row(row, conn)
+            for conn in changes.get('added', []):
+                if conn.get('key') in self._connection_rows:
+                    self._set_connection_row(self._connection_rows[conn.get('key')], conn)
+                else:
+                    self.add_connection(conn)
+        finally:
+            table.setUpdatesEnabled(True)
     
     @Slot(dict)
     def add_alert(self, alert):
@@ -599,6 +624,7 @@ class MonitoringTab(QWidget):
         """Refresh the connections table"""
         if self.firewall:
             self.connections_table.setRowCount(0)  # Clear existing rows
+            self._connection_rows.clear()
             connections = self.firewall.get_network_connections()
             for conn in connections:
                 self.add_connection(conn)
@@ -675,16 +701,24 @@ class MonitoringTab(QWidget):
         self.firewall.set_split_tunneling(name, mode, routes)
 
     # ----- Charts helpers -----
+    @staticmethod
+    def _to_mbps(bytes_per_sec: float) -> float:
+        return bytes_per_sec * 8.0 / 1_000_000.0
+
     def _on_interface_changed(self, idx):
-        # Reset counters and clear series when switching interface
-        self._last_bytes = {"bytes_recv": None, "bytes_sent": None}
-        self._last_ts = None
+        # Clear series and show the recorded history of the new interface
         self._chart_time = 0
         self.series_down.clear()
         self.series_up.clear()
         # reset axes
         self.axis_x_down.setRange(0, self._chart_window)
         self.axis_x_up.setRange(0, self._chart_window)
+        if not self.firewall:
+            return
+        iface = self.interface_combo.itemText(idx) if idx > 0 else None
+        history = self.firewall.get_interface_rate_history(iface, self._chart_window)
+        for down, up in zip(history.get('bytes_recv', []), history.get('bytes_sent', [])):
+            self._append_chart_points(self._to_mbps(down), self._to_mbps(up))
 
     def _append_chart_points(self, down_mbps: float, up_mbps: float):
         self._chart_time += 1
@@ -718,6 +752,17 @@ class MonitoringTab(QWidget):
             item = QListWidgetItem(cc)
             item.setData(Qt.ItemDataRole.UserRole, cc)
             self.blocked_country_list.addItem(item)
+        # Knocked sources
+        self.knock_client_list.clear()
+        if hasattr(self.firewall, 'get_knock_clients'):
+            for service, clients in sorted(self.firewall.get_knock_clients().items()):
+                for ip, expires in sorted(clients.items()):
+                    left = f" ({expires}s left)" if expires is not None else ""
+                    self.knock_client_list.addItem(QListWidgetItem(f"{service}: {ip}{left}"))
+
+    def on_ips_unblocked(self, ips):
+        """Drop expired blocks from the list"""
+        self.refresh_security()
 
     def block_ip(self):
         if not self.firewall:
@@ -11,6 +11,7 @@ from firewall.script.logger import get_logger, FirewallLogger
 from firewall.script.security_utils import (
     EnhancedSecurity,
     SecurityAction,
+    SECURITY_ACTIONS,
     RateLimitConfig,
     RateLimiter,
     IPReputationChecker,
@@ -25,6 +26,7 @@ __all__ = [
     'FirewallLogger',
     'EnhancedSecurity',
     'SecurityAction',
+    'SECURITY_ACTIONS',
     'RateLimitConfig',
     'RateLimiter',
     'IPReputationChecker',
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Append-only journal for configuration changes.
+
+Each rule or block list change is written as one compact JSON line next to
+the configuration snapshot, so a mutation costs a few hundred bytes instead
+of a rewrite of the whole file. The journal is replayed on top of the
+snapshot when the configuration is loaded and emptied every time a new
+snapshot is written (compaction).
+
+Records describe the resulting state rather than the operation, so
+replaying a record twice (e.g. after a crash between writing the snapshot
+and truncating the journal) has no further effect:
+
+- ``{"op": "put", "rule": {...}}``: rule added or changed
+- ``{"op": "del", "id": "..."}``: rule deleted
+- ``{"op": "block", "ip": "...", "until": <epoch seconds>}``
+- ``{"op": "unblock", "ip": "..."}``
+- ``{"op": "block_country", "country": "XX"}``
+- ``{"op": "unblock_country", "country": "XX"}``
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator
+
+from firewall.script.logger import get_logger
+
+
+class ConfigJournal:
+    """Append-only JSON-lines journal of configuration changes"""
+
+    def __init__(self, path: str, sync: bool = True):
+        """
+        Args:
+            path: Path of the journal file
+            sync: fsync after every append (durable across power loss)
+        """
+        self.path = path
+        self.sync = sync
+        self.records = 0
+        self.logger = get_logger("firewall.journal")
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, 'ab')
+        return self._file
+
+    def append(self, records: Iterable[Dict[str, Any]]) -> bool:
+        """
+        Append records with a single write.
+
+        Args:
+            records: Records in one of the formats listed in the module docstring
+
+        Returns:
+            bool: True if the records were written, False otherwise
+        """
+        data = b''.join(
+            json.dumps(record, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n'
+            for record in records
+        )
+        if not data:
+            return True
+        try:
+            with self._lock:
+                f = self._open()
+                f.write(data)
+                f.flush()
+                if self.sync:
+                    os.fsync(f.fileno())
+                self.records += data.count(b'\n')
+            return True
+        except OSError as e:
+            self.logger.log_error(f"Error writing journal {self.path}: {e}")
+            return False
+
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the journaled records in write order.
+
+        Reading stops at the first incomplete or corrupt line, which can
+        only be the tail of an append interrupted by a crash. That tail is
+        cut off the file, so later appends start on a fresh line.
+        """
+        self.records = 0
+        if not os.path.exists(self.path):
+            return
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                except ValueError:
+                    self.logger.warning(f"Discarding truncated journal tail in {self.path}")
+                    self._discard_tail(offset)
+                    return
+                offset += len(line)
+                self.records += 1
+                yield record
+
+    def _discard_tail(self, offset: int):
+        """Cut the journal at offset (end of the last complete record)"""
+        try:
+            with self._lock:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                with open(self.path, 'r+b') as f:
+                    f.truncate(offset)
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError as e:
+            self.logger.log_error(f"Error truncating journal {self.path}: {e}")
+
+    def truncate(self) -> bool:
+        """
+        Empty the journal once its records are part of a snapshot.
+
+        Returns:
+            bool: True if the journal was emptied, False otherwise
+        """
+        try:
+            with self._lock:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                if os.path.exists(self.path):
+                    with open(self.path, 'wb') as f:
+                        os.fsync(f.fileno())
+                self.records = 0
+            return True
+        except OSError as e:
+            self.logger.log_error(f"Error truncating journal {self.path}: {e}")
+            return False
+
+    def close(self):
+        """Close the journal file"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Columnar snapshot of the connection table.
+
+A snapshot stores every socket of one monitor tick in parallel typed arrays
+(socket type, family, packed local/remote address and port, status code,
+pid, interned process name, inode) instead of one object and two formatted
+address strings per socket. Rows are read through lazy ConnectionRow views
+that have the attributes of ConnectionInfo; the address strings are only
+built when a view is formatted for display.
+
+Addresses are packed as two 64-bit halves: IPv4 addresses use the low half
+only (the family column tells them apart from IPv6). Columns can be read as
+NumPy arrays without copying when NumPy is installed.
+"""
+
+import socket
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:  # pragma: no cover - optional dependency
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - runtime fallback
+    np = None  # type: ignore
+
+# Connection states (psutil names); the code is the index
+STATUS_NAMES = (
+    'NONE', 'ESTABLISHED', 'SYN_SENT', 'SYN_RECV', 'FIN_WAIT1', 'FIN_WAIT2',
+    'TIME_WAIT', 'CLOSE', 'CLOSE_WAIT', 'LAST_ACK', 'LISTEN', 'CLOSING',
+    'NEW_SYN_RECV', 'DELETE_TCB', 'IDLE', 'BOUND',
+)
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+_MASK64 = (1 << 64) - 1
+# IPv4 addresses are exchanged as IPv4-mapped IPv6 integers (::ffff:a.b.c.d),
+# so packed IPv4 and IPv6 addresses never collide
+IPV4_MAPPED_PREFIX = 0xFFFF << 32
+# Bound on the address packing cache, cleared when full
+MAX_PACKED_ADDRESSES = 65536
+
+
+@lru_cache(maxsize=65536)
+def _format_ip(family: int, hi: int, lo: int) -> str:
+    if family == socket.AF_INET:
+        return socket.inet_ntoa(lo.to_bytes(4, 'big'))
+    return socket.inet_ntop(socket.AF_INET6, (hi << 64 | lo).to_bytes(16, 'big'))
+
+
+@lru_cache(maxsize=None)
+def _protocol_name(sock_type: int) -> str:
+    try:
+        return socket.SocketKind(sock_type).name.lower()
+    except ValueError:
+        return str(sock_type)
+
+
+class NameTable:
+    """Interned strings (process names) referenced by index; index 0 is ''"""
+    __slots__ = ('names', '_index')
+
+    def __init__(self):
+        self.names: List[str] = ['']
+        self._index: Dict[str, int] = {'': 0}
+
+    def intern(self, name: str) -> int:
+        index = self._index.get(name)
+        if index is None:
+            index = self._index[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def __getitem__(self, index: int) -> str:
+        return self.names[index]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class AddressPacker:
+    """Convert address strings to (hi, lo) 64-bit halves, caching the result"""
+
+    def __init__(self):
+        self._cache: Dict[str, Tuple[int, int]] = {}
+
+    def __call__(self, ip: str) -> Tuple[int, int]:
+        packed = self._cache.get(ip)
+        if packed is None:
+            if ':' in ip:
+                value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip.split('%', 1)[0]), 'big')
+                packed = (value >> 64, value & _MASK64)
+            else:
+                packed = (0, int.from_bytes(socket.inet_aton(ip), 'big'))
+            if len(self._cache) >= MAX_PACKED_ADDRESSES:
+                self._cache.clear()
+            self._cache[ip] = packed
+        return packed
+
+
+class ConnectionSnapshot:
+    """The sockets of one monitor tick, stored column by column"""
+
+    # Column name -> array typecode
+    COLUMNS = (
+        ('type', 'B'),
+        ('family', 'B'),
+        ('local_hi', 'Q'),
+        ('local_lo', 'Q'),
+        ('local_port', 'H'),
+        ('remote_hi', 'Q'),
+        ('remote_lo', 'Q'),
+        ('remote_port', 'H'),
+        ('status', 'B'),
+        ('pid', 'I'),
+        ('name', 'I'),
+        ('inode', 'Q'),
+    )
+
+    def __init__(self, names: NameTable, timestamp: float = 0.0):
+        """
+        Args:
+            names: Process name table shared by consecutive snapshots
+            timestamp: Time of the tick (epoch seconds)
+        """
+        self.names = names
+        self.timestamp = timestamp
+        self.type = array('B')
+        self.family = array('B')
+        self.local_hi = array('Q')
+        self.local_lo = array('Q')
+        self.local_port = array('H')
+        self.remote_hi = array('Q')
+        self.remote_lo = array('Q')
+        self.remote_port = array('H')
+        self.status = array('B')
+        self.pid = array('I')
+        self.name = array('I')
+        self.inode = array('Q')
+
+    def append(self, sock_type: int, family: int, local: Tuple[int, int], local_port: int,
+               remote: Tuple[int, int], remote_port: int, status: int, pid: int, name: int, inode: int):
+        """Add a row; addresses are (hi, lo) pairs, status and name are codes"""
+        self.type.append(sock_type)
+        self.family.append(family)
+        self.local_hi.append(local[0])
+        self.local_lo.append(local[1])
+        self.local_port.append(local_port)
+        self.remote_hi.append(remote[0])
+        self.remote_lo.append(remote[1])
+        self.remote_port.append(remote_port)
+        self.status.append(status)
+        self.pid.append(pid)
+        self.name.append(name)
+        self.inode.append(inode)
+
+    def __len__(self) -> int:
+        return len(self.type)
+
+    def __getitem__(self, index: int) -> 'ConnectionRow':
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return ConnectionRow(self, index)
+
+    def __iter__(self) -> Iterator['ConnectionRow']:
+        for index in range(len(self)):
+            yield ConnectionRow(self, index)
+
+    def column(self, name: str):
+        """Return a column as a NumPy array (a view, no copy) or as the array itself"""
+        values = getattr(self, name)
+        if np is not None:
+            return np.frombuffer(values, dtype=np.dtype(values.typecode)) if len(values) else np.zeros(0, values.typecode)
+        return values
+
+    def keys(self) -> Iterator[Tuple[int, ...]]:
+        """Identity of each row: socket type, family, local and remote address and port"""
+        return zip(self.type, self.family, self.local_hi, self.local_lo, self.local_port,
+                   self.remote_hi, self.remote_lo, self.remote_port)
+
+    def remote_addresses(self, rows: Optional[Sequence[int]] = None) -> List[int]:
+        """
+        Remote addresses as 128-bit integers (IPv4 as ::ffff:a.b.c.d), e.g.
+        for EnhancedSecurity.check_security_batch
+
+        Args:
+            rows: Row indices (defaults to every row)
+        """
+        family, hi, lo = self.family, self.remote_hi, self.remote_lo
+        if rows is None:
+            rows = range(len(self))
+        return [IPV4_MAPPED_PREFIX | lo[i] if family[i] == socket.AF_INET else hi[i] << 64 | lo[i]
+                for i in rows]
+
+    def inbound_rows(self, rows: Optional[Sequence[int]] = None) -> List[int]:
+        """
+        Rows of connections accepted from a remote peer: the local port has
+        a listening socket of the same type and the peer is not loopback
+
+        Args:
+            rows: Row indices (defaults to every row)
+        """
+        listen = STATUS_CODES['LISTEN']
+        status, sock_type, local_port = self.status, self.type, self.local_port
+        listening = {(sock_type[i], local_port[i]) for i in range(len(self)) if status[i] == listen}
+        if not listening:
+            return []
+        if rows is None:
+            rows = range(len(self))
+        family, hi, lo, remote_port = self.family, self.remote_hi, self.remote_lo, self.remote_port
+        inbound = []
+        for i in rows:
+            if status[i] == listen or not remote_port[i] or (sock_type[i], local_port[i]) not in listening:
+                continue
+            if family[i] == socket.AF_INET:
+                if lo[i] >> 24 == 127:
+                    continue
+            elif hi[i] == 0 and (lo[i] == 1 or lo[i] >> 32 == 0xFFFF and (lo[i] >> 24) & 0xFF == 127):
+                # ::1 and IPv4-mapped loopback
+                continue
+            inbound.append(i)
+        return inbound
+
+    def set_owner(self, index: int, pid: int, name: str):
+        """Record the process owning a row"""
+        self.pid[index] = pid
+        self.name[index] = self.names.intern(name)
+
+    def format_address(self, index: int, remote: bool = False) -> str:
+        """Format the local or remote address of a row as ``ip:port`` ('' for no peer)"""
+        if remote:
+            hi, lo, port = self.remote_hi[index], self.remote_lo[index], self.remote_port[index]
+            if not (hi or lo or port):
+                return ""
+        else:
+            hi, lo, port = self.local_hi[index], self.local_lo[index], self.local_port[index]
+        return f"{_format_ip(self.family[index], hi, lo)}:{port}"
+
+
+class ConnectionRow:
+    """Lazy view of one snapshot row with the attributes of ConnectionInfo"""
+    __slots__ = ('snapshot', 'index')
+
+    def __init__(self, snapshot: ConnectionSnapshot, index: int):
+        self.snapshot = snapshot
+        self.index = index
+
+    @property
+    def local_addr(self) -> str:
+        return self.snapshot.format_address(self.index)
+
+    @property
+    def remote_addr(self) -> str:
+        return self.snapshot.format_address(self.index, remote=True)
+
+    @property
+    def remote_port(self) -> int:
+        return self.snapshot.remote_port[self.index]
+
+    @property
+    def status(self) -> str:
+        return STATUS_NAMES[self.snapshot.status[self.index]]
+
+    @property
+    def protocol(self) -> str:
+        return _protocol_name(self.snapshot.type[self.index])
+
+    @property
+    def pid(self) -> int:
+        return self.snapshot.pid[self.index]
+
+    @pid.setter
+    def pid(self, value: int):
+        self.snapshot.pid[self.index] = value or 0
+
+    @property
+    def process_name(self) -> str:
+        return self.snapshot.names[self.snapshot.name[self.index]]
+
+    @process_name.setter
+    def process_name(self, value: str):
+        self.snapshot.name[self.index] = self.snapshot.names.intern(value or "")
+
+    @property
+    def inode(self) -> int:
+        return self.snapshot.inode[self.index]
+
+    @property
+    def timestamp(self) -> float:
+        return self.snapshot.timestamp
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        """Identity of the socket: (protocol, local address, remote address)"""
+        return (self.protocol, self.local_addr, self.remote_addr)
+
+    def __repr__(self) -> str:
+        return (f"ConnectionRow({self.protocol} {self.local_addr} -> {self.remote_addr or '-'} "
+                f"{self.status} pid={self.pid} {self.process_name!r})")
@@ -3,10 +3,13 @@
 
 import os
 import json
+import atexit
 import sys
 import uuid
 import platform
+import tempfile
 import threading
+import time
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Union, Tuple, Callable
 from PySide6.QtWidgets import (
@@ -19,12 +22,17 @@ from firewall.script.logger import get_logger
 
 # Import nftables manager
 from firewall.script.nftables_manager import NFTablesManager
+from firewall.script.config_journal import ConfigJournal
+from firewall.script.rule_diff import compute_rule_diff, make_rule_comment
+from firewall.script.rule_import import ImportResult, iter_rule_chunks
+from firewall.script.rule_matcher import RuleMatcher, parse_networks, parse_port_spec, rule_family
 from firewall.script.network_monitor import NetworkMonitor, IntrusionDetectionSystem
 from firewall.script.network_zones import ZoneManager, VPNManager, NetworkZone
 from firewall.script.win_firewall import WindowsFirewallController
 from .security_utils import (
     EnhancedSecurity,
     SecurityAction,
+    SECURITY_ACTIONS,
     RateLimitConfig,
     RateLimiter,
     IPReputationChecker,
@@ -40,7 +48,15 @@ class FirewallConfig:
     configuration from/to JSON files.
     """
 
-    def __init__(self, config_path=None, translations=None):
+    # Seconds to wait after the first unsaved change before writing, so
+    # bursts of changes are coalesced into one write
+    SAVE_DEBOUNCE = 0.5
+    
+    # Number of journal records after which the journal is compacted
+    # into a new snapshot
+    JOURNAL_COMPACT_RECORDS = 1000
+
+    def __init__(self, config_path=None, translations=None, save_debounce=None):
         """
         Initialize the FirewallConfig
         
@@ -48,6 +64,8 @@ class FirewallConfig:
             config_path (str, optional): Path to the configuration file.
                 Defaults to "config/firewall_config.json".
             translations (dict, optional): Dictionary of translations for the UI.
+            save_debounce (float, optional): Save coalescing window in seconds.
+                Defaults to SAVE_DEBOUNCE; 0 writes on every save.
         """
         if config_path is None:
             # Default to config directory
@@ -62,8 +80,34 @@ class FirewallConfig:
         # Initialize logger
         self.logger = get_logger("firewall.config")
         
-        # Load configuration
+        # Rule store (id -> rule, in rule order) and its version,
+        # bumped on every rule mutation
+        self._rules = {}
+        self.version = 0
+        self._rules_view = None
+        
+        # Debounced persistence: mutations mark the config dirty and a
+        # timer writes it once the debounce window has passed
+        self.save_debounce = self.SAVE_DEBOUNCE if save_debounce is None else save_debounce
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._save_timer = None
+        atexit.register(self.flush)
+        
+        # Block list state (IP -> unblock time, blocked country codes),
+        # persisted with the rules
+        self._blocked_ips = {}
+        self._blocked_countries = set()
+        
+        # Rule and block list changes are appended to a journal next to
+        # the snapshot and compacted into it by flush()
+        self.journal = ConfigJournal(os.path.splitext(self.config_path)[0] + ".journal")
+        
+        # Load and validate configuration once, then replay the journal
         self.config = self.load_config()
+        changed = self._normalize_config()
+        if self._replay_journal() or changed:
+            self.save_config()
         
         # Update current_language from config if available
         if 'language' in self.config.get('settings', {}):
@@ -99,18 +143,90 @@ class FirewallConfig:
         """
         Save configuration to JSON file
         
+        Saves to the default path are coalesced: the configuration is
+        marked dirty and written ``save_debounce`` seconds after the first
+        unsaved change, together with every change made in that window
+        (later saves do not push the write back). Use flush() to write
+        pending changes immediately (e.g. on shutdown).
+        
         Args:
             file_path (str, optional): Path to save the configuration.
                 If None, uses the default config path.
                 
         Returns:
-            bool: True if save was successful, False otherwise
+            bool: True if save was successful (or scheduled), False otherwise
+        """
+        if file_path is not None or self.save_debounce <= 0:
+            return self._write_config(file_path or self.config_path)
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_debounce, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+        return True
+
+    def flush(self):
+        """
+        Write pending configuration changes now
+        
+        Returns:
+            bool: True if nothing was pending or the write succeeded
         """
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty and not self.journal.records:
+                return True
+            self._dirty = False
+            if self._write_config(self.config_path):
+                return True
+            # Keep the changes pending so a later flush can retry
+            self._dirty = True
+            return False
+
+    def _write_config(self, path):
+        """
+        Atomically write the configuration to a file
+        
+        The JSON is written to a temporary file in the same directory,
+        fsync'ed and renamed over the target, so a crash mid-write leaves
+        either the old or the new file, never a truncated one.
+        
+        Args:
+            path (str): Destination path
+            
+        Returns:
+            bool: True if the write succeeded, False otherwise
+        """
+        tmp_path = None
+        is_snapshot = os.path.abspath(path) == os.path.abspath(self.config_path)
+        # Held for the whole write so no change lands in the journal
+        # between serializing the snapshot and truncating the journal
+        self._lock.acquire()
         try:
-            path = file_path or self.config_path
-            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4)
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._sync_rules_to_config()
+            self._sync_blocklist_to_config()
+            data = json.dumps(self.config, indent=4)
+            fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            tmp_path = None
+            # Persist the rename itself (not supported on Windows)
+            if hasattr(os, 'O_DIRECTORY'):
+                dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            if is_snapshot:
+                self.journal.truncate()
             return True
         except Exception as e:
             error_msg = f"Error saving config to {path}: {str(e)}"
@@ -119,6 +235,13 @@ class FirewallConfig:
             else:
                 print(error_msg)  # Fallback if logger not available
             return False
+        finally:
+            self._lock.release()
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
 
     def get_default_config(self):
         """Get default configuration"""
@@ -128,7 +251,18 @@ class FirewallConfig:
                 "block_inbound": True,
                 "block_outbound": False,
                 "default_action": "block",
-                "log_level": "info"
+                "log_level": "info",
+                "kernel_blocklist": False,
+                "geoip_db_path": "",
+                "geoip_precompile": False,
+                "geoip_mode": "mmap",
+                "connection_backend": "psutil",
+                "port_knocking": {
+                    "kernel": False,
+                    "window": 10,
+                    "open_timeout": 30,
+                    "services": {}
+                }
             },
             "profiles": {
                 "default": {
@@ -139,135 +273,356 @@ class FirewallConfig:
             "current_profile": "default"
         }
 
-    def get_rules(self):
-        """Get current firewall rules"""
-        try:
-            # Debug: Log the type of self and available attributes
-            self.logger.log_debug(f"get_rules called. Type of self: {type(self)}")
-            self.logger.log_debug(f"Available attributes: {dir(self)}")
-            
-            # Ensure config has the right structure
-            if not hasattr(self, 'config') or not isinstance(self.config, dict):
-                self.logger.log_debug("Config not found or not a dict, getting default config")
-                self.config = self.get_default_config()
-                return []
-            
-            # Make a copy of the config to avoid modifying it directly
-            config = self.config.copy()
-            needs_save = False
+    # Fields every rule must carry, with their default values
+    RULE_DEFAULTS = {
+        'name': 'Unnamed Rule',
+        'protocol': 'TCP',
+        'port': '',
+        'direction': 'IN',
+        'action': 'ALLOW',
+        'enabled': True
+    }
+
+    def _normalize_rule(self, rule):
+        """
+        Return a copy of a rule with every required field present
+        
+        Args:
+            rule (dict): The rule to normalize
             
-            # Handle old config format where rules are directly under firewall_rules
-            if "firewall_rules" in config and isinstance(config["firewall_rules"], list):
-                self.logger.log_debug("Found old format config, migrating to new format")
-                # Migrate old format to new format
-                config["profiles"] = {
-                    "default": {
-                        "rules": config["firewall_rules"]
-                    }
+        Returns:
+            dict: The normalized rule
+        """
+        normalized = dict(rule)
+        if 'id' not in normalized:
+            normalized['id'] = str(uuid.uuid4())
+        for field, default_value in self.RULE_DEFAULTS.items():
+            normalized.setdefault(field, default_value)
+        return normalized
+
+    def _normalize_config(self):
+        """
+        Validate and normalize the loaded configuration once
+        
+        Migrates the old ``firewall_rules`` layout, makes sure the current
+        profile has a rules list and fills missing rule fields.
+        
+        Returns:
+            bool: True if anything had to be changed
+        """
+        changed = False
+        if not isinstance(self.config, dict):
+            self.config = self.get_default_config()
+            changed = True
+        config = self.config
+
+        # Handle old config format where rules are directly under firewall_rules
+        if "firewall_rules" in config and isinstance(config["firewall_rules"], list):
+            self.logger.log_debug("Found old format config, migrating to new format")
+            config["profiles"] = {"default": {"rules": config.pop("firewall_rules")}}
+            config["current_profile"] = "default"
+            changed = True
+
+        # Ensure profiles exists and is a dictionary
+        if not isinstance(config.get("profiles"), dict):
+            config["profiles"] = {"default": {"rules": []}}
+            changed = True
+
+        current_profile = config.setdefault("current_profile", "default")
+        if not isinstance(config["profiles"].get(current_profile), dict):
+            config["profiles"][current_profile] = {"rules": []}
+            changed = True
+
+        profile = config["profiles"][current_profile]
+        rules = profile.get("rules")
+        if not isinstance(rules, list):
+            rules = []
+            changed = True
+
+        # Build the id-indexed rule store (insertion ordered, O(1) by id)
+        self._rules = {}
+        for rule in rules:
+            if not isinstance(rule, dict):
+                self.logger.log_debug("Found non-dict rule, removing")
+                changed = True
+                continue
+            fixed = self._normalize_rule(rule)
+            if fixed['id'] in self._rules:
+                fixed['id'] = str(uuid.uuid4())
+            changed = changed or fixed != rule
+            self._rules[fixed['id']] = fixed
+        self._sync_rules_to_config()
+
+        # Load the persisted block list, dropping blocks that already expired
+        blocklist = config.get("blocklist")
+        if isinstance(blocklist, dict):
+            now = time.time()
+            ips = blocklist.get("ips")
+            if isinstance(ips, dict):
+                self._blocked_ips = {
+                    ip: float(until) for ip, until in ips.items()
+                    if isinstance(until, (int, float)) and until > now
                 }
-                config["current_profile"] = "default"
-                # Remove the old key to avoid confusion
-                del config["firewall_rules"]
-                needs_save = True
-                
-            # Ensure profiles exists and is a dictionary
-            if "profiles" not in config or not isinstance(config["profiles"], dict):
-                self.logger.log_debug("Profiles not found or not a dict, initializing")
-                config["profiles"] = {"default": {"rules": []}}
-                needs_save = True
-                
-            # Get current profile, default to 'default' if not set
-            current_profile = config.get("current_profile", "default")
-            self.logger.log_debug(f"Current profile: {current_profile}")
+            countries = blocklist.get("countries")
+            if isinstance(countries, list):
+                self._blocked_countries = {str(code).upper() for code in countries}
+
+        self._mark_rules_changed()
+        return changed
+
+    def _mark_rules_changed(self):
+        """Bump the rule store version and drop the cached rules view"""
+        self.version += 1
+        self._rules_view = None
+
+    def _sync_rules_to_config(self):
+        """Write the rule store back into the current profile of the config dict"""
+        self.config["profiles"][self.config["current_profile"]]["rules"] = list(self._rules.values())
+
+    def _sync_blocklist_to_config(self):
+        """Write the unexpired block list back into the config dict"""
+        now = time.time()
+        self._blocked_ips = {ip: until for ip, until in self._blocked_ips.items() if until > now}
+        self.config["blocklist"] = {
+            "ips": dict(self._blocked_ips),
+            "countries": sorted(self._blocked_countries)
+        }
+
+    def _apply_record(self, record):
+        """
+        Apply one journal record to the in-memory state
+        
+        Args:
+            record (dict): A record as written by ConfigJournal
             
-            # Ensure the current profile exists and has a rules list
-            if not isinstance(config["profiles"].get(current_profile), dict):
-                self.logger.log_debug(f"Profile {current_profile} not found or not a dict, initializing")
-                config["profiles"][current_profile] = {"rules": []}
-                needs_save = True
-                
-            # Ensure rules exists and is a list
-            if "rules" not in config["profiles"][current_profile] or not isinstance(config["profiles"][current_profile]["rules"], list):
-                self.logger.log_debug("Rules not found or not a list, initializing")
-                config["profiles"][current_profile]["rules"] = []
-                needs_save = True
+        Returns:
+            bool: True if the record changed the rule store
+        """
+        op = record.get('op')
+        if op == 'put' and isinstance(record.get('rule'), dict):
+            rule = self._normalize_rule(record['rule'])
+            self._rules[rule['id']] = rule
+            return True
+        if op == 'del':
+            return self._rules.pop(record.get('id'), None) is not None
+        if op == 'block':
+            self._blocked_ips[record['ip']] = float(record['until'])
+        elif op == 'unblock':
+            self._blocked_ips.pop(record.get('ip'), None)
+        elif op == 'block_country':
+            self._blocked_countries.add(str(record['country']).upper())
+        elif op == 'unblock_country':
+            self._blocked_countries.discard(str(record.get('country', '')).upper())
+        else:
+            self.logger.log_debug(f"Ignoring unknown journal record: {record}")
+        return False
+
+    def _replay_journal(self):
+        """
+        Replay the journal on top of the loaded snapshot
+        
+        Returns:
+            int: Number of replayed records
+        """
+        count = 0
+        rules_changed = False
+        try:
+            for record in self.journal.replay():
+                count += 1
+                try:
+                    rules_changed = self._apply_record(record) or rules_changed
+                except (KeyError, TypeError, ValueError) as e:
+                    self.logger.log_error(f"Skipping invalid journal record {record}: {e}")
+        except OSError as e:
+            self.logger.log_error(f"Error reading journal {self.journal.path}: {e}")
+        if rules_changed:
+            self._mark_rules_changed()
+        if count:
+            self.logger.info(f"Replayed {count} journal records")
+        return count
+
+    def _journal(self, records):
+        """
+        Persist changes through the journal
+        
+        Falls back to a full snapshot if the journal cannot be written, and
+        compacts the journal once it holds JOURNAL_COMPACT_RECORDS records.
+        
+        Args:
+            records (list): Journal records describing the changes
             
-            # Ensure each rule has all required fields
-            rules = config["profiles"][current_profile]["rules"]
-            self.logger.log_debug(f"Found {len(rules)} rules in profile {current_profile}")
+        Returns:
+            bool: True if the changes were persisted (or scheduled)
+        """
+        if not self.journal.append(records):
+            return self.save_config()
+        if self.journal.records >= self.JOURNAL_COMPACT_RECORDS:
+            return self.save_config()
+        return True
+
+    def get_rules(self):
+        """
+        Get current firewall rules
+        
+        Rules are validated once when the configuration is loaded or
+        mutated, so this call has no side effects. The returned tuple is
+        cached until the rule store ``version`` changes; treat the rule
+        dictionaries it contains as read-only.
+        
+        Returns:
+            tuple: The rules of the current profile
+        """
+        view = self._rules_view
+        if view is None:
+            view = self._rules_view = tuple(self._rules.values())
+        return view
+
+    def get_rule(self, rule_id):
+        """
+        Get a single rule by its ID
+        
+        Args:
+            rule_id (str): The ID of the rule
             
-            for rule in rules:
-                if not isinstance(rule, dict):
-                    self.logger.log_debug("Found non-dict rule, removing")
-                    rules.remove(rule)
-                    needs_save = True
-                    continue
-                    
-                # Check if any required fields are missing
-                required_fields = {
-                    'id': str(uuid.uuid4()),
-                    'name': 'Unnamed Rule',
-                    'protocol': 'TCP',
-                    'port': '',
-                    'direction': 'IN',
-                    'action': 'ALLOW',
-                    'enabled': True
-                }
+        Returns:
+            dict: The rule, or None if no rule has this ID
+        """
+        return self._rules.get(rule_id)
+
+    def _apply_change(self, change):
+        """
+        Apply one change to the rule store without saving
+        
+        Args:
+            change (dict): ``{'op': 'add', 'rule': {...}}``,
+                ``{'op': 'update', 'id': ..., 'rule': {...}}``,
+                ``{'op': 'delete', 'id': ...}`` or
+                ``{'op': 'enable'/'disable', 'id': ...}``
                 
-                # Set any missing fields to their default values
-                for field, default_value in required_fields.items():
-                    if field not in rule:
-                        self.logger.log_debug(f"Adding missing field '{field}' to rule")
-                        rule[field] = default_value
-                        needs_save = True
+        Returns:
+            str: The ID of the affected rule, or None if nothing was applied
+        """
+        op = change.get('op')
+        if op == 'add':
+            rule = self._normalize_rule(change.get('rule') or {})
+            if rule['id'] in self._rules:
+                self.logger.log_error(f"Rule ID already exists: {rule['id']}")
+                return None
+            self._rules[rule['id']] = rule
+            return rule['id']
+
+        rule_id = change.get('id') or (change.get('rule') or {}).get('id')
+        if rule_id not in self._rules:
+            return None
+        if op == 'update':
+            # Ensure ID remains the same
+            self._rules[rule_id] = self._normalize_rule(dict(change.get('rule') or {}, id=rule_id))
+        elif op == 'delete':
+            del self._rules[rule_id]
+        elif op in ('enable', 'disable'):
+            self._rules[rule_id] = dict(self._rules[rule_id], enabled=(op == 'enable'))
+        else:
+            self.logger.log_error(f"Unknown rule change operation: {op}")
+            return None
+        return rule_id
+
+    def apply_changes(self, changes):
+        """
+        Apply a batch of rule changes and persist them with one journal write
+        
+        Args:
+            changes (list): Changes in the format accepted by _apply_change
             
-            # Save the updated config if any changes were made
-            if needs_save:
-                self.logger.log_debug("Saving updated config")
-                self.config = config
-                try:
-                    # Save the config to file
-                    with open(self.config_path, 'w', encoding='utf-8') as f:
-                        json.dump(self.config, f, indent=4, ensure_ascii=False)
-                    self.logger.log_debug("Config saved successfully")
-                except Exception as e:
-                    self.logger.log_error(f"Failed to save config: {str(e)}")
-                    return False
-                
-            self.logger.log_debug(f"Returning {len(rules)} rules")
-            return rules
+        Returns:
+            bool: True if every change was applied and persisted
+        """
+        applied, persisted = self.apply_change_batch(changes)
+        return persisted and any(applied) and all(applied)
+
+    def apply_change_batch(self, changes):
+        """
+        Apply a batch of rule changes, reporting the outcome of each one
+        
+        The changes that succeed are persisted with one journal write, even
+        if others fail.
+        
+        Args:
+            changes (list): Changes in the format accepted by _apply_change
             
-        except Exception as e:
-            self.logger.log_error(f"Error in get_rules: {type(e).__name__}: {str(e)}", exc_info=True)
-            import traceback
-            self.logger.log_error(f"Traceback: {traceback.format_exc()}")
-            return []
+        Returns:
+            tuple: (list with the affected rule ID, or None, per change;
+                whether the applied changes were persisted, True if none was applied)
+        """
+        with self._lock:
+            applied = []
+            records = []
+            for change in changes:
+                rule_id = self._apply_change(change)
+                applied.append(rule_id)
+                if rule_id in self._rules:
+                    records.append({'op': 'put', 'rule': self._rules[rule_id]})
+                elif rule_id:
+                    records.append({'op': 'del', 'id': rule_id})
+            if not records:
+                return applied, True
+            self._mark_rules_changed()
+            return applied, self._journal(records)
 
     def add_rule(self, rule):
         """Add a new firewall rule"""
-        if "id" not in rule:
-            rule["id"] = str(uuid.uuid4())
-        current_profile = self.config["current_profile"]
-        self.config["profiles"][current_profile].setdefault("rules", []).append(rule)
-        return self.save_config()
+        return self.apply_changes([{'op': 'add', 'rule': rule}])
 
     def update_rule(self, rule_id, updated_rule):
         """Update an existing firewall rule"""
-        current_profile = self.config["current_profile"]
-        rules = self.get_rules()
-        for i, rule in enumerate(rules):
-            if rule["id"] == rule_id:
-                updated_rule["id"] = rule_id  # Ensure ID remains the same
-                self.config["profiles"][current_profile]["rules"][i] = updated_rule
-                return self.save_config()
-        return False
+        return self.apply_changes([{'op': 'update', 'id': rule_id, 'rule': updated_rule}])
 
     def delete_rule(self, rule_id):
         """Delete a firewall rule"""
-        current_profile = self.config["current_profile"]
-        rules = self.get_rules()
-        self.config["profiles"][current_profile]["rules"] = [r for r in rules if r["id"] != rule_id]
-        return self.save_config()
+        return self.apply_changes([{'op': 'delete', 'id': rule_id}])
+
+    def set_rule_enabled(self, rule_id, enabled):
+        """Enable or disable a firewall rule"""
+        return self.apply_changes([{'op': 'enable' if enabled else 'disable', 'id': rule_id}])
+
+    def get_blocklist(self):
+        """
+        Get the persisted block list
+        
+        Returns:
+            tuple: (dict of IP -> unblock time for unexpired blocks,
+                set of blocked country codes)
+        """
+        with self._lock:
+            now = time.time()
+            ips = {ip: until for ip, until in self._blocked_ips.items() if until > now}
+            return ips, set(self._blocked_countries)
+
+    def apply_blocklist_changes(self, changes):
+        """
+        Record a batch of block list changes with one journal write
+        
+        Args:
+            changes (list): ``{'op': 'block', 'ip': ..., 'until': <epoch seconds>}``,
+                ``{'op': 'unblock', 'ip': ...}``,
+                ``{'op': 'block_country', 'country': ...}`` or
+                ``{'op': 'unblock_country', 'country': ...}``
+                
+        Returns:
+            bool: True if the changes were persisted
+        """
+        with self._lock:
+            records = []
+            for change in changes:
+                if change.get('op') not in ('block', 'unblock', 'block_country', 'unblock_country'):
+                    self.logger.log_error(f"Unknown block list change operation: {change.get('op')}")
+                    continue
+                try:
+                    self._apply_record(change)
+                except (KeyError, TypeError, ValueError) as e:
+                    self.logger.log_error(f"Invalid block list change {change}: {e}")
+                    continue
+                records.append(change)
+            return self._journal(records)
 
     def get_settings(self):
         """Get firewall settings"""
@@ -285,11 +640,12 @@ class FirewallConfig:
         """
         try:
             # Update the settings in the config
-            if 'settings' not in self.config:
-                self.config['settings'] = {}
-                
-            # Update the settings
-            self.config['settings'].update(settings)
+            with self._lock:
+                if 'settings' not in self.config:
+                    self.config['settings'] = {}
+                    
+                # Update the settings
+                self.config['settings'].update(settings)
             
             # Save the configuration
             if not self.save_config():
@@ -442,30 +798,6 @@ class FirewallConfig:
                     self.logger.log_config_change("RULE_UPDATED", f"Updated rule '{updated_rule['name']}' ({updated_rule['protocol']}:{updated_rule['port']})")
                     self.log_message(f"Rule '{updated_rule['name']}' updated", "RULE_UPDATED")
 
-    def delete_rule(self):
-        """Delete selected rule"""
-        current_row = self.rules_table.currentRow()
-        if current_row == -1:
-            QMessageBox.warning(self, translations[self.current_language]['warning'],
-                              translations[self.current_language]['no_rule_selected'] or 'No rule selected')
-            return
-
-        rule_id = self.rules_table.item(current_row, 0).data(Qt.ItemDataRole.UserRole)
-        rules = self.config.get_rules()
-        rule = next((r for r in rules if r['id'] == rule_id), None)
-
-        if rule:
-            reply = QMessageBox.question(self, translations[self.current_language]['confirm'],
-                                       f"Delete rule '{rule['name']}'?",
-                                       QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-
-            if reply == QMessageBox.StandardButton.Yes:
-                if self.config.delete_rule(rule_id):
-                    self.load_rules()
-                    # Log the rule deletion
-                    self.logger.log_config_change("RULE_DELETED", f"Deleted rule '{rule['name']}' ({rule['protocol']}:{rule['port']})")
-                    self.log_message(f"Rule '{rule['name']}' deleted", "RULE_DELETED")
-
     def refresh_logs(self):
         """Refresh logs"""
         self.logger.log_firewall_event("LOGS_REFRESHED", "User refreshed logs manually")
@@ -532,18 +864,6 @@ class FirewallConfig:
             QMessageBox.critical(self, translations[self.current_language]['error'],
                                f"{translations[self.current_language]['qr_error']}: {str(e)}")
 
-    def save_config(self):
-        """Save configuration"""
-        if self.config.save_config():
-            self.statusBar().showMessage(translations[self.current_language]['config_saved'])
-            # Log the configuration save
-            self.logger.log_config_change("CONFIG_SAVED", "Configuration saved successfully")
-        else:
-            self.logger.log_error("Failed to save configuration", context="ConfigTab.save_config")
-            QMessageBox.critical(self, translations[self.current_language]['error'],
-                               "Failed to save configuration")
-
-
     def reset_config(self):
         """Reset configuration to defaults"""
         reply = QMessageBox.question(
@@ -849,10 +1169,11 @@ class RuleDialog(QDialog):
 class FirewallSignals(QObject):
     """Signals for the FirewallManager to communicate with the UI"""
     network_stats_updated = Signal(dict)  # Network statistics
-    connection_detected = Signal(dict)    # New connection detected
+    connections_changed = Signal(dict)    # Connections added/updated/removed since the last tick
     intrusion_detected = Signal(dict)     # Potential intrusion detected
     vpn_status_changed = Signal(dict)     # VPN connection status changed
     vpn_log_line = Signal(str)            # VPN log line appended
+    ips_unblocked = Signal(list)          # Temporary IP blocks expired
     
 
 class FirewallManager:
@@ -894,15 +1215,28 @@ class FirewallManager:
         self._init_nftables()
         
         # Initialize network monitoring
-        self.network_monitor = NetworkMonitor(update_interval=2.0)
+        self.network_monitor = NetworkMonitor(
+            update_interval=2.0,
+            backend=self.get_settings().get('connection_backend', 'psutil')
+        )
         self.ids = IntrusionDetectionSystem()
         
         # Initialize zone and VPN management
         self.zone_manager = ZoneManager()
         self.vpn_manager = VPNManager(self.zone_manager)
         
-        # Initialize enhanced security
-        self.security = EnhancedSecurity()
+        # Initialize enhanced security and restore persisted blocks
+        settings = self.get_settings()
+        self.security = EnhancedSecurity(
+            geoip_db_path=settings.get('geoip_db_path') or None,
+            geoip_precompile=bool(settings.get('geoip_precompile', False)),
+            geoip_mode=settings.get('geoip_mode', 'mmap')
+        )
+        self._restore_blocklist()
+        self._configure_port_knocking()
+        self.security.ip_reputation.start()
+        self.security.geo_blocker.register_reload_callback(self._on_geoip_reloaded)
+        self.security.geo_blocker.start_watching()
         
         # Windows Firewall controller for kill switch / split tunneling
         try:
@@ -913,6 +1247,12 @@ class FirewallManager:
         # Setup signals for UI updates
         self.signals = FirewallSignals()
         
+        # Expire temporary IP blocks on time
+        self.security.register_unblock_callback(self._on_blocks_expired)
+        # Rate limit blocks are journaled and enforced like manual ones
+        self.security.set_block_handler(self.block_ips)
+        self.security.start_expiry()
+        
         # Start network monitoring
         self._setup_network_monitoring()
         # Apply any saved split tunneling policies
@@ -942,30 +1282,37 @@ class FirewallManager:
                             "errors_out": getattr(st, "errors_out", 0),
                             "drop_in": getattr(st, "drop_in", 0),
                             "drop_out": getattr(st, "drop_out", 0),
+                            "rates": dict(getattr(st, "rates", {})),
                             "connections": 0,
                         }
+                    # Rates summed over all interfaces (per second)
+                    payload["total_rates"] = self.network_monitor.get_rates()
 
                     # Emit updated stats
                     if hasattr(self, 'signals'):
                         self.signals.network_stats_updated.emit(payload)
 
-                    # Process connections: emit to UI and run IDS checks
-                    for conn in connections_list:
-                        conn_dict = {
-                            "protocol": getattr(conn, "protocol", ""),
-                            "local_addr": getattr(conn, "local_addr", ""),
-                            "remote_addr": getattr(conn, "remote_addr", ""),
-                            "status": getattr(conn, "status", ""),
-                            "process_name": getattr(conn, "process_name", ""),
-                            "pid": getattr(conn, "pid", 0),
-                        }
-                        if hasattr(self, 'signals'):
-                            self.signals.connection_detected.emit(conn_dict)
+                except Exception as cb_err:
+                    self.logger.error(f"Network monitor callback error: {cb_err}")
 
-                        # IDS analysis
+            def _on_change(diff):
+                try:
+                    # Resolve owners only for the rows the UI is about to show
+                    self.network_monitor.attribute_processes(diff.added + diff.updated)
+                    if hasattr(self, 'signals'):
+                        self.signals.connections_changed.emit({
+                            "added": [self._connection_dict(conn) for conn in diff.added],
+                            "updated": [self._connection_dict(conn) for conn in diff.updated],
+                            "removed": [self._connection_key(conn) for conn in diff.removed],
+                        })
+
+                    # IDS checks run once per new connection, over the snapshot columns
+                    if diff.added:
                         try:
-                            threats = self.ids.analyze_connection(conn)
-                            for t in threats:
+                            snapshot = diff.added[0].snapshot
+                            threats = self.ids.analyze_snapshot(snapshot, [conn.index for conn in diff.added])
+                            for index, t in threats:
+                                conn = snapshot[index]
                                 alert = {
                                     "timestamp": datetime.now().isoformat(),
                                     "severity": t.get("severity", "info"),
@@ -980,10 +1327,14 @@ class FirewallManager:
                         except Exception as ids_err:
                             self.logger.error(f"IDS analysis error: {ids_err}")
 
+                        # Security checks (rate limit, GeoIP, reputation) once per tick
+                        self._check_connection_sources(diff.added[0].snapshot, [conn.index for conn in diff.added])
+
                 except Exception as cb_err:
-                    self.logger.error(f"Network monitor callback error: {cb_err}")
+                    self.logger.error(f"Connection change callback error: {cb_err}")
 
             self.network_monitor.register_callback(_on_update)
+            self.network_monitor.register_change_callback(_on_change)
             self.network_monitor.start()
             self.logger.info("Network monitoring initialized")
 
@@ -999,20 +1350,78 @@ class FirewallManager:
             self.logger.error(f"Failed to set up network monitoring: {e}")
 
     # ----- Public helpers used by MonitoringTab -----
+    @staticmethod
+    def _connection_key(conn) -> str:
+        """Stable identifier of a connection row: protocol, local and remote address."""
+        return "|".join(conn.key)
+
+    def _connection_dict(self, conn) -> Dict[str, Any]:
+        return {
+            "key": self._connection_key(conn),
+            "protocol": getattr(conn, "protocol", ""),
+            "local_addr": getattr(conn, "local_addr", ""),
+            "remote_addr": getattr(conn, "remote_addr", ""),
+            "status": getattr(conn, "status", ""),
+            "process_name": getattr(conn, "process_name", ""),
+            "pid": getattr(conn, "pid", 0),
+        }
+
+    # Severity of the security alerts raised for new inbound connections
+    SECURITY_ALERT_SEVERITY = {
+        SecurityAction.RATE_LIMIT: "high",
+        SecurityAction.GEO_BLOCK: "medium",
+        SecurityAction.REPUTATION_BLOCK: "high",
+    }
+
+    def _check_connection_sources(self, snapshot, rows: List[int]):
+        """
+        Run the security checks over new inbound connections of a snapshot
+        
+        The sources are checked in one EnhancedSecurity.check_security_batch
+        call (sources over the rate limit are blocked by it); an intrusion
+        alert is emitted for every connection that did not pass.
+        
+        Args:
+            snapshot: Connection snapshot of the tick
+            rows: Rows of the new connections
+        """
+        try:
+            inbound = snapshot.inbound_rows(rows)
+            if not inbound:
+                return
+            codes = self.security.check_security_batch(snapshot.remote_addresses(inbound))
+            for index, code in zip(inbound, codes):
+                action = SECURITY_ACTIONS[code]
+                severity = self.SECURITY_ALERT_SEVERITY.get(action)
+                if severity is None or not hasattr(self, 'signals'):
+                    continue
+                conn = snapshot[index]
+                self.signals.intrusion_detected.emit({
+                    "timestamp": datetime.now().isoformat(),
+                    "severity": severity,
+                    "description": f"Connection from {conn.remote_addr} failed security check: {action.value}",
+                    "connection": {
+                        "remote_addr": conn.remote_addr,
+                        "local_addr": conn.local_addr,
+                    },
+                })
+        except Exception as e:
+            self.logger.error(f"Connection security check error: {e}")
+
+    def get_interface_rate_history(self, iface: Optional[str] = None,
+                                   count: Optional[int] = None) -> Dict[str, List[float]]:
+        """Return recorded per-second rates of an interface (None: all interfaces), oldest first."""
+        try:
+            return self.network_monitor.get_rate_history(iface, count)
+        except Exception as e:
+            self.logger.error(f"Error fetching rate history: {e}")
+            return {}
+
     def get_network_connections(self) -> List[Dict[str, Any]]:
         """Return current network connections as list of dicts for the UI."""
         try:
-            conns = []
-            for c in self.network_monitor.get_current_connections():
-                conns.append({
-                    "protocol": getattr(c, "protocol", ""),
-                    "local_addr": getattr(c, "local_addr", ""),
-                    "remote_addr": getattr(c, "remote_addr", ""),
-                    "status": getattr(c, "status", ""),
-                    "process_name": getattr(c, "process_name", ""),
-                    "pid": getattr(c, "pid", 0),
-                })
-            return conns
+            current = self.network_monitor.get_current_connections()
+            return [self._connection_dict(c) for c in self.network_monitor.attribute_processes(current)]
         except Exception as e:
             self.logger.error(f"Error fetching network connections: {e}")
             return []
@@ -1175,8 +1584,8 @@ class FirewallManager:
         """Load rules from the configuration"""
         try:
             rules = self._config.get_rules() if hasattr(self._config, 'get_rules') else []
-            if isinstance(rules, list):
-                self._rules = rules
+            if isinstance(rules, (list, tuple)):
+                self._rules = list(rules)
                 self.logger.info(f"Loaded {len(self._rules)} rules from configuration")
         except Exception as e:
             self.logger.error(f"Error loading rules: {str(e)}")
@@ -1185,39 +1594,211 @@ class FirewallManager:
         """Initialize the nftables manager."""
         try:
             self.nft = NFTablesManager()
-            self.logger.info("NFTables manager initialized")
+            self.logger.info(f"NFTables manager initialized ({self.nft.backend} backend)")
         except Exception as e:
             self.logger.log_error(f"Unexpected error initializing nftables: {e}")
             return False
 
-    def block_ip(self, ip: str, duration: int = 3600) -> bool:
+    # ----- Kernel block lists -----
+    @property
+    def kernel_blocklist_enabled(self) -> bool:
+        """Whether blocks are enforced through nftables named sets."""
+        return (
+            bool(self.get_settings().get('kernel_blocklist', False))
+            and self.nft is not None
+            and self.nft.backend in ('libnftables', 'nft')
+        )
+
+    def _restore_blocklist(self):
+        """Restore blocked IPs (with their remaining time) and countries from the config."""
         try:
-            self.security.block_ip(ip, duration)
+            ips, countries = self.config.get_blocklist()
+            for ip, until in ips.items():
+                self.security.block_ip_until(ip, until)
+            for code in countries:
+                self.security.geo_blocker.block_country(code)
+            if ips or countries:
+                self.logger.info(f"Restored {len(ips)} blocked IPs and {len(countries)} blocked countries")
+            if self.kernel_blocklist_enabled:
+                now = time.time()
+                by_set: Dict[str, List[Any]] = {}
+                for ip, until in ips.items():
+                    try:
+                        by_set.setdefault(NFTablesManager.blocklist_set_for(ip), []).append((ip, until - now))
+                    except ValueError:
+                        continue
+                for set_name, elements in by_set.items():
+                    self.nft.add_set_elements(set_name, elements)
+                if countries:
+                    self._sync_geo_sets()
+        except Exception as e:
+            self.logger.error(f"Failed to restore block list: {e}")
+
+    def _group_by_blocklist_set(self, ips) -> Dict[str, List[str]]:
+        """Group addresses by the kernel set they belong to (raises ValueError on bad input)."""
+        groups: Dict[str, List[str]] = {}
+        for ip in ips:
+            groups.setdefault(NFTablesManager.blocklist_set_for(ip), []).append(ip)
+        return groups
+
+    def _geo_set_commands(self) -> List[Dict[str, Any]]:
+        """Build the commands loading the CIDRs of every blocked country."""
+        networks = self.security.geo_blocker.country_networks(self.security.geo_blocker.blocked_countries)
+        by_set: Dict[str, List[Any]] = {'blocked_geo4': [], 'blocked_geo6': []}
+        for nets in networks.values():
+            for net in nets:
+                by_set[f'blocked_geo{net.version}'].append(net)
+        commands = []
+        for set_name, nets in by_set.items():
+            commands.extend(self.nft.set_element_commands('add', set_name, nets))
+        return commands
+
+    def _sync_geo_sets(self) -> bool:
+        """Replace the country sets with the CIDRs of the blocked countries in one transaction."""
+        if not self.nft.ensure_blocklist():
+            return False
+        commands = [
+            {'flush': {'set': {
+                'family': NFTablesManager.BLOCKLIST_FAMILY,
+                'table': NFTablesManager.BLOCKLIST_TABLE,
+                'name': name
+            }}}
+            for name in ('blocked_geo4', 'blocked_geo6')
+        ]
+        return self.nft.apply_commands(commands + self._geo_set_commands())
+
+    def _on_geoip_reloaded(self):
+        """Reload the kernel country sets from the new GeoIP database (watcher thread)."""
+        if self.kernel_blocklist_enabled and self.security.geo_blocker.blocked_countries:
+            if self._sync_geo_sets():
+                self.logger.info("Kernel country sets updated from the reloaded GeoIP database")
+            else:
+                self.logger.error("Failed to update kernel country sets after GeoIP reload")
+
+    def _blocklist_commands(self) -> List[Dict[str, Any]]:
+        """Build the block list table with its current elements, for a full ruleset apply."""
+        commands = self.nft.blocklist_table_commands()
+        now = time.time()
+        remaining = [(ip, until - now) for ip, until in self.security.get_blocked_ips().items() if until > now]
+        by_set: Dict[str, List[Any]] = {}
+        for ip, ttl in remaining:
+            try:
+                by_set.setdefault(NFTablesManager.blocklist_set_for(ip), []).append((ip, ttl))
+            except ValueError:
+                continue
+        for set_name, elements in by_set.items():
+            commands.extend(self.nft.set_element_commands('add', set_name, elements))
+        return commands + self._geo_set_commands()
+
+    def block_ips(self, ips, duration: int = 3600) -> bool:
+        """
+        Block several IPs for the given duration.
+        
+        In kernel block list mode the addresses are added to the nftables
+        sets in a single transaction, with the duration as element timeout.
+        
+        Args:
+            ips: Iterable of IPv4/IPv6 addresses
+            duration: Block duration in seconds
+            
+        Returns:
+            bool: True if every address was blocked, False otherwise
+        """
+        try:
+            ips = list(ips)
+            groups = self._group_by_blocklist_set(ips)
+            until = time.time() + duration
+            for ip in ips:
+                self.security.block_ip_until(ip, until)
+            self.config.apply_blocklist_changes([{'op': 'block', 'ip': ip, 'until': until} for ip in ips])
+            if self.kernel_blocklist_enabled:
+                return all(
+                    self.nft.add_set_elements(set_name, members, timeout=duration)
+                    for set_name, members in groups.items()
+                )
             return True
-        except Exception:
+        except Exception as e:
+            self.logger.error(f"Failed to block IPs: {e}")
             return False
 
-    def unblock_ip(self, ip: str) -> bool:
+    def unblock_ips(self, ips) -> bool:
+        """Unblock several IPs, removing them from the kernel sets when enabled."""
         try:
-            self.security.unblock_ip(ip)
+            ips = list(ips)
+            groups = self._group_by_blocklist_set(ips)
+            for ip in ips:
+                self.security.unblock_ip(ip)
+            self.config.apply_blocklist_changes([{'op': 'unblock', 'ip': ip} for ip in ips])
+            if self.kernel_blocklist_enabled:
+                return all(
+                    self.nft.delete_set_elements(set_name, members)
+                    for set_name, members in groups.items()
+                )
             return True
-        except Exception:
+        except Exception as e:
+            self.logger.error(f"Failed to unblock IPs: {e}")
             return False
 
-    def block_country(self, country_code: str) -> bool:
+    def _on_blocks_expired(self, ips: List[str]):
+        """Drop expired IP blocks from the kernel sets and notify the UI (expiry thread)."""
+        # Nothing to journal: expired blocks are ignored on load and pruned from the next snapshot
+        if self.kernel_blocklist_enabled:
+            groups: Dict[str, List[str]] = {}
+            for ip in ips:
+                try:
+                    groups.setdefault(NFTablesManager.blocklist_set_for(ip), []).append(ip)
+                except ValueError:
+                    continue
+            # The kernel may have timed the elements out already
+            for set_name, members in groups.items():
+                self.nft.delete_set_elements(set_name, members, missing_ok=True)
+        self.signals.ips_unblocked.emit(list(ips))
+
+    def block_ip(self, ip: str, duration: int = 3600) -> bool:
+        return self.block_ips([ip], duration)
+
+    def unblock_ip(self, ip: str) -> bool:
+        return self.unblock_ips([ip])
+
+    def block_countries(self, country_codes) -> bool:
+        """
+        Block several countries.
+        
+        In kernel block list mode the countries are expanded to CIDRs and the
+        country sets are reloaded once for the whole batch.
+        """
         try:
-            self.security.geo_blocker.block_country(country_code.upper())
+            codes = [code.upper() for code in country_codes]
+            for code in codes:
+                self.security.geo_blocker.block_country(code)
+            self.config.apply_blocklist_changes([{'op': 'block_country', 'country': code} for code in codes])
+            if self.kernel_blocklist_enabled:
+                return self._sync_geo_sets()
             return True
-        except Exception:
+        except Exception as e:
+            self.logger.error(f"Failed to block countries: {e}")
             return False
 
-    def unblock_country(self, country_code: str) -> bool:
+    def unblock_countries(self, country_codes) -> bool:
+        """Unblock several countries, reloading the kernel country sets when enabled."""
         try:
-            self.security.geo_blocker.unblock_country(country_code.upper())
+            codes = [code.upper() for code in country_codes]
+            for code in codes:
+                self.security.geo_blocker.unblock_country(code)
+            self.config.apply_blocklist_changes([{'op': 'unblock_country', 'country': code} for code in codes])
+            if self.kernel_blocklist_enabled:
+                return self._sync_geo_sets()
             return True
-        except Exception:
+        except Exception as e:
+            self.logger.error(f"Failed to unblock countries: {e}")
             return False
 
+    def block_country(self, country_code: str) -> bool:
+        return self.block_countries([country_code])
+
+    def unblock_country(self, country_code: str) -> bool:
+        return self.unblock_countries([country_code])
+
     def get_blocked_countries(self) -> List[str]:
         try:
             return sorted(list(self.security.geo_blocker.blocked_countries))
@@ -1226,7 +1807,75 @@ class FirewallManager:
 
     def get_blocked_ips(self) -> Dict[str, float]:
         try:
-            return dict(self.security.blocked_ips)
+            return self.security.get_blocked_ips()
+        except Exception:
+            return {}
+
+    # ----- Port knocking -----
+    def _port_knocking_settings(self) -> Dict[str, Any]:
+        """Return the port knocking settings with defaults filled in."""
+        knocking = dict(self.get_settings().get('port_knocking') or {})
+        knocking.setdefault('kernel', False)
+        knocking['window'] = int(knocking.get('window', 10))
+        knocking['open_timeout'] = int(knocking.get('open_timeout', 30))
+        knocking['services'] = dict(knocking.get('services') or {})
+        return knocking
+
+    @property
+    def kernel_port_knocking_enabled(self) -> bool:
+        """Whether knock sequences are validated by nftables dynamic sets."""
+        knocking = self._port_knocking_settings()
+        return (
+            bool(knocking['kernel'] and knocking['services'])
+            and self.nft is not None
+            and self.nft.backend in ('libnftables', 'nft')
+        )
+
+    def _configure_port_knocking(self):
+        """Load the configured knock services into PortKnocking and, when enabled, the kernel."""
+        try:
+            knocking = self._port_knocking_settings()
+            sequences = {
+                name: spec['sequence'] for name, spec in knocking['services'].items() if spec.get('sequence')
+            }
+            if sequences:
+                self.security.port_knocking = PortKnocking(sequences=sequences, window=knocking['window'])
+            if knocking['services']:
+                self.apply_port_knocking()
+        except Exception as e:
+            self.logger.error(f"Failed to configure port knocking: {e}")
+
+    def apply_port_knocking(self) -> bool:
+        """
+        Load the knock services into the kernel port knocking table.
+        
+        Knocks are then validated by nftables without any userspace work per
+        packet; the table is removed when kernel knocking is turned off.
+        
+        Returns:
+            bool: True if the kernel state matches the settings, False otherwise
+        """
+        if self.nft is None or self.nft.backend not in ('libnftables', 'nft'):
+            return False
+        if not self.kernel_port_knocking_enabled:
+            return self.nft.remove_port_knocking()
+        knocking = self._port_knocking_settings()
+        if self.nft.apply_port_knocking(knocking['services'], knocking['window'], knocking['open_timeout']):
+            self.logger.info(f"Loaded {len(knocking['services'])} port knocking services into nftables")
+            return True
+        return False
+
+    def get_knock_clients(self) -> Dict[str, Dict[str, Optional[int]]]:
+        """
+        Get the sources that completed a knock sequence, read from the kernel sets.
+        
+        Returns:
+            dict: service -> {address: seconds until the port closes (None if unknown)}
+        """
+        try:
+            if not self.kernel_port_knocking_enabled:
+                return {}
+            return self.nft.get_knock_clients(self._port_knocking_settings()['services'])
         except Exception:
             return {}
             
@@ -1254,80 +1903,114 @@ class FirewallManager:
             self.logger.error(f"Error exporting rules: {str(e)}")
             return False
     
-    def import_rules(self, file_path: str, merge: bool = False) -> bool:
+    # Fields filled in on imported rules that do not carry them
+    IMPORT_RULE_DEFAULTS = {
+        'enabled': True,
+        'source_port': '',
+        'ip_version': 'any',
+        'state': '',
+        'logging': False,
+        'log_level': 'info',
+        'log_prefix': ''
+    }
+
+    def import_rules(self, file_path: str, merge: bool = False,
+                     progress_callback: Optional[Callable[[int, int, int], None]] = None,
+                     chunk_size: int = 1000) -> ImportResult:
         """
         Import firewall rules from a JSON file.
         
+        The file is parsed incrementally and validated in chunks of
+        ``chunk_size`` rules. All changes are committed to the configuration
+        with a single save, then pushed to nftables as one atomic batch, so
+        importing N rules costs one write and one transaction instead of N.
+        Rules that cannot be applied do not undo the others; they are
+        counted in the result.
+        
         Args:
             file_path: Path to the file containing rules to import
             merge: If True, merge with existing rules. If False, replace all rules.
+            progress_callback: Called as ``callback(rules_read, bytes_read, total_bytes)``
+                after each chunk
+            chunk_size: Number of rules validated per chunk
             
         Returns:
-            bool: True if import was successful, False otherwise
+            ImportResult: Applied, failed and skipped rule counts (overall and
+                per chunk); true only if every rule was imported and saved
         """
+        result = ImportResult()
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                
-            if not isinstance(data, dict) or 'rules' not in data:
-                self.logger.error("Invalid rules file format")
-                return False
-                
-            rules = data['rules']
-            if not isinstance(rules, list):
-                self.logger.error("Rules data is not a list")
-                return False
-                
-            if not merge:
-                # Clear existing rules
-                self._rules = []
-                
-            # Add new rules
-            success_count = 0
-            for rule in rules:
-                if 'id' not in rule:
-                    rule['id'] = str(uuid.uuid4())
-                    
-                # Add timestamps
-                now = datetime.now().isoformat()
-                rule['created_at'] = rule.get('created_at', now)
-                rule['updated_at'] = now
-                
-                # Set default values for new fields if not present
-                rule.setdefault('enabled', True)
-                rule.setdefault('source_port', '')
-                rule.setdefault('ip_version', 'any')
-                rule.setdefault('state', '')
-                rule.setdefault('logging', False)
-                rule.setdefault('log_level', 'info')
-                rule.setdefault('log_prefix', '')
-                
-                # Add to the rules list
-                self._rules.append(rule)
-                
-                # Save to config if not skipping
-                if not merge:
-                    self._save_rules()
-                
-                # Apply the rule to the firewall if enabled
-                if self.nft and rule.get('enabled', True):
-                    nft_rule = self._convert_rule_to_nftables(rule)
-                    if nft_rule:  # Only add if conversion was successful
-                        self.nft.add_rule(nft_rule)
-                
-                self.logger.info(f"Added rule: {rule.get('name', 'Unnamed')} (ID: {rule['id']})")
-                success_count += 1
-                
-            # Save all rules
-            if merge:
-                self._save_rules()
+            total_bytes = os.path.getsize(file_path)
+            existing = {rule['id'] for rule in self.get_rules()}
+            changes = [] if merge else [{'op': 'delete', 'id': rule_id} for rule_id in existing]
+            # (start, end) positions of each chunk's changes
+            chunk_bounds = []
+            seen = set()
+            now = datetime.now().isoformat()
+
+            def report(count, bytes_read):
+                if progress_callback:
+                    progress_callback(count, bytes_read, total_bytes)
+
+            with open(file_path, 'rb') as f:
+                for chunk in iter_rule_chunks(f, chunk_size, report):
+                    start = len(changes)
+                    for entry in chunk:
+                        if not isinstance(entry, dict):
+                            result.skipped += 1
+                            continue
+                        rule = dict(entry)
+                        rule_id = rule.get('id')
+                        if not isinstance(rule_id, str) or not rule_id or rule_id in seen:
+                            rule_id = rule['id'] = str(uuid.uuid4())
+                        seen.add(rule_id)
+                        
+                        # Add timestamps
+                        rule.setdefault('created_at', now)
+                        rule['updated_at'] = now
+                        for field, default_value in self.IMPORT_RULE_DEFAULTS.items():
+                            rule.setdefault(field, default_value)
+                        
+                        if merge and rule_id in existing:
+                            changes.append({'op': 'update', 'id': rule_id, 'rule': rule})
+                        else:
+                            changes.append({'op': 'add', 'rule': rule})
+                    chunk_bounds.append((start, len(changes)))
+
+            if result.skipped:
+                self.logger.warning(f"Skipped {result.skipped} invalid entries in {file_path}")
+            if not changes:
+                self.logger.info(f"No rules to import from {file_path}")
+                return result
+
+            # One configuration save for the whole import
+            outcomes, result.saved = self.config.apply_change_batch(changes)
+            for start, end in chunk_bounds:
+                applied = sum(1 for rule_id in outcomes[start:end] if rule_id)
+                result.chunks.append((applied, end - start - applied))
+                result.applied += applied
+                result.failed += end - start - applied
+            if not result.saved:
+                self.logger.error("Error importing rules: could not save configuration")
+                return result
+
+            # One atomic nftables transaction for the whole import
+            if self.nft:
+                self.apply_rules()
             
-            self.logger.info(f"Imported {success_count}/{len(rules)} rules from {file_path}")
-            return True
+            if result.failed:
+                self.logger.warning(
+                    f"Imported {result.applied} of {result.applied + result.failed} rules "
+                    f"from {file_path}; {result.failed} could not be applied"
+                )
+            else:
+                self.logger.info(f"Imported {result.applied} rules from {file_path}")
+            return result
             
         except Exception as e:
             self.logger.error(f"Error importing rules: {str(e)}")
-            return False
+            result.saved = False
+            return result
     
     def _show_error(self, title: str, message: str):
         """Show an error message dialog."""
@@ -1398,31 +2081,27 @@ class FirewallManager:
             rule: The rule to convert
             
         Returns:
-            dict: The rule in nftables format, or None if conversion fails
+            dict: The rule in nftables format (with a ready to use ``expr``
+                list), a list of two such rules for direction 'both', or None
+                if conversion fails
         """
         try:
-            action = rule.get('action')
-            if action == 'allow':
+            action = str(rule.get('action', '')).lower()
+            if action in ('allow', 'accept'):
                 nft_action = 'accept'
-            elif action == 'block':
+            elif action in ('block', 'drop', 'deny'):
                 nft_action = 'drop'
             elif action == 'reject':
-                nft_action = 'reject with icmp type host-prohibited'
+                nft_action = 'reject'
             else:
                 self.logger.warning(f"Unknown action: {action}")
                 return None
                 
-            # Determine IP version
-            ip_version = rule.get('ip_version', 'any')
-            if ip_version == 'ip6':
-                family = 'ip6'
-            elif ip_version == 'ip':
-                family = 'ip'
-            else:  # 'any' or unspecified
-                family = 'ip'  # Default to IPv4 for now
+            # Determine IP version (shared with RuleMatcher)
+            family = rule_family(rule)
                 
             # Determine chain based on direction
-            direction = rule.get('direction', 'in')
+            direction = str(rule.get('direction', 'in')).lower()
             if direction == 'in':
                 chain = 'INPUT'
                 iface_key = 'iifname'
@@ -1450,47 +2129,29 @@ class FirewallManager:
             }
             
             # Add protocol match
-            protocol = rule.get('protocol')
-            if protocol and protocol != 'all':
+            protocol = str(rule.get('protocol') or '').lower()
+            if protocol and protocol not in ('all', 'any'):
                 nft_rule['meta'] = {'l4proto': protocol}
             
-            # Add port match (destination port)
-            port = str(rule.get('port', '')).strip()
-            if port:
-                if '-' in port:
-                    # Port range
-                    start_port, end_port = port.split('-', 1)
-                    nft_rule['dport'] = {'>=': int(start_port), '<=': int(end_port)}
-                elif ',' in port:
-                    # Multiple ports
-                    nft_rule['dport'] = [int(p.strip()) for p in port.split(',') if p.strip().isdigit()]
-                elif port.isdigit():
-                    # Single port
-                    nft_rule['dport'] = int(port)
-            
-            # Add source port match
-            source_port = str(rule.get('source_port', '')).strip()
-            if source_port:
-                if '-' in source_port:
-                    # Port range
-                    start_port, end_port = source_port.split('-', 1)
-                    nft_rule['sport'] = {'>=': int(start_port), '<=': int(end_port)}
-                elif ',' in source_port:
-                    # Multiple ports
-                    nft_rule['sport'] = [int(p.strip()) for p in source_port.split(',') if p.strip().isdigit()]
-                elif source_port.isdigit():
-                    # Single port
-                    nft_rule['sport'] = int(source_port)
+            # Add port matches (destination and source)
+            dport = self._nft_port_match(parse_port_spec(rule.get('port') or rule.get('dest_port')))
+            if dport is not None:
+                nft_rule['dport'] = dport
+            sport = self._nft_port_match(parse_port_spec(rule.get('source_port')))
+            if sport is not None:
+                nft_rule['sport'] = sport
             
-            # Add source IP match
-            source_ip = rule.get('source_ip', '').strip()
-            if source_ip and source_ip.lower() not in ('', 'any'):
-                nft_rule['saddr'] = source_ip
-                
-            # Add destination IP match
-            dest_ip = rule.get('destination_ip', '').strip()
-            if dest_ip and dest_ip.lower() not in ('', 'any'):
-                nft_rule['daddr'] = dest_ip
+            # Add source and destination IP matches (comma separated lists allowed)
+            source_nets = parse_networks(rule.get('source_ip'))
+            if source_nets is not None:
+                nft_rule['saddr'] = source_nets
+            dest_nets = parse_networks(rule.get('destination_ip') or rule.get('dest_ip'))
+            if dest_nets is not None:
+                nft_rule['daddr'] = dest_nets
+            version = 6 if family == 'ip6' else 4
+            if any(net.version != version for net in (source_nets or []) + (dest_nets or [])):
+                self.logger.warning(f"Rule {rule.get('id')} mixes addresses with ip_version {family}, skipping")
+                return None
                 
             # Add interface match
             interface = rule.get('interface', '').strip()
@@ -1510,70 +2171,250 @@ class FirewallManager:
                     'level': rule.get('log_level', 'info')
                 }
             
+            nft_rule['expr'] = self._build_nftables_expr(nft_rule)
             return nft_rule
             
         except Exception as e:
             self.logger.error(f"Error converting rule to nftables format: {str(e)}")
             return None
+
+    @staticmethod
+    def _nft_match(left: Dict[str, Any], right: Any, op: str = '==') -> Dict[str, Any]:
+        """Build a single nftables JSON match statement."""
+        return {'match': {'op': op, 'left': left, 'right': right}}
+
+    @staticmethod
+    def _nft_port_match(intervals: List[Tuple[int, int]]) -> Any:
+        """
+        Turn parsed port intervals into the converted rule representation:
+        a port, a ``{'>=': low, '<=': high}`` range, or a list of both.
+        """
+        items = [low if low == high else {'>=': low, '<=': high} for low, high in intervals]
+        if not items:
+            return None
+        return items[0] if len(items) == 1 else items
+
+    @classmethod
+    def _nft_port_value(cls, value: Any) -> Any:
+        """Translate a converted port value into its nftables JSON form."""
+        if isinstance(value, dict):
+            return {'range': [value['>='], value['<=']]}
+        if isinstance(value, list):
+            return {'set': [cls._nft_port_value(v) for v in value]}
+        return value
+
+    @staticmethod
+    def _nft_addr_value(networks: List[Any]) -> Any:
+        """Translate parsed networks (see parse_networks) into their nftables JSON form."""
+        items = [
+            str(net.network_address) if net.prefixlen == net.max_prefixlen
+            else {'prefix': {'addr': str(net.network_address), 'len': net.prefixlen}}
+            for net in networks
+        ]
+        return items[0] if len(items) == 1 else {'set': items}
+
+    def _build_nftables_expr(self, nft_rule: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Build the nftables JSON ``expr`` list for a converted rule.
+        
+        Args:
+            nft_rule: The intermediate rule produced by _convert_rule_to_nftables
+            
+        Returns:
+            list: Statements ending with the rule verdict
+        """
+        expr = []
+        family = nft_rule.get('family', 'ip')
+        l4proto = nft_rule.get('meta', {}).get('l4proto')
+        if l4proto:
+            expr.append(self._nft_match({'meta': {'key': 'l4proto'}}, l4proto))
+        for key in ('iifname', 'oifname'):
+            if key in nft_rule:
+                expr.append(self._nft_match({'meta': {'key': key}}, nft_rule[key]))
+        for key in ('saddr', 'daddr'):
+            if key in nft_rule:
+                expr.append(self._nft_match(
+                    {'payload': {'protocol': family, 'field': key}},
+                    self._nft_addr_value(nft_rule[key])
+                ))
+        # Ports need a transport header; fall back to the generic one
+        port_proto = l4proto if l4proto in ('tcp', 'udp', 'sctp', 'dccp') else 'th'
+        for key in ('sport', 'dport'):
+            if key in nft_rule:
+                expr.append(self._nft_match(
+                    {'payload': {'protocol': port_proto, 'field': key}},
+                    self._nft_port_value(nft_rule[key])
+                ))
+        if 'ct' in nft_rule:
+            states = [s.strip() for s in nft_rule['ct']['state'].split(',') if s.strip()]
+            expr.append(self._nft_match({'ct': {'key': 'state'}}, states, op='in'))
+        if 'log' in nft_rule:
+            expr.append({'log': nft_rule['log']})
+
+        if nft_rule['action'] == 'reject':
+            expr.append({'reject': dict(self.REJECT_TYPES.get(family, self.REJECT_TYPES['inet']))})
+        else:
+            expr.append({nft_rule['action']: None})
+        return expr
     
+    # Base tables created by the default config, one per rule family
+    BASE_FAMILIES = ('ip', 'ip6')
+
+    # Reject statement per family (nft refuses 'icmp' types outside ip)
+    REJECT_TYPES = {
+        'ip': {'type': 'icmp', 'expr': 'host-prohibited'},
+        'ip6': {'type': 'icmpv6', 'expr': 'admin-prohibited'},
+        'inet': {'type': 'icmpx', 'expr': 'admin-prohibited'},
+    }
+
     def _create_default_nftables_config(self) -> Dict:
         """Create a default nftables configuration."""
-        return {
-            'nftables': [
-                # Flush existing rules
-                {'flush': {'ruleset': None}},
-                
-                # Define tables
-                {'add': {'table': {'family': 'ip', 'name': 'filter'}}},
-                
-                # Define chains
-                {'add': {'chain': {
-                    'family': 'ip',
-                    'table': 'filter',
-                    'name': 'INPUT',
-                    'type': 'filter',
-                    'hook': 'input',
-                    'prio': 0,
-                    'policy': 'drop'
-                }}},
-                
-                # Default allow localhost
-                {'add': {'rule': {
-                    'family': 'ip',
-                    'table': 'filter',
-                    'chain': 'INPUT',
-                    'expr': [
-                        {'ct': {'state': 'related,established'}},
-                        {'accept': None}
-                    ]
-                }}},
-                {'add': {'rule': {
-                    'family': 'ip',
-                    'table': 'filter',
-                    'chain': 'INPUT',
-                    'expr': [
-                        {'iifname': 'lo'},
-                        {'accept': None}
-                    ]
-                }}},
-                
-                # Default allow ICMP
-                {'add': {'rule': {
-                    'family': 'ip',
-                    'table': 'filter',
-                    'chain': 'INPUT',
-                    'expr': [
-                        {'protocol': 'icmp'},
-                        {'accept': None}
-                    ]
-                }}}
-            ]
-        }
+        commands = [
+            # Flush existing rules (part of the same atomic transaction)
+            {'flush': {'ruleset': None}},
+        ]
+        for family in self.BASE_FAMILIES:
+            commands.extend(self._default_family_commands(family))
+        return {'nftables': commands}
+
+    def _default_family_commands(self, family: str) -> List[Dict[str, Any]]:
+        """Build the filter table, INPUT/OUTPUT chains and default rules of one family."""
+        icmp = 'ipv6-icmp' if family == 'ip6' else 'icmp'
+        return [
+            # Define tables
+            {'add': {'table': {'family': family, 'name': 'filter'}}},
+            
+            # Define chains
+            {'add': {'chain': {
+                'family': family,
+                'table': 'filter',
+                'name': 'INPUT',
+                'type': 'filter',
+                'hook': 'input',
+                'prio': 0,
+                'policy': 'drop'
+            }}},
+            {'add': {'chain': {
+                'family': family,
+                'table': 'filter',
+                'name': 'OUTPUT',
+                'type': 'filter',
+                'hook': 'output',
+                'prio': 0,
+                'policy': 'accept'
+            }}},
+            
+            # Default allow established traffic and localhost
+            {'add': {'rule': {
+                'family': family,
+                'table': 'filter',
+                'chain': 'INPUT',
+                'expr': [
+                    self._nft_match({'ct': {'key': 'state'}}, ['established', 'related'], op='in'),
+                    {'accept': None}
+                ]
+            }}},
+            {'add': {'rule': {
+                'family': family,
+                'table': 'filter',
+                'chain': 'INPUT',
+                'expr': [
+                    self._nft_match({'meta': {'key': 'iifname'}}, 'lo'),
+                    {'accept': None}
+                ]
+            }}},
+            
+            # Default allow ICMP (ICMPv6 also carries neighbour discovery)
+            {'add': {'rule': {
+                'family': family,
+                'table': 'filter',
+                'chain': 'INPUT',
+                'expr': [
+                    self._nft_match({'meta': {'key': 'l4proto'}}, icmp),
+                    {'accept': None}
+                ]
+            }}}
+        ]
     
-    def apply_rules(self) -> bool:
+    def get_rule_matcher(self) -> RuleMatcher:
+        """
+        Return a compiled matcher for the rules of the current profile.
+        
+        The matcher is rebuilt lazily when the rule store version changes.
+        
+        Returns:
+            RuleMatcher: Matcher answering ``match(proto, direction, src, sport, dst, dport)``
+        """
+        matcher = getattr(self, '_rule_matcher', None)
+        if matcher is None or self._rule_matcher_version != self.config.version:
+            self._rule_matcher_version = self.config.version
+            matcher = self._rule_matcher = RuleMatcher(self.get_rules())
+        return matcher
+
+    def _build_desired_nft_rules(self, rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Convert configured rules into tagged nftables rule objects.
+        
+        Each object carries a comment identifying the source rule and a digest
+        of its expression, which the incremental diff relies on.
+        
+        Args:
+            rules: Rules from the configuration
+            
+        Returns:
+            list: nftables rule objects ready for an ``add`` command
+        """
+        desired = []
+        for rule in rules:
+            if not rule.get('enabled', True):
+                continue
+            try:
+                converted = self._convert_rule_to_nftables(rule)
+                if converted is None:
+                    continue
+                converted = converted if isinstance(converted, list) else [converted]
+                for index, nft_rule in enumerate(converted):
+                    if not nft_rule:
+                        continue
+                    desired.append({
+                        'family': nft_rule['family'],
+                        'table': nft_rule['table'],
+                        'chain': nft_rule['chain'],
+                        'expr': nft_rule['expr'],
+                        'comment': make_rule_comment(rule.get('id', ''), index, nft_rule['expr'])
+                    })
+            except Exception as e:
+                self.logger.log_error(f"Error converting rule {rule.get('id')} to nftables: {e}")
+        return desired
+
+    @staticmethod
+    def _has_base_chains(ruleset: Dict) -> bool:
+        """Check whether the live ruleset contains the chains created by the default config."""
+        chains = {
+            (entry['chain'].get('family'), entry['chain'].get('table'), entry['chain'].get('name'))
+            for entry in ruleset.get('nftables', [])
+            if isinstance(entry, dict) and isinstance(entry.get('chain'), dict)
+        }
+        required = {
+            (family, 'filter', name)
+            for family in FirewallManager.BASE_FAMILIES
+            for name in ('INPUT', 'OUTPUT')
+        }
+        return required <= chains
+
+    def apply_rules(self, incremental: bool = True) -> bool:
         """
         Apply the current firewall rules to the system using nftables.
         
+        When the base chains are already loaded and ``incremental`` is True,
+        only the rules that were added, changed or removed since the last
+        apply are pushed, leaving the rest of the ruleset (and established
+        state) untouched. Otherwise the whole ruleset is built as one
+        nftables JSON document and loaded in a single atomic transaction.
+        
+        Args:
+            incremental: Whether to try an incremental update first
+        
         Returns:
             bool: True if the operation was successful, False otherwise
         """
@@ -1584,26 +2425,41 @@ class FirewallManager:
         try:
             # Get current rules from config
             rules = self.get_rules()
+            desired = self._build_desired_nft_rules(rules)
+
+            if incremental and not (self.nft.use_mock or self.nft.use_pyrewall):
+                live_ruleset = self.nft.get_ruleset()
+                if self._has_base_chains(live_ruleset):
+                    diff = compute_rule_diff(desired, self.nft.get_active_rules(live_ruleset))
+                    if diff.reordered:
+                        self.logger.info("Live rule order differs from the configuration, rebuilding ruleset")
+                    elif diff.is_empty():
+                        self.logger.info("nftables ruleset already up to date")
+                        return True
+                    elif self.nft.apply_commands(diff.to_commands()):
+                        self.logger.log_firewall_event(
+                            "RULES_APPLIED",
+                            f"Incrementally applied rules: {len(diff.add)} added, "
+                            f"{len(diff.replace)} replaced, {len(diff.delete)} deleted"
+                        )
+                        return True
+                    else:
+                        self.logger.warning("Incremental apply failed, falling back to full ruleset")
             
             # Create a new ruleset
             ruleset = self._create_default_nftables_config()
             
             # Add user-defined rules
-            for rule in rules:
-                try:
-                    nft_rule = self._convert_rule_to_nftables(rule)
-                    ruleset['nftables'].append({
-                        'add': {
-                            'rule': {
-                                'family': 'ip',
-                                'table': nft_rule['table'],
-                                'chain': nft_rule['chain'],
-                                'expr': nft_rule['expr']
-                            }
-                        }
-                    })
-                except Exception as e:
-                    self.logger.log_error(f"Error converting rule {rule.get('id')} to nftables: {e}")
+            ruleset['nftables'].extend({'add': {'rule': nft_rule}} for nft_rule in desired)
+
+            # The flush drops the block list and knock tables; re-create them in the same transaction
+            if self.kernel_blocklist_enabled:
+                ruleset['nftables'].extend(self._blocklist_commands())
+            if self.kernel_port_knocking_enabled:
+                knocking = self._port_knocking_settings()
+                ruleset['nftables'].extend(self.nft.knock_table_commands(
+                    knocking['services'], knocking['window'], knocking['open_timeout']
+                ))
             
             # Apply the ruleset
             success = self.nft.apply_ruleset(ruleset)
@@ -1682,7 +2538,7 @@ class FirewallManager:
         Get the current firewall rules
         
         Returns:
-            list: List of firewall rules
+            tuple: Cached, read-only view of the firewall rules
         """
         try:
             # Ensure _config is a FirewallConfig instance
@@ -1693,8 +2549,8 @@ class FirewallManager:
             # Use the FirewallConfig's get_rules method
             rules = self._config.get_rules()
             
-            # Ensure we always return a list
-            if not isinstance(rules, list):
+            # Ensure we always return a sequence
+            if not isinstance(rules, (list, tuple)):
                 self.logger.log_error("Rules is not a list, initializing empty rules list")
                 rules = []
                 
@@ -1771,6 +2627,50 @@ class FirewallManager:
             self.logger.log_error(f"Error deleting rule: {e}")
             return False
     
+    def set_rule_enabled(self, rule_id, enabled):
+        """
+        Enable or disable a firewall rule
+        
+        Args:
+            rule_id (str): The ID of the rule
+            enabled (bool): Whether the rule should be enabled
+            
+        Returns:
+            bool: True if the rule was updated successfully, False otherwise
+        """
+        try:
+            result = self.config.set_rule_enabled(rule_id, enabled)
+            if result:
+                self.logger.log_firewall_event(
+                    "RULE_UPDATED",
+                    f"{'Enabled' if enabled else 'Disabled'} rule ID: {rule_id}"
+                )
+            return result
+        except Exception as e:
+            self.logger.log_error(f"Error toggling rule: {e}")
+            return False
+    
+    def apply_rule_changes(self, changes):
+        """
+        Apply a batch of rule changes with a single configuration save
+        
+        Args:
+            changes (list): Changes such as ``{'op': 'add', 'rule': {...}}``,
+                ``{'op': 'update', 'id': ..., 'rule': {...}}``,
+                ``{'op': 'delete', 'id': ...}`` or ``{'op': 'enable', 'id': ...}``
+                
+        Returns:
+            bool: True if every change was applied and saved, False otherwise
+        """
+        try:
+            changes = list(changes)
+            result = self.config.apply_changes(changes)
+            self.logger.log_firewall_event("RULES_CHANGED", f"Applied {len(changes)} rule changes")
+            return result
+        except Exception as e:
+            self.logger.log_error(f"Error applying rule changes: {e}")
+            return False
+    
     def get_settings(self):
         """
         Get the current firewall settings
@@ -1791,13 +2691,8 @@ class FirewallManager:
             bool: True if the settings were updated successfully, False otherwise
         """
         try:
-            # Update the settings in the config
-            if not self.config.config.get('settings'):
-                self.config.config['settings'] = {}
-            self.config.config['settings'].update(settings)
-            
-            # Save the updated configuration
-            if self.config.save_config():
+            # Update and save the configuration
+            if self.config.update_settings(settings):
                 self.logger.log_firewall_event(
                     "SETTINGS_UPDATED", 
                     f"Updated settings: {', '.join(settings.keys())}"
@@ -1808,6 +2703,23 @@ class FirewallManager:
             self.logger.log_error(f"Error updating settings: {e}")
             return False
 
+    
+    def shutdown(self):
+        """
+        Stop background work and write pending state to disk
+        
+        Returns:
+            bool: True if the configuration was flushed successfully
+        """
+        try:
+            self.network_monitor.stop()
+        except Exception as e:
+            self.logger.log_error(f"Error stopping network monitor: {e}")
+        self.security.ip_reputation.stop()
+        self.security.geo_blocker.stop_watching()
+        self.security.stop_expiry()
+        return self.config.flush()
+
 
 if __name__ == "__main__":
     # This file is not meant to be run directly
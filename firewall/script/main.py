@@ -46,6 +46,9 @@ def main():
         # Create and show main window
         window = WindowsFirewallManager(firewall_manager)
         window.show()
+        
+        # Write pending configuration changes before exiting
+        app.aboutToQuit.connect(firewall_manager.shutdown)
 
         # Start event loop
         logger.log_firewall_event("SHUTDOWN", "TuxFw application closed normally")
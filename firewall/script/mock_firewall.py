@@ -47,6 +47,16 @@ class MockFirewall:
             self.logger.error(f"Invalid handle: {handle}")
             return False
     
+    def apply_ruleset(self, ruleset: Dict) -> bool:
+        """Replace the mock rules with the rules of an nftables JSON document"""
+        self.rules = []
+        for entry in ruleset.get('nftables', []):
+            rule = entry.get('add', {}).get('rule') if isinstance(entry, dict) else None
+            if rule is not None:
+                self.rules.append(dict(rule, handle=len(self.rules) + 1))
+        self.logger.info(f"Applied mock ruleset with {len(self.rules)} rules")
+        return True
+
     def flush_ruleset(self) -> bool:
         """Flush all mock rules"""
         self.rules = []
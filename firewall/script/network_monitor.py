@@ -1,14 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import time
 import threading
 import psutil
 import socket
-from typing import Dict, List, Optional, Any, Callable
-from dataclasses import dataclass
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Callable, Iterable, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
 from firewall.script.logger import get_logger
+from firewall.script.proc_net import ProcNetCollector
+from firewall.script.connection_snapshot import (
+    AddressPacker, ConnectionRow, ConnectionSnapshot, NameTable, STATUS_CODES
+)
+
+try:  # pragma: no cover - optional dependency
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - runtime fallback
+    np = None  # type: ignore
 
 @dataclass
 class NetworkStats:
@@ -21,6 +33,89 @@ class NetworkStats:
     errors_out: int = 0
     drop_in: int = 0
     drop_out: int = 0
+    # Per-second rates of the counters above, since the previous tick
+    rates: Dict[str, float] = field(default_factory=dict)
+
+# NetworkStats counters that get a per-second rate
+RATE_FIELDS = ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv',
+               'errors_in', 'errors_out', 'drop_in', 'drop_out')
+
+_COUNTER32 = 1 << 32
+
+def _counter_delta(previous: int, current: int) -> int:
+    """Increase of a counter, allowing for a 32-bit wrap or a reset"""
+    if current >= previous:
+        return current - previous
+    wrapped = current + _COUNTER32 - previous
+    if previous < _COUNTER32 and wrapped < _COUNTER32 // 2:
+        # 32-bit counter (some drivers, 32-bit kernels) wrapped around
+        return wrapped
+    # Counter was reset (interface re-created): count from zero
+    return current
+
+class RateHistory:
+    """
+    Fixed-size ring buffer of per-second rates
+    
+    One array('d') per field plus the monotonic timestamp of each sample;
+    the oldest sample is overwritten once capacity is reached.
+    """
+
+    def __init__(self, capacity: int, fields: Tuple[str, ...] = RATE_FIELDS):
+        self.capacity = capacity
+        self.fields = fields
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._columns = {name: array('d', bytes(8 * capacity)) for name in fields}
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, rates: Dict[str, float]):
+        """Store one sample (fields missing from rates are stored as 0)"""
+        position = self._next
+        self._timestamps[position] = timestamp
+        for name, column in self._columns.items():
+            column[position] = rates.get(name, 0.0)
+        self._next = (position + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def latest(self) -> Dict[str, float]:
+        """Most recent rates (empty before the first sample)"""
+        if not self._count:
+            return {}
+        position = self._next - 1
+        return {name: column[position] for name, column in self._columns.items()}
+
+    def _ordered(self, values: array, count: Optional[int]):
+        count = self._count if count is None else min(count, self._count)
+        start = (self._next - count) % self.capacity
+        if np is not None:
+            data = np.frombuffer(values, dtype=np.float64)
+            return np.take(data, np.arange(start, start + count) % self.capacity)
+        if start + count <= self.capacity:
+            return values[start:start + count]
+        return values[start:] + values[:start + count - self.capacity]
+
+    def series(self, name: str, count: Optional[int] = None):
+        """
+        Get the samples of one field, oldest first
+        
+        Args:
+            name: Field name (one of fields) or 'timestamp'
+            count: Number of most recent samples (defaults to all)
+            
+        Returns:
+            A copy: NumPy float64 array if available, else array('d')
+        """
+        values = self._timestamps if name == 'timestamp' else self._columns[name]
+        return self._ordered(values, count)
+
+    def snapshot(self, count: Optional[int] = None) -> Dict[str, List[float]]:
+        """All fields (and 'timestamp') as lists, oldest first"""
+        names = ('timestamp',) + tuple(self.fields)
+        return {name: self.series(name, count).tolist() for name in names}
 
 @dataclass
 class ConnectionInfo:
@@ -32,26 +127,222 @@ class ConnectionInfo:
     process_name: str
     protocol: str
     timestamp: float
+    inode: int = 0  # Socket inode (procnet backend), used to find the pid on demand
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        """Identity of the socket: (protocol, local address, remote address)"""
+        return (self.protocol, self.local_addr, self.remote_addr)
+
+@dataclass
+class ConnectionDiff:
+    """
+    Connections opened, changed (status or owner) and closed since the last tick
+
+    Rows are ConnectionRow views: added and updated rows belong to the new
+    snapshot, removed rows to the previous one.
+    """
+    added: List[ConnectionRow] = field(default_factory=list)
+    updated: List[ConnectionRow] = field(default_factory=list)
+    removed: List[ConnectionRow] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+class _ProcessEntry:
+    """Cached name of one process"""
+    __slots__ = ('create_time', 'start', 'name', 'validated', 'checked')
+
+    def __init__(self, create_time: float, start: Optional[bytes], name: str, validated: float):
+        self.create_time = create_time
+        self.start = start
+        self.name = name
+        self.validated = validated
+        # Tick at which the /proc start time was last compared
+        self.checked = validated
+
+def _proc_start_time(pid: int) -> Optional[bytes]:
+    """
+    Start time of a process (field 22 of /proc/<pid>/stat, clock ticks since boot)
+    
+    Returns:
+        bytes: The raw field, or None if the process does not exist or
+            /proc is not available
+    """
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    # The command name (field 2) may contain spaces; fields resume after its ')'
+    fields = data.rpartition(b')')[2].split()
+    return fields[19] if len(fields) > 19 else None
+
+class ProcessNameCache:
+    """
+    Bounded pid -> process name cache.
+    
+    A process is read once, when its pid is first seen. Where /proc is
+    available (Linux), the first hit of each tick compares the start time in
+    /proc/<pid>/stat with the cached one (a single small read; further hits
+    with the same ``now`` reuse that check), so a reused pid is not reported
+    with the old name past the tick it was reused in. Elsewhere entries are checked
+    against the psutil create time every validate_interval seconds, so a
+    pid reused within that interval can show the previous name until then.
+    Pids that no longer own a socket are pruned after each tick. At most
+    max_entries pids are kept (least recently used first out).
+    """
+    DEFAULT_MAX_ENTRIES = 4096
+    DEFAULT_VALIDATE_INTERVAL = 30.0
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 validate_interval: float = DEFAULT_VALIDATE_INTERVAL):
+        self.max_entries = max_entries
+        self.validate_interval = validate_interval
+        self._entries: "OrderedDict[int, _ProcessEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.pruned = 0
+        self._has_proc = os.path.isdir('/proc/self')
+
+    def name(self, pid: int, now: Optional[float] = None) -> str:
+        """
+        Get the name of a process
+        
+        Args:
+            pid: Process id
+            now: Monotonic timestamp of the tick (defaults to
+                time.monotonic()); lookups sharing it check a pid once
+            
+        Raises:
+            psutil.NoSuchProcess, psutil.AccessDenied: If the process cannot be read
+        """
+        if now is None:
+            now = time.monotonic()
+        entry = self._entries.get(pid)
+        if entry is not None:
+            if entry.start is not None:
+                if entry.checked == now:
+                    same = True
+                else:
+                    same = _proc_start_time(pid) == entry.start
+                    entry.checked = now
+            elif now - entry.validated < self.validate_interval:
+                same = True
+            else:
+                try:
+                    same = psutil.Process(pid).create_time() == entry.create_time
+                except psutil.NoSuchProcess:
+                    same = False
+                entry.validated = now
+            if same:
+                self.hits += 1
+                self._entries.move_to_end(pid)
+                return entry.name
+            # The pid now belongs to another process
+            self.invalidations += 1
+            del self._entries[pid]
+
+        self.misses += 1
+        start = _proc_start_time(pid) if self._has_proc else None
+        process = psutil.Process(pid)
+        with process.oneshot():
+            name = process.name()
+            create_time = process.create_time()
+        if start is not None and _proc_start_time(pid) != start:
+            # The pid was reused while it was being read: don't cache a name
+            # that may belong to either process
+            return name
+        if len(self._entries) >= self.max_entries:
+            self._entries.popitem(last=False)
+        self._entries[pid] = _ProcessEntry(create_time, start, name, now)
+        return name
+
+    def prune(self, active_pids: Iterable[int]):
+        """Forget pids that are not in active_pids"""
+        active = active_pids if isinstance(active_pids, (set, frozenset)) else set(active_pids)
+        stale = [pid for pid in self._entries if pid not in active]
+        for pid in stale:
+            del self._entries[pid]
+        self.pruned += len(stale)
+
+    def clear(self):
+        """Forget every cached process"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get cache statistics
+        
+        Returns:
+            dict: cached processes, capacity, hits, misses (process reads),
+                invalidations (pid reuse), pruned entries and the hit rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'pruned': self.pruned,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
 
 class NetworkMonitor:
     """
     Monitors network traffic and connections in real-time
     """
-    def __init__(self, update_interval: float = 1.0):
+    BACKENDS = ('auto', 'psutil', 'procnet')
+    # Rate samples kept per interface (one per tick)
+    DEFAULT_HISTORY_SIZE = 300
+
+    def __init__(self, update_interval: float = 1.0, backend: str = 'psutil', proc_root: str = '/proc',
+                 history_size: int = DEFAULT_HISTORY_SIZE):
         """
         Initialize the network monitor
         
         Args:
             update_interval: How often to update stats (in seconds)
+            backend: Connection collector: 'psutil' (psutil.net_connections,
+                pids resolved for every socket), 'procnet' (/proc/net tables,
+                pids resolved on demand by attribute_processes) or 'auto'
+                (procnet where available)
+            proc_root: Proc directory read by the procnet backend
+            history_size: Rate samples kept per interface
         """
         self.logger = get_logger("firewall.netmon")
         self.update_interval = update_interval
+        self._collector: Optional[ProcNetCollector] = None
+        if backend not in self.BACKENDS:
+            self.logger.warning(f"Unknown connection backend {backend!r}, using psutil")
+            backend = 'psutil'
+        if backend != 'psutil' and ProcNetCollector.is_supported(proc_root):
+            self._collector = ProcNetCollector(proc_root)
+        elif backend == 'procnet':
+            self.logger.warning(f"{proc_root}/net is not readable, using psutil for connections")
+        self.backend = 'procnet' if self._collector is not None else 'psutil'
         self._running = False
         self._thread = None
         self._callbacks = []
-        self._prev_stats = {}
-        self._current_connections = []
+        # nic -> (monotonic time, counters) of the previous tick, for rates
+        self._prev_counters: Dict[str, Tuple[float, Tuple[int, ...]]] = {}
+        self.history_size = history_size
+        # Rate history per interface, and summed over all interfaces
+        self._rate_history: Dict[str, RateHistory] = {}
+        self._total_history = RateHistory(history_size)
+        # Process names interned once and shared by every snapshot
+        self._names = NameTable()
+        self._pack_address = AddressPacker()
+        self._snapshot = ConnectionSnapshot(self._names)
+        # Row index of each live connection by key, compared with each new snapshot
+        self._connection_table: Dict[Tuple[int, ...], int] = {}
+        self._change_callbacks = []
         self._lock = threading.Lock()
+        self.process_names = ProcessNameCache()
+        # Serializes owner lookups (monitor thread and on-demand callers)
+        self._owner_lock = threading.Lock()
         
     def start(self):
         """Start the network monitoring thread"""
@@ -71,15 +362,159 @@ class NetworkMonitor:
             self._thread = None
         self.logger.info("Network monitoring stopped")
         
-    def register_callback(self, callback: Callable[[Dict, List[ConnectionInfo]], None]):
+    def register_callback(self, callback: Callable[[Dict, ConnectionSnapshot], None]):
         """
         Register a callback to receive network updates
         
         Args:
-            callback: Function that receives (stats, connections) as arguments
+            callback: Function that receives (stats, connections) as arguments;
+                connections is the ConnectionSnapshot of the tick
         """
         with self._lock:
             self._callbacks.append(callback)
+
+    def register_change_callback(self, callback: Callable[[ConnectionDiff], None]):
+        """
+        Register a callback to receive connection changes
+        
+        Args:
+            callback: Function that receives a ConnectionDiff; it is only
+                called on ticks where a connection was added, updated or removed
+        """
+        with self._lock:
+            self._change_callbacks.append(callback)
+
+    def _track_connections(self, snapshot: ConnectionSnapshot) -> ConnectionDiff:
+        """Replace the connection table with a new snapshot and return what changed"""
+        previous, old_snapshot = self._connection_table, self._snapshot
+        table: Dict[Tuple[int, ...], int] = {}
+        diff = ConnectionDiff()
+        status, pid, inode = snapshot.status, snapshot.pid, snapshot.inode
+        old_status, old_pid, old_inode = old_snapshot.status, old_snapshot.pid, old_snapshot.inode
+        for index, key in enumerate(snapshot.keys()):
+            if key in table:
+                continue
+            table[key] = index
+            old = previous.get(key)
+            if old is None:
+                diff.added.append(ConnectionRow(snapshot, index))
+                continue
+            if not pid[index] and inode[index] and inode[index] == old_inode[old]:
+                # Keep an owner that was resolved on demand (procnet backend)
+                pid[index] = old_pid[old]
+                snapshot.name[index] = old_snapshot.name[old]
+            if status[index] != old_status[old] or pid[index] != old_pid[old]:
+                diff.updated.append(ConnectionRow(snapshot, index))
+        diff.removed = [ConnectionRow(old_snapshot, old) for key, old in previous.items() if key not in table]
+        self._connection_table = table
+        self._snapshot = snapshot
+        return diff
+
+    def _update_rates(self, net_io: Dict[str, Any], now: float) -> Dict[str, NetworkStats]:
+        """
+        Compute per-second rates from the interface counters and record them
+        
+        Args:
+            net_io: psutil.net_io_counters(pernic=True)
+            now: Monotonic timestamp of the counters
+            
+        Returns:
+            dict: nic -> NetworkStats (cumulative counters and rates)
+        """
+        stats: Dict[str, NetworkStats] = {}
+        previous = self._prev_counters
+        counters_by_nic: Dict[str, Tuple[float, Tuple[int, ...]]] = {}
+        total = dict.fromkeys(RATE_FIELDS, 0.0)
+        sampled = False
+        for nic, io in net_io.items():
+            counters = (io.bytes_sent, io.bytes_recv, io.packets_sent, io.packets_recv,
+                        io.errin, io.errout, io.dropin, io.dropout)
+            counters_by_nic[nic] = (now, counters)
+            rates: Dict[str, float] = {}
+            prev = previous.get(nic)
+            if prev is not None and now > prev[0]:
+                elapsed = now - prev[0]
+                rates = {
+                    name: _counter_delta(old, new) / elapsed
+                    for name, old, new in zip(RATE_FIELDS, prev[1], counters)
+                }
+                for name, value in rates.items():
+                    total[name] += value
+                sampled = True
+            stats[nic] = NetworkStats(*counters, rates=rates)
+
+        with self._lock:
+            self._prev_counters = counters_by_nic
+            for nic, nic_stats in stats.items():
+                if nic_stats.rates:
+                    history = self._rate_history.get(nic)
+                    if history is None:
+                        history = self._rate_history[nic] = RateHistory(self.history_size)
+                    history.append(now, nic_stats.rates)
+            # Interfaces that disappeared take their history with them
+            for nic in [nic for nic in self._rate_history if nic not in net_io]:
+                del self._rate_history[nic]
+            if sampled:
+                self._total_history.append(now, total)
+        return stats
+
+    def get_rates(self, nic: Optional[str] = None) -> Dict[str, float]:
+        """
+        Get the latest per-second rates
+        
+        Args:
+            nic: Interface name, or None for the sum over all interfaces
+            
+        Returns:
+            dict: field (see RATE_FIELDS) -> rate; empty if not sampled yet
+        """
+        with self._lock:
+            history = self._total_history if nic is None else self._rate_history.get(nic)
+            return history.latest() if history is not None else {}
+
+    def get_rate_history(self, nic: Optional[str] = None, count: Optional[int] = None) -> Dict[str, List[float]]:
+        """
+        Get the recorded rates of an interface, oldest first
+        
+        Args:
+            nic: Interface name, or None for the sum over all interfaces
+            count: Number of most recent samples (defaults to all)
+            
+        Returns:
+            dict: 'timestamp' (monotonic seconds) and each rate field -> list
+                of values; empty if the interface is unknown
+        """
+        with self._lock:
+            history = self._total_history if nic is None else self._rate_history.get(nic)
+            return history.snapshot(count) if history is not None else {}
+
+    def _build_snapshot(self, net_conns, timestamp: float) -> Tuple[ConnectionSnapshot, set]:
+        """Store psutil/procnet socket rows column by column"""
+        snapshot = ConnectionSnapshot(self._names, timestamp)
+        append, pack, intern = snapshot.append, self._pack_address, self._names.intern
+        status_codes = STATUS_CODES
+        no_peer = (0, 0)
+        active_pids = set()
+        tick = time.monotonic()
+        for conn in net_conns:
+            laddr, raddr = conn.laddr, conn.raddr
+            if not (laddr or raddr):  # Only include valid connections
+                continue
+            pid = conn.pid or 0
+            name = 0
+            if pid:
+                active_pids.add(pid)
+                try:
+                    name = intern(self.process_names.name(pid, tick))
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            append(
+                conn.type, conn.family,
+                pack(laddr.ip) if laddr else no_peer, laddr.port if laddr else 0,
+                pack(raddr.ip) if raddr else no_peer, raddr.port if raddr else 0,
+                status_codes.get(conn.status, 0), pid, name, getattr(conn, 'inode', 0)
+            )
+        return snapshot, active_pids
             
     def _monitor_loop(self):
         """Main monitoring loop"""
@@ -87,59 +522,40 @@ class NetworkMonitor:
             try:
                 # Get current network stats
                 net_io = psutil.net_io_counters(pernic=True)
-                net_conns = psutil.net_connections(kind='inet')
+                sampled_at = time.monotonic()
+                if self._collector is not None:
+                    with self._owner_lock:
+                        net_conns = self._collector.connections()
+                else:
+                    net_conns = psutil.net_connections(kind='inet')
                 
-                # Calculate deltas
                 current_time = time.time()
-                stats = {}
-                
-                for nic, io in net_io.items():
-                    prev = self._prev_stats.get(nic, {})
-                    
-                    stats[nic] = NetworkStats(
-                        bytes_sent=io.bytes_sent,
-                        bytes_recv=io.bytes_recv,
-                        packets_sent=io.packets_sent,
-                        packets_recv=io.packets_recv,
-                        errors_in=io.errin,
-                        errors_out=io.errout,
-                        drop_in=io.dropin,
-                        drop_out=io.dropout
-                    )
-                    
-                # Update previous stats (store raw psutil counters for potential future delta calc)
-                self._prev_stats = {nic: net_io[nic] for nic in net_io}
+                stats = self._update_rates(net_io, sampled_at)
                 
                 # Process connections
-                connections = []
-                for conn in net_conns:
-                    try:
-                        local = f"{conn.laddr.ip}:{conn.laddr.port}" if conn.laddr else None
-                        remote = f"{conn.raddr.ip}:{conn.raddr.port}" if conn.raddr else None
-                        
-                        if local or remote:  # Only include valid connections
-                            connections.append(ConnectionInfo(
-                                local_addr=local or "",
-                                remote_addr=remote or "",
-                                status=conn.status,
-                                pid=conn.pid or 0,
-                                process_name=psutil.Process(conn.pid).name() if conn.pid else "",
-                                protocol=conn.type.name.lower(),
-                                timestamp=current_time
-                            ))
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        continue
+                snapshot, active_pids = self._build_snapshot(net_conns, current_time)
+                with self._owner_lock:
+                    if self._collector is not None:
+                        # Only pids looked up on demand are known here
+                        active_pids = self._collector.known_pids
+                    self.process_names.prune(active_pids)
                         
                 # Update current connections
                 with self._lock:
-                    self._current_connections = connections
+                    diff = self._track_connections(snapshot)
                 
                 # Notify callbacks
                 for callback in self._callbacks:
                     try:
-                        callback(stats, connections)
+                        callback(stats, snapshot)
                     except Exception as e:
                         self.logger.error(f"Error in network monitor callback: {e}")
+                if diff:
+                    for callback in self._change_callbacks:
+                        try:
+                            callback(diff)
+                        except Exception as e:
+                            self.logger.error(f"Error in connection change callback: {e}")
                 
             except Exception as e:
                 self.logger.error(f"Error in network monitor: {e}")
@@ -147,16 +563,70 @@ class NetworkMonitor:
             # Wait for next update
             time.sleep(self.update_interval)
     
-    def get_current_connections(self) -> List[ConnectionInfo]:
-        """Get the current list of network connections"""
+    def get_current_connections(self) -> List[ConnectionRow]:
+        """Get the current network connections (row views of the latest snapshot)"""
         with self._lock:
-            return self._current_connections.copy()
+            return list(self._snapshot)
+
+    def get_snapshot(self) -> ConnectionSnapshot:
+        """Get the latest connection snapshot (only owners are filled in later, by attribute_processes)"""
+        with self._lock:
+            return self._snapshot
+
+    def attribute_processes(self, connections: List[ConnectionRow]) -> List[ConnectionRow]:
+        """
+        Fill in the pid and process name of connections collected without them
+        
+        With the procnet backend sockets are read without their owner; call
+        this for the connections that are displayed. Other connections are
+        returned unchanged.
+        
+        Args:
+            connections: Connections from get_current_connections or a callback
+            
+        Returns:
+            list: The same connections, updated in place
+        """
+        if self._collector is None:
+            return connections
+        pending = [conn for conn in connections if not conn.pid and conn.inode]
+        if not pending:
+            return connections
+        with self._owner_lock:
+            try:
+                pids = self._collector.pids_for(conn.inode for conn in pending)
+            except Exception as e:
+                self.logger.error(f"Error resolving connection owners: {e}")
+                return connections
+            now = time.monotonic()
+            for conn in pending:
+                pid = pids.get(conn.inode)
+                if not pid:
+                    continue
+                conn.pid = pid
+                try:
+                    conn.process_name = self.process_names.name(pid, now)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    conn.process_name = ""
+        return connections
+
+    def get_process_cache_stats(self) -> Dict[str, float]:
+        """Get the process name cache statistics (see ProcessNameCache.get_stats)"""
+        return self.process_names.get_stats()
 
 
 class IntrusionDetectionSystem:
     """
     Basic Intrusion Detection System (IDS) for network traffic monitoring
     """
+    # Remote ports worth an alert
+    SUSPICIOUS_PORTS = {
+        22: "SSH (potential brute force target)",
+        23: "Telnet (insecure protocol)",
+        3389: "RDP (potential brute force target)",
+        5900: "VNC (potential unauthorized access)",
+    }
+
     def __init__(self):
         self.logger = get_logger("firewall.ids")
         self.rules = []
@@ -203,29 +673,55 @@ class IntrusionDetectionSystem:
         # Check for suspicious ports
         if conn.remote_addr and ":" in conn.remote_addr:
             _, port = conn.remote_addr.rsplit(":", 1)
-            port = int(port)
-            
-            # Common suspicious ports
-            suspicious_ports = {
-                22: "SSH (potential brute force target)",
-                23: "Telnet (insecure protocol)",
-                80: "HTTP (potential web attack)",
-                443: "HTTPS (potential web attack)",
-                3389: "RDP (potential brute force target)",
-                5900: "VNC (potential unauthorized access)",
-            }
-            
-            if port in suspicious_ports and port not in [80, 443]:  # Common ports are less suspicious
-                threats.append({
-                    "rule_id": "suspicious_port",
-                    "severity": "medium",
-                    "description": f"Connection to potentially sensitive port {port} ({suspicious_ports[port]})",
-                    "connection": conn
-                })
+            threats.extend(self._port_threats(int(port), conn))
         
         # Add more detection logic here
         
         return threats
+
+    def analyze_snapshot(self, snapshot: ConnectionSnapshot,
+                         rows: Optional[List[int]] = None) -> List[Tuple[int, dict]]:
+        """
+        Analyze the connections of a snapshot for potential threats
+        
+        The checks run over the snapshot columns; only matching rows are
+        turned into connection views.
+        
+        Args:
+            snapshot: Connection snapshot
+            rows: Row indices to analyze (defaults to every row)
+            
+        Returns:
+            List of (row index, threat) pairs
+        """
+        if rows is not None and not rows:
+            return []
+        if np is not None and len(snapshot):
+            ports = snapshot.column('remote_port')
+            candidates = np.arange(len(ports)) if rows is None else np.asarray(rows, dtype=np.intp)
+            hits = candidates[np.isin(ports[candidates], list(self.SUSPICIOUS_PORTS))].tolist()
+        else:
+            ports = snapshot.remote_port
+            hits = [i for i in (range(len(ports)) if rows is None else rows)
+                    if ports[i] in self.SUSPICIOUS_PORTS]
+
+        threats = []
+        for index in hits:
+            conn = snapshot[index]
+            if not conn.remote_addr:
+                continue
+            threats.extend((index, threat) for threat in self._port_threats(conn.remote_port, conn))
+        return threats
+
+    def _port_threats(self, port: int, conn) -> List[dict]:
+        if port not in self.SUSPICIOUS_PORTS:  # Common ports (HTTP/HTTPS) are less suspicious
+            return []
+        return [{
+            "rule_id": "suspicious_port",
+            "severity": "medium",
+            "description": f"Connection to potentially sensitive port {port} ({self.SUSPICIOUS_PORTS[port]})",
+            "connection": conn
+        }]
     
     def get_rules(self) -> List[dict]:
         """Get all IDS rules"""
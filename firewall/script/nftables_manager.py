@@ -2,11 +2,22 @@
 # -*- coding: utf-8 -*-
 
 import subprocess
+import ipaddress
 import json
 import os
 import logging
+import re
+import threading
 from typing import Dict, List, Optional, Union, Any, Tuple
 
+# Try to import the libnftables binding (pip-nftables) for in-process access
+try:
+    import nftables as libnftables
+    HAS_LIBNFTABLES = True
+except ImportError:
+    libnftables = None
+    HAS_LIBNFTABLES = False
+
 # Try to import pyrewall for fallback
 try:
     import pyrewall
@@ -21,20 +32,58 @@ class NFTablesManager:
     This provides a high-level interface to interact with nftables.
     """
     
+    # Table holding the kernel block lists (kept apart from the rule table)
+    BLOCKLIST_TABLE = "tuxfw_blocklist"
+    BLOCKLIST_FAMILY = "inet"
+    # Named sets: name -> (element type, flags, matched address family)
+    BLOCKLIST_SETS = {
+        # Interval sets so blocked networks (CIDR) are accepted next to addresses
+        "blocked_ip4": ("ipv4_addr", ["interval", "timeout"], "ip"),
+        "blocked_ip6": ("ipv6_addr", ["interval", "timeout"], "ip6"),
+        "blocked_geo4": ("ipv4_addr", ["interval"], "ip"),
+        "blocked_geo6": ("ipv6_addr", ["interval"], "ip6"),
+    }
+    # Table holding the kernel port knocking gates
+    KNOCK_TABLE = "tuxfw_knock"
+    KNOCK_FAMILY = "inet"
+    # Address families of the knock sets: suffix -> (element type, matched address family)
+    KNOCK_ADDRESS_FAMILIES = {
+        "4": ("ipv4_addr", "ip"),
+        "6": ("ipv6_addr", "ip6"),
+    }
+    # Maximum number of sources each knock set holds
+    KNOCK_SET_SIZE = 65535
+    
     def __init__(self, logger=None):
         """
         Initialize the NFTablesManager with nftables, pyrewall, or mock fallback.
         
+        The in-process libnftables binding is preferred when it can be loaded,
+        so commands do not fork an ``nft`` process each time. Otherwise the
+        ``nft`` command line tool is used.
+        
         Args:
             logger: Optional logger instance. If not provided, a basic logger will be created.
         """
         self.logger = logger or logging.getLogger("firewall")
         self.nft_cmd = "nft"
+        self.use_libnftables = False
         self.use_pyrewall = False
         self.use_mock = False
+        self._libnft = None
+        self._libnft_lock = threading.Lock()
+        self._blocklist_ready = False
+        
+        if HAS_LIBNFTABLES:
+            try:
+                self._libnft = libnftables.Nftables()
+                self.use_libnftables = True
+                self.logger.info("Using in-process libnftables backend")
+            except Exception as e:
+                self.logger.warning(f"libnftables binding unavailable, using nft command: {e}")
         
         # Check if nft is available
-        if not self._is_nft_available():
+        if not self.use_libnftables and not self._is_nft_available():
             if HAS_PYREWALL:
                 self.logger.warning("nft not found, falling back to pyrewall")
                 self.use_pyrewall = True
@@ -52,6 +101,17 @@ class NFTablesManager:
                         "Please install either nftables or pyrewall, or ensure mock_firewall.py is available."
                     )
     
+    @property
+    def backend(self) -> str:
+        """Name of the active backend: libnftables, nft, pyrewall or mock."""
+        if self.use_libnftables:
+            return "libnftables"
+        if self.use_pyrewall:
+            return "pyrewall"
+        if self.use_mock:
+            return "mock"
+        return "nft"
+
     def _is_nft_available(self) -> bool:
         """Check if nft command is available."""
         try:
@@ -77,7 +137,9 @@ class NFTablesManager:
         Returns:
             dict: The parsed JSON output or raw output if json_output is False
         """
-        if self.use_pyrewall:
+        if self.use_libnftables:
+            return self._run_libnft_command(command, json_output)
+        elif self.use_pyrewall:
             return self._handle_pyrewall_command(command, json_output)
         elif self.use_mock:
             return self.mock_firewall._run_command(command, json_output)
@@ -109,6 +171,34 @@ class NFTablesManager:
         except json.JSONDecodeError as e:
             self.logger.error(f"Failed to parse nft JSON output: {e}")
             return {"error": f"Failed to parse JSON: {e}", "raw_output": result.stdout}
+
+    def _run_libnft_command(self, command: str, json_output: bool = False) -> Dict:
+        """
+        Run an nft command in-process through libnftables.
+        
+        Args:
+            command: The nft command to run (e.g., "list ruleset")
+            json_output: Whether to request JSON output format
+            
+        Returns:
+            dict: The parsed JSON output or raw output if json_output is False
+        """
+        # A libnftables context is not thread-safe and output flags are global
+        with self._libnft_lock:
+            self._libnft.set_json_output(json_output)
+            rc, output, error = self._libnft.cmd(command)
+
+        if rc != 0:
+            self.logger.error(f"libnftables command failed: {error}")
+            raise RuntimeError(f"nft command failed: {error}")
+
+        if json_output and output.strip():
+            try:
+                return json.loads(output)
+            except json.JSONDecodeError as e:
+                self.logger.error(f"Failed to parse nft JSON output: {e}")
+                return {"error": f"Failed to parse JSON: {e}", "raw_output": output}
+        return {"stdout": output, "stderr": error}
             
     def _handle_pyrewall_command(self, command: str, json_output: bool) -> Dict:
         """
@@ -216,9 +306,51 @@ class NFTablesManager:
         else:
             return self._run_nft_command("list ruleset", json_output=True)
     
+    def _run_nft_json(self, payload: Dict) -> Dict:
+        """
+        Feed a complete nftables JSON document to a single ``nft -j -f -`` call,
+        or to ``json_cmd`` when the libnftables backend is active.
+        
+        The kernel applies every command of the document as one atomic
+        transaction: either the whole batch is committed or nothing changes.
+        
+        Args:
+            payload: The document to apply (``{"nftables": [...]}``)
+            
+        Returns:
+            dict: stdout/stderr of the nft invocation
+        """
+        if self.use_libnftables:
+            with self._libnft_lock:
+                rc, output, error = self._libnft.json_cmd(payload)
+            if rc != 0:
+                self.logger.error(f"libnftables batch failed: {error}")
+                raise RuntimeError(f"nft batch failed: {error}")
+            return {"stdout": output, "stderr": error}
+
+        cmd = [self.nft_cmd, "-j", "-f", "-"]
+        try:
+            result = subprocess.run(
+                cmd,
+                input=json.dumps(payload, separators=(",", ":")),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                check=True
+            )
+            return {"stdout": result.stdout, "stderr": result.stderr}
+        except subprocess.CalledProcessError as e:
+            self.logger.error(f"nft batch failed: {e.stderr}")
+            raise RuntimeError(f"nft batch failed: {e.stderr}")
+
     def apply_ruleset(self, ruleset: Dict) -> bool:
         """
-        Apply a complete nftables ruleset.
+        Apply a complete nftables ruleset in a single atomic transaction.
+        
+        The ruleset is serialized once and loaded with ``nft -j -f -``. If the
+        document does not start with a ``flush ruleset`` command one is
+        prepended, so the old ruleset is replaced inside the same transaction
+        and there is never a window with the firewall flushed.
         
         Args:
             ruleset: The ruleset to apply (in nftables JSON format)
@@ -226,30 +358,359 @@ class NFTablesManager:
         Returns:
             bool: True if successful, False otherwise
         """
+        if not isinstance(ruleset, dict) or not isinstance(ruleset.get('nftables'), list):
+            self.logger.error("Invalid nftables ruleset format")
+            return False
+
+        commands = ruleset['nftables']
+        if not commands or commands[0] != {'flush': {'ruleset': None}}:
+            commands = [{'flush': {'ruleset': None}}] + commands
+
         try:
-            # First, flush the existing ruleset
-            self._run_nft_command("flush ruleset")
-            
-            # Apply the new ruleset
-            # Note: This is a simplified example - in a real implementation,
-            # you would need to convert the ruleset to nft commands
-            if isinstance(ruleset, dict) and 'nftables' in ruleset:
-                # This is a simplified example - actual implementation would need to handle
-                # the full nftables JSON format
-                for entry in ruleset['nftables']:
-                    # Process each rule/table/chain
-                    pass
-                    
-                self.logger.info("Successfully applied nftables ruleset")
-                return True
-            else:
-                self.logger.error("Invalid nftables ruleset format")
+            if self.use_pyrewall:
+                self.logger.error("Applying a JSON ruleset is not supported in pyrewall mode")
                 return False
+            elif self.use_mock:
+                return self.mock_firewall.apply_ruleset({'nftables': commands})
+
+            self._run_nft_json({'nftables': commands})
+            # The flush removed the block list table unless the document re-created it
+            self._blocklist_ready = any(
+                entry.get('add', {}).get('table', {}).get('name') == self.BLOCKLIST_TABLE
+                for entry in commands if isinstance(entry, dict)
+            )
+            self.logger.info(f"Successfully applied nftables ruleset ({len(commands)} commands)")
+            return True
                 
         except Exception as e:
             self.logger.error(f"Failed to apply nftables ruleset: {e}")
             return False
     
+    def apply_commands(self, commands: List[Dict]) -> bool:
+        """
+        Apply a list of nftables JSON commands as one atomic transaction.
+        
+        Unlike apply_ruleset, nothing is flushed: only the given add, replace
+        and delete commands are executed.
+        
+        Args:
+            commands: nftables JSON commands (e.g. ``{"delete": {"rule": {...}}}``)
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not commands:
+            return True
+        try:
+            if self.use_pyrewall or self.use_mock:
+                self.logger.error(f"Applying JSON commands is not supported in {self.backend} mode")
+                return False
+            self._run_nft_json({'nftables': commands})
+            self.logger.info(f"Applied {len(commands)} nftables commands")
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to apply nftables commands: {e}")
+            return False
+
+    # ----- Kernel block lists (named sets) -----
+    def blocklist_table_commands(self) -> List[Dict]:
+        """
+        Build the commands creating the block list table, its named sets and
+        the input chain dropping traffic from any address in those sets.
+        
+        Returns:
+            list: nftables JSON commands
+        """
+        family, table = self.BLOCKLIST_FAMILY, self.BLOCKLIST_TABLE
+        commands = [{'add': {'table': {'family': family, 'name': table}}}]
+        for name, (set_type, flags, _) in self.BLOCKLIST_SETS.items():
+            spec = {'family': family, 'table': table, 'name': name, 'type': set_type, 'flags': flags}
+            if 'interval' in flags:
+                # Overlapping networks are merged instead of rejected
+                spec['auto-merge'] = True
+            commands.append({'add': {'set': spec}})
+        commands.append({'add': {'chain': {
+            'family': family, 'table': table, 'name': 'input',
+            'type': 'filter', 'hook': 'input', 'prio': -10, 'policy': 'accept'
+        }}})
+        for name, (_, _, addr_family) in self.BLOCKLIST_SETS.items():
+            commands.append({'add': {'rule': {
+                'family': family, 'table': table, 'chain': 'input',
+                'expr': [
+                    {'match': {
+                        'op': '==',
+                        'left': {'payload': {'protocol': addr_family, 'field': 'saddr'}},
+                        'right': f'@{name}'
+                    }},
+                    {'drop': None}
+                ]
+            }}})
+        return commands
+
+    def ensure_blocklist(self) -> bool:
+        """
+        Create the block list table and sets unless they are already loaded.
+        
+        Returns:
+            bool: True if the block list is available, False otherwise
+        """
+        if self._blocklist_ready:
+            return True
+        try:
+            ruleset = self.get_ruleset()
+            entries = [entry for entry in ruleset.get('nftables', []) if isinstance(entry, dict)]
+            exists = any(
+                entry.get('table', {}).get('name') == self.BLOCKLIST_TABLE
+                and entry.get('table', {}).get('family') == self.BLOCKLIST_FAMILY
+                for entry in entries
+            )
+            live_flags = {
+                entry['set'].get('name'): set(entry['set'].get('flags', []))
+                for entry in entries
+                if isinstance(entry.get('set'), dict) and entry['set'].get('table') == self.BLOCKLIST_TABLE
+                and entry['set'].get('family') == self.BLOCKLIST_FAMILY
+            }
+            outdated = exists and any(
+                not set(flags) <= live_flags.get(name, set())
+                for name, (_, flags, _) in self.BLOCKLIST_SETS.items()
+            )
+            if outdated:
+                # Sets created by an older version (no interval flag): re-create
+                # them; the caller loads the elements again
+                self.logger.info("Re-creating nftables block list sets with the current flags")
+                commands = [{'delete': {'table': {'family': self.BLOCKLIST_FAMILY, 'name': self.BLOCKLIST_TABLE}}}]
+                if not self.apply_commands(commands + self.blocklist_table_commands()):
+                    return False
+            elif not exists and not self.apply_commands(self.blocklist_table_commands()):
+                return False
+            self._blocklist_ready = True
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to set up nftables block list: {e}")
+            return False
+
+    @classmethod
+    def blocklist_set_for(cls, address: str, interval: bool = False) -> str:
+        """Return the name of the set an address or network belongs to."""
+        version = ipaddress.ip_network(address, strict=False).version
+        prefix = "blocked_geo" if interval else "blocked_ip"
+        return f"{prefix}{version}"
+
+    def set_element_commands(self, verb: str, set_name: str, elements: List[Any],
+                             timeout: Optional[int] = None) -> List[Dict]:
+        """
+        Build an element command for a block list set.
+        
+        Args:
+            verb: 'add' or 'delete'
+            set_name: Name of the set
+            elements: Addresses, networks (``ip_network`` or CIDR strings)
+                or ``(address, timeout)`` tuples
+            timeout: Timeout in seconds applied to every plain address
+            
+        Returns:
+            list: A single-command list, or an empty list if there is nothing to do
+        """
+        elem = []
+        for element in elements:
+            element_timeout = timeout
+            if isinstance(element, tuple):
+                element, element_timeout = element
+            value = str(element)
+            if '/' in value:
+                net = ipaddress.ip_network(value, strict=False)
+                if net.prefixlen == net.max_prefixlen:
+                    value = str(net.network_address)
+                else:
+                    value = {'prefix': {'addr': str(net.network_address), 'len': net.prefixlen}}
+            if element_timeout and verb == 'add':
+                value = {'elem': {'val': value, 'timeout': max(1, int(element_timeout))}}
+            elem.append(value)
+        if not elem:
+            return []
+        return [{verb: {'element': {
+            'family': self.BLOCKLIST_FAMILY, 'table': self.BLOCKLIST_TABLE,
+            'name': set_name, 'elem': elem
+        }}}]
+
+    def add_set_elements(self, set_name: str, elements: List[Any], timeout: Optional[int] = None) -> bool:
+        """
+        Add elements to a block list set in one transaction.
+        
+        Args:
+            set_name: Name of the set (see BLOCKLIST_SETS)
+            elements: Addresses, networks or ``(address, timeout)`` tuples
+            timeout: Optional timeout in seconds for plain addresses
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not self.ensure_blocklist():
+            return False
+        return self.apply_commands(self.set_element_commands('add', set_name, elements, timeout))
+
+    def delete_set_elements(self, set_name: str, elements: List[Any], missing_ok: bool = False) -> bool:
+        """
+        Remove elements from a block list set.
+        
+        Deleting an element that already expired makes the whole batch fail,
+        so on failure each element is retried on its own. With ``missing_ok``
+        the elements are first added (without a timeout, which sets lacking
+        the timeout flag would refuse) in the same transaction, so the delete
+        succeeds whether or not they still exist.
+        
+        Args:
+            set_name: Name of the set (see BLOCKLIST_SETS)
+            elements: Addresses or networks to remove
+            missing_ok: Do not fail for elements that are already gone
+            
+        Returns:
+            bool: True if every element is gone, False otherwise
+        """
+        if not self.ensure_blocklist():
+            return False
+        if missing_ok:
+            return self.apply_commands(
+                self.set_element_commands('add', set_name, elements)
+                + self.set_element_commands('delete', set_name, elements)
+            )
+        if self.apply_commands(self.set_element_commands('delete', set_name, elements)):
+            return True
+        if len(elements) < 2:
+            return False
+        results = [self.apply_commands(self.set_element_commands('delete', set_name, [e])) for e in elements]
+        return all(results)
+
+    def flush_set(self, set_name: str) -> bool:
+        """Remove every element from a block list set."""
+        if not self.ensure_blocklist():
+            return False
+        return self.apply_commands([{'flush': {'set': {
+            'family': self.BLOCKLIST_FAMILY, 'table': self.BLOCKLIST_TABLE, 'name': set_name
+        }}}])
+
+    # ----- Kernel port knocking (dynamic sets) -----
+    @staticmethod
+    def _knock_set_name(service: str, stage: str, suffix: str) -> str:
+        return f"knock_{re.sub(r'[^A-Za-z0-9_]', '_', service)}_{stage}_{suffix}"
+
+    def knock_table_commands(self, services: Dict[str, Dict[str, Any]], window: int = 10,
+                             open_timeout: int = 30) -> List[Dict]:
+        """
+        Build the port knocking table: per service one dynamic set per knock
+        stage, an allow set and the rules moving sources between them.
+        
+        A knock on the first port adds the source to the stage 1 set; a knock
+        on port N from a source in the stage N-1 set adds it to stage N, and
+        the last knock adds it to the allow set. The protected port is dropped
+        for sources outside the allow set (established connections excepted);
+        the rule table still decides what allowed sources may reach.
+        
+        Args:
+            services: name -> ``{'sequence': [ports], 'port': protected port,
+                'protocol': 'tcp' or 'udp'}``
+            window: Seconds a source has to send the next knock
+            open_timeout: Seconds the protected port stays open after a sequence
+            
+        Returns:
+            list: nftables JSON commands (re-creating the table from scratch)
+        """
+        family, table = self.KNOCK_FAMILY, self.KNOCK_TABLE
+        table_ref = {'family': family, 'name': table}
+        # Adding first makes the delete succeed whether or not the table exists
+        commands = [
+            {'add': {'table': dict(table_ref)}},
+            {'delete': {'table': dict(table_ref)}},
+            {'add': {'table': dict(table_ref)}},
+            {'add': {'chain': {
+                'family': family, 'table': table, 'name': 'input',
+                'type': 'filter', 'hook': 'input', 'prio': -5, 'policy': 'accept'
+            }}},
+        ]
+
+        def rule(*expr):
+            commands.append({'add': {'rule': {
+                'family': family, 'table': table, 'chain': 'input', 'expr': list(expr)
+            }}})
+
+        for service, spec in services.items():
+            sequence = [int(port) for port in spec.get('sequence', [])]
+            protocol = spec.get('protocol', 'tcp')
+            if not sequence or not spec.get('port'):
+                continue
+            dport = {'payload': {'protocol': protocol, 'field': 'dport'}}
+            for suffix, (set_type, addr_family) in self.KNOCK_ADDRESS_FAMILIES.items():
+                saddr = {'payload': {'protocol': addr_family, 'field': 'saddr'}}
+                stages = [self._knock_set_name(service, str(i + 1), suffix) for i in range(len(sequence) - 1)]
+                allowed = self._knock_set_name(service, 'ok', suffix)
+                for name in stages + [allowed]:
+                    commands.append({'add': {'set': {
+                        'family': family, 'table': table, 'name': name, 'type': set_type,
+                        'flags': ['dynamic', 'timeout'], 'size': self.KNOCK_SET_SIZE,
+                        'timeout': open_timeout if name == allowed else window
+                    }}})
+                targets = stages + [allowed]
+                for index, port in enumerate(sequence):
+                    expr = [{'match': {'op': '==', 'left': dport, 'right': port}}]
+                    if index:
+                        expr.append({'match': {'op': '==', 'left': saddr, 'right': f'@{stages[index - 1]}'}})
+                    expr.append({'set': {'op': 'add', 'elem': saddr, 'set': f'@{targets[index]}'}})
+                    rule(*expr)
+                rule(
+                    {'match': {'op': '==', 'left': dport, 'right': int(spec['port'])}},
+                    {'match': {'op': '==', 'left': saddr, 'right': f'@{allowed}'}},
+                    {'accept': None}
+                )
+            protected = {'match': {'op': '==', 'left': dport, 'right': int(spec['port'])}}
+            rule(protected, {'match': {'op': 'in', 'left': {'ct': {'key': 'state'}},
+                                       'right': ['established', 'related']}}, {'accept': None})
+            rule(protected, {'drop': None})
+        return commands
+
+    def apply_port_knocking(self, services: Dict[str, Dict[str, Any]], window: int = 10,
+                            open_timeout: int = 30) -> bool:
+        """
+        Load the port knocking table (see knock_table_commands) in one transaction.
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        return self.apply_commands(self.knock_table_commands(services, window, open_timeout))
+
+    def remove_port_knocking(self) -> bool:
+        """Remove the port knocking table, opening the protected ports again."""
+        table_ref = {'family': self.KNOCK_FAMILY, 'name': self.KNOCK_TABLE}
+        return self.apply_commands([{'add': {'table': dict(table_ref)}}, {'delete': {'table': dict(table_ref)}}])
+
+    def get_knock_clients(self, services) -> Dict[str, Dict[str, Optional[int]]]:
+        """
+        Read which sources completed a knock sequence.
+        
+        Args:
+            services: Names of the knock services
+            
+        Returns:
+            dict: service -> {address: seconds until the port closes (None if unknown)}
+        """
+        clients: Dict[str, Dict[str, Optional[int]]] = {}
+        for service in services:
+            found = clients[service] = {}
+            for suffix in self.KNOCK_ADDRESS_FAMILIES:
+                name = self._knock_set_name(service, 'ok', suffix)
+                try:
+                    output = self._run_nft_command(
+                        f"list set {self.KNOCK_FAMILY} {self.KNOCK_TABLE} {name}", json_output=True
+                    )
+                except Exception:
+                    continue
+                for entry in output.get('nftables', []):
+                    for elem in (entry.get('set') or {}).get('elem', []):
+                        if isinstance(elem, dict) and 'elem' in elem:
+                            found[str(elem['elem'].get('val'))] = elem['elem'].get('expires')
+                        else:
+                            found[str(elem)] = None
+        return clients
+
     def add_rule(self, table: str, chain: str, rule: str) -> bool:
         """
         Add a rule to a specific chain.
@@ -264,10 +725,7 @@ class NFTablesManager:
         """
         try:
             cmd = f'add rule {table} {chain} {rule}'
-            success, output = self._run_command(cmd.split())
-            if not success:
-                self.logger.error(f"Failed to add rule: {output}")
-                return False
+            self._run_nft_command(cmd)
             self.logger.info(f"Added rule: {cmd}")
             return True
         except Exception as e:
@@ -349,21 +807,27 @@ class NFTablesManager:
         """
         try:
             self._run_nft_command("flush ruleset")
+            self._blocklist_ready = False
             self.logger.info("Flushed all nftables rules")
             return True
         except Exception as e:
             self.logger.error(f"Failed to flush ruleset: {e}")
             return False
 
-    def get_active_rules(self) -> List[Dict]:
+    def get_active_rules(self, ruleset: Optional[Dict] = None) -> List[Dict]:
         """
         Get a list of all active rules.
         
+        Args:
+            ruleset: Optional ruleset previously returned by get_ruleset, to
+                avoid listing the ruleset a second time
+        
         Returns:
             list: List of dictionaries containing rule information
         """
         try:
-            ruleset = self.get_ruleset()
+            if ruleset is None:
+                ruleset = self.get_ruleset()
             rules = []
             
             # Parse the ruleset to extract individual rules
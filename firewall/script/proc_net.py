@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Socket collector reading the /proc/net tables directly (Linux).
+
+psutil.net_connections() attributes every socket to its process by walking
+/proc/<pid>/fd for all processes, so its cost grows with the number of open
+file descriptors. This collector reads /proc/net/{tcp,tcp6,udp,udp6} with
+one bulk read per table and leaves the pid empty; pids are looked up on
+demand (pids_for) for the sockets that are actually displayed, and the scan
+stops as soon as those are found.
+
+The proc root is configurable, so recorded copies of the tables (e.g.
+``fixtures/proc/net/tcp`` and ``fixtures/proc/<pid>/fd``) can be parsed
+the same way as the live system.
+"""
+
+import os
+import socket
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional
+
+# Same field layout as psutil's addr/sconn, plus the socket inode and owner uid
+Addr = namedtuple('Addr', ['ip', 'port'])
+ProcSocket = namedtuple('ProcSocket', ['fd', 'family', 'type', 'laddr', 'raddr', 'status', 'pid', 'inode', 'uid'])
+
+# Kernel TCP states (include/net/tcp_states.h) with psutil's names
+TCP_STATES = {
+    1: 'ESTABLISHED',
+    2: 'SYN_SENT',
+    3: 'SYN_RECV',
+    4: 'FIN_WAIT1',
+    5: 'FIN_WAIT2',
+    6: 'TIME_WAIT',
+    7: 'CLOSE',
+    8: 'CLOSE_WAIT',
+    9: 'LAST_ACK',
+    10: 'LISTEN',
+    11: 'CLOSING',
+    12: 'NEW_SYN_RECV',
+}
+# psutil reports no state for UDP sockets
+NO_STATUS = 'NONE'
+
+
+class ProcNetCollector:
+    """Read inet sockets from /proc/net and attribute them to processes lazily"""
+
+    TABLES = (
+        ('tcp', socket.AF_INET, socket.SOCK_STREAM),
+        ('tcp6', socket.AF_INET6, socket.SOCK_STREAM),
+        ('udp', socket.AF_INET, socket.SOCK_DGRAM),
+        ('udp6', socket.AF_INET6, socket.SOCK_DGRAM),
+    )
+    # Decoded addresses kept between ticks (cleared when it grows past this)
+    MAX_ADDRESS_CACHE = 65536
+
+    def __init__(self, root: str = '/proc'):
+        """
+        Args:
+            root: Directory laid out like /proc (``net/tcp``, ``<pid>/fd``)
+        """
+        self.root = root
+        self._addresses: Dict[bytes, Addr] = {}
+        # socket inode -> pid (None: no readable owner), limited to the
+        # sockets of the last snapshot
+        self._inode_pids: Dict[int, Optional[int]] = {}
+        self.fd_scans = 0
+
+    @classmethod
+    def is_supported(cls, root: str = '/proc') -> bool:
+        """Whether the proc root has readable inet socket tables"""
+        return os.access(os.path.join(root, 'net', 'tcp'), os.R_OK)
+
+    def _read_table(self, name: str) -> bytes:
+        try:
+            with open(os.path.join(self.root, 'net', name), 'rb') as f:
+                return f.read()
+        except OSError:
+            # e.g. IPv6 disabled
+            return b''
+
+    def _address(self, value: bytes, family: int) -> Addr:
+        """Decode ``0100007F:0035`` (address words in host byte order, hex port)"""
+        addr = self._addresses.get(value)
+        if addr is None:
+            host, port = value.split(b':')
+            raw = bytes.fromhex(host.decode('ascii'))
+            # Each 32-bit word is stored in little-endian order
+            raw = b''.join(raw[i:i + 4][::-1] for i in range(0, len(raw), 4))
+            addr = Addr(socket.inet_ntop(family, raw), int(port, 16))
+            if len(self._addresses) >= self.MAX_ADDRESS_CACHE:
+                self._addresses.clear()
+            self._addresses[value] = addr
+        return addr
+
+    def connections(self) -> List[ProcSocket]:
+        """
+        Read every inet socket.
+
+        Returns:
+            list: ProcSocket rows (pid is None; see pids_for). Sockets without
+                a peer have an empty raddr, as with psutil.
+        """
+        result: List[ProcSocket] = []
+        for name, family, sock_type in self.TABLES:
+            lines = self._read_table(name).splitlines()
+            tcp = sock_type == socket.SOCK_STREAM
+            for line in lines[1:]:
+                fields = line.split()
+                if len(fields) < 10:
+                    continue
+                laddr = self._address(fields[1], family)
+                raddr = self._address(fields[2], family)
+                if not raddr.port and raddr.ip in ('0.0.0.0', '::'):
+                    raddr = ()
+                status = TCP_STATES.get(int(fields[3], 16), NO_STATUS) if tcp else NO_STATUS
+                result.append(ProcSocket(
+                    -1, family, sock_type, laddr, raddr, status, None, int(fields[9]), int(fields[7])
+                ))
+
+        live = {row.inode for row in result}
+        self._inode_pids = {inode: pid for inode, pid in self._inode_pids.items() if inode in live}
+        return result
+
+    def pids_for(self, inodes: Iterable[int]) -> Dict[int, Optional[int]]:
+        """
+        Find the processes owning the given sockets.
+
+        Known inodes are answered from the cache; otherwise /proc/<pid>/fd is
+        scanned until all requested inodes are found. Every socket seen on
+        the way is cached too, and so are sockets without a readable owner
+        (until they close).
+
+        Args:
+            inodes: Socket inodes (ProcSocket.inode)
+
+        Returns:
+            dict: inode -> pid, or None if no readable process owns it
+        """
+        wanted = {inode for inode in inodes if inode}
+        missing = wanted.difference(self._inode_pids)
+        if missing:
+            self.fd_scans += 1
+            self._scan_fds(missing)
+            for inode in missing:
+                self._inode_pids[inode] = None
+        return {inode: self._inode_pids.get(inode) for inode in wanted}
+
+    def _scan_fds(self, missing: set):
+        try:
+            entries = os.listdir(self.root)
+        except OSError:
+            return
+        for entry in entries:
+            if not entry.isdigit():
+                continue
+            fd_dir = os.path.join(self.root, entry, 'fd')
+            try:
+                fds = os.listdir(fd_dir)
+            except OSError:
+                # Process exited or is not ours to inspect
+                continue
+            pid = int(entry)
+            for fd in fds:
+                try:
+                    target = os.readlink(os.path.join(fd_dir, fd))
+                except OSError:
+                    continue
+                if target.startswith('socket:['):
+                    inode = int(target[8:-1])
+                    self._inode_pids[inode] = pid
+                    missing.discard(inode)
+            if not missing:
+                return
+
+    @property
+    def known_pids(self) -> set:
+        """Pids owning a socket of the last snapshot, as far as they were looked up"""
+        return {pid for pid in self._inode_pids.values() if pid}
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+CIDR-aware index of malicious address ranges.
+
+Threat feed entries (single addresses, CIDRs and ``start-end`` ranges,
+IPv4 and IPv6) are parsed into integer intervals, sorted and coalesced.
+The intervals are stored in flat arrays (IPv4 as 32-bit integers, IPv6 as
+pairs of 64-bit halves), so a feed of millions of entries costs a few bytes
+per range instead of a Python string per line, and a lookup is a binary
+search.
+
+An index merged from several feeds can carry a tag per interval: a bitmask
+of the feeds listing it. Such an index can be saved to a binary file and
+opened again with ``mmap``, so lookups start without parsing anything and
+processes using the same file share its pages.
+"""
+
+import ipaddress
+import json
+import mmap
+import os
+import socket
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:  # pragma: no cover - optional dependency
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - runtime fallback
+    np = None  # type: ignore
+
+_MASK64 = (1 << 64) - 1
+_MAX4 = (1 << 32) - 1
+_MAX6 = (1 << 128) - 1
+
+# Maximum number of feeds distinguished by interval tags
+MAX_TAGGED_FEEDS = 64
+
+# Cache file: header, JSON metadata, then the arrays (native byte order)
+CACHE_MAGIC = b'TUXREP01'
+_CACHE_HEADER = struct.Struct('<8s8sQQQ')  # magic, byte order, n4, n6, metadata length
+
+
+def _pack4(text: str) -> int:
+    return int.from_bytes(socket.inet_aton(text), 'big') if text.count('.') == 3 else -1
+
+
+def _pack6(text: str) -> int:
+    return int.from_bytes(socket.inet_pton(socket.AF_INET6, text), 'big')
+
+
+def parse_entry(entry: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Parse one feed entry into an interval.
+
+    Accepts addresses, CIDRs and ``start-end`` ranges. Anything after the
+    first whitespace, ``#`` or ``;`` is ignored.
+
+    Args:
+        entry: The feed line
+
+    Returns:
+        tuple: (version, first, last) as integers, or None if the entry is invalid
+    """
+    text = entry.split('#', 1)[0].split(';', 1)[0].strip()
+    if not text:
+        return None
+    text = text.split(None, 1)[0]
+    try:
+        if ':' not in text:
+            address, slash, prefix = text.partition('/')
+            if not slash and '-' in address:
+                first, _, last = address.partition('-')
+                first, last = _pack4(first.strip()), _pack4(last.strip())
+                if first < 0 or last < first:
+                    return None
+                return 4, first, last
+            value = _pack4(address)
+            if value < 0:
+                return None
+            if not slash:
+                return 4, value, value
+            host_bits = 32 - int(prefix)
+            if not 0 <= host_bits <= 32:
+                return None
+            first = value >> host_bits << host_bits
+            return 4, first, first | ((1 << host_bits) - 1)
+
+        address, slash, prefix = text.partition('/')
+        if not slash and '-' in address:
+            first, _, last = address.partition('-')
+            first, last = _pack6(first.strip()), _pack6(last.strip())
+            return (6, first, last) if first <= last else None
+        value = _pack6(address)
+        if not slash:
+            return 6, value, value
+        host_bits = 128 - int(prefix)
+        if not 0 <= host_bits <= 128:
+            return None
+        first = value >> host_bits << host_bits
+        return 6, first, first | ((1 << host_bits) - 1)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(intervals: List[int], bits: int) -> Tuple[List[int], List[int]]:
+    """
+    Coalesce intervals encoded as ``first << bits | last``.
+
+    Overlapping and adjacent intervals are merged.
+
+    Returns:
+        tuple: (firsts, lasts) of the merged intervals, sorted
+    """
+    intervals.sort()
+    mask = (1 << bits) - 1
+    firsts: List[int] = []
+    lasts: List[int] = []
+    current_first = current_last = None
+    for key in intervals:
+        first, last = key >> bits, key & mask
+        if current_last is not None and first <= current_last + 1:
+            if last > current_last:
+                current_last = last
+            continue
+        if current_last is not None:
+            firsts.append(current_first)
+            lasts.append(current_last)
+        current_first, current_last = first, last
+    if current_last is not None:
+        firsts.append(current_first)
+        lasts.append(current_last)
+    return firsts, lasts
+
+
+def _merge4_numpy(firsts, lasts) -> Tuple[array, array]:
+    """Vectorized version of _merge for IPv4 intervals."""
+    order = np.lexsort((lasts, firsts))
+    firsts, lasts = firsts[order], lasts[order]
+    running_last = np.maximum.accumulate(lasts)
+    # A new interval starts where the range is not contiguous with everything before it
+    starts = np.empty(len(firsts), dtype=bool)
+    starts[0] = True
+    starts[1:] = firsts[1:] > running_last[:-1] + 1
+    start_positions = np.flatnonzero(starts)
+    end_positions = np.append(start_positions[1:] - 1, len(firsts) - 1)
+    return (array('I', firsts[start_positions].astype(np.uint32).tobytes()),
+            array('I', running_last[end_positions].astype(np.uint32).tobytes()))
+
+
+def _sweep(keys: List[int]) -> Tuple[List[int], List[int], List[int]]:
+    """
+    Split tagged intervals into disjoint segments with the OR of their tags.
+
+    Each key encodes an interval boundary as ``position << 7 | start << 6 | feed``;
+    ends are encoded at ``last + 1``. Intervals of one feed are disjoint, so
+    every boundary toggles exactly one feed bit.
+
+    Returns:
+        tuple: (firsts, lasts, tags) of the segments; adjacent segments with
+            the same tag are merged
+    """
+    keys.sort()
+    firsts: List[int] = []
+    lasts: List[int] = []
+    tags: List[int] = []
+    mask = 0
+    position = None
+    for key in keys:
+        key_position = key >> 7
+        if key_position != position:
+            if mask and position is not None:
+                if tags and tags[-1] == mask and lasts[-1] + 1 == position:
+                    lasts[-1] = key_position - 1
+                else:
+                    firsts.append(position)
+                    lasts.append(key_position - 1)
+                    tags.append(mask)
+            position = key_position
+        mask ^= 1 << (key & 63)
+    return firsts, lasts, tags
+
+
+def _sweep4_numpy(keys) -> Tuple[array, array, array]:
+    """Vectorized version of _sweep for IPv4 boundaries."""
+    keys = np.sort(keys)
+    positions = keys >> np.uint64(7)
+    masks = np.bitwise_xor.accumulate(np.left_shift(np.uint64(1), keys & np.uint64(63)))
+    # State after the last boundary at each position
+    last = np.append(positions[1:] != positions[:-1], True)
+    positions, masks = positions[last], masks[last]
+    # Keep only positions where the tag changes
+    changed = np.append(True, masks[1:] != masks[:-1])
+    positions, masks = positions[changed], masks[changed]
+    segment_lasts = np.append(positions[1:] - np.uint64(1), positions[-1:])
+    covered = masks != 0
+    return (array('I', positions[covered].astype(np.uint32).tobytes()),
+            array('I', segment_lasts[covered].astype(np.uint32).tobytes()),
+            array('Q', masks[covered].astype(np.uint64).tobytes()))
+
+
+def _to_bytes(values, typecode: str) -> bytes:
+    """Serialize an array or memoryview of integers in native byte order."""
+    if isinstance(values, memoryview) and values.format == typecode:
+        return values.tobytes()
+    if isinstance(values, array) and values.typecode == typecode:
+        return values.tobytes()
+    return array(typecode, values).tobytes()
+
+
+class _U128View:
+    """Sequence view joining two arrays of 64-bit halves into 128-bit integers."""
+    __slots__ = ('high', 'low')
+
+    def __init__(self, high: array, low: array):
+        self.high = high
+        self.low = low
+
+    def __len__(self) -> int:
+        return len(self.high)
+
+    def __getitem__(self, index: int) -> int:
+        return self.high[index] << 64 | self.low[index]
+
+
+class ReputationIndex:
+    """Sorted, coalesced address intervals answering membership queries"""
+
+    def __init__(self, firsts4: Optional[array] = None, lasts4: Optional[array] = None,
+                 firsts6: Optional[Tuple[array, array]] = None,
+                 lasts6: Optional[Tuple[array, array]] = None,
+                 tags4: Optional[array] = None, tags6: Optional[array] = None):
+        """
+        Args:
+            firsts4/lasts4: IPv4 interval bounds, array('I'), sorted and disjoint
+            firsts6/lasts6: IPv6 interval bounds as (high, low) array('Q') pairs
+            tags4/tags6: Optional feed bitmask per interval, array('Q')
+        
+        Any sequence of integers with the same layout (e.g. a memoryview
+        over a mapped cache file) can be used instead of the arrays.
+        """
+        self.firsts4 = firsts4 if firsts4 is not None else array('I')
+        self.lasts4 = lasts4 if lasts4 is not None else array('I')
+        self.firsts6 = firsts6 or (array('Q'), array('Q'))
+        self.lasts6 = lasts6 or (array('Q'), array('Q'))
+        self.tags4 = tags4
+        self.tags6 = tags6
+        self._firsts6_view = _U128View(*self.firsts6)
+        self._lasts6_view = _U128View(*self.lasts6)
+        # Keeps a mapped cache file open for as long as the index is used
+        self._mapping = None
+
+    @classmethod
+    def from_intervals(cls, intervals4: List[int], intervals6: List[int]) -> 'ReputationIndex':
+        """
+        Build an index from encoded intervals (``first << bits | last``).
+
+        Args:
+            intervals4: IPv4 intervals encoded with bits=32 (consumed)
+            intervals6: IPv6 intervals encoded with bits=128 (consumed)
+        """
+        if np is not None and intervals4:
+            packed = np.fromiter(intervals4, dtype=np.uint64, count=len(intervals4))
+            firsts4, lasts4 = _merge4_numpy(packed >> np.uint64(32), packed & np.uint64(_MAX4))
+        else:
+            firsts, lasts = _merge(intervals4, 32)
+            firsts4, lasts4 = array('I', firsts), array('I', lasts)
+        firsts, lasts = _merge(intervals6, 128)
+        return cls(
+            firsts4, lasts4,
+            (array('Q', (v >> 64 for v in firsts)), array('Q', (v & _MASK64 for v in firsts))),
+            (array('Q', (v >> 64 for v in lasts)), array('Q', (v & _MASK64 for v in lasts))),
+        )
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[str]) -> 'ReputationIndex':
+        """
+        Build an index from feed lines.
+
+        Comment lines and invalid entries are skipped.
+
+        Args:
+            entries: Feed lines (addresses, CIDRs or ranges)
+        """
+        intervals4: List[int] = []
+        intervals6: List[int] = []
+        add4 = intervals4.append
+        add6 = intervals6.append
+        inet_aton = socket.inet_aton
+        from_bytes = int.from_bytes
+        for line in entries:
+            line = line.strip()
+            if not line or line[0] == '#':
+                continue
+            # Fast path: plain IPv4 address
+            if line.count('.') == 3 and line[-1].isdigit() and ' ' not in line and '/' not in line \
+                    and '-' not in line:
+                try:
+                    value = from_bytes(inet_aton(line), 'big')
+                except OSError:
+                    continue
+                add4(value << 32 | value)
+                continue
+            parsed = parse_entry(line)
+            if parsed is None:
+                continue
+            version, first, last = parsed
+            if version == 4:
+                add4(first << 32 | last)
+            else:
+                add6(first << 128 | last)
+        return cls.from_intervals(intervals4, intervals6)
+
+    @classmethod
+    def from_text(cls, text: str) -> 'ReputationIndex':
+        """Build an index from the body of a feed."""
+        return cls.from_entries(text.splitlines())
+
+    @classmethod
+    def union(cls, indexes: Iterable['ReputationIndex']) -> 'ReputationIndex':
+        """Merge several indexes into one."""
+        intervals4: List[int] = []
+        intervals6: List[int] = []
+        for index in indexes:
+            intervals4.extend(first << 32 | last for first, last in zip(index.firsts4, index.lasts4))
+            intervals6.extend(
+                first << 128 | last
+                for first, last in zip(index._firsts6_view, index._lasts6_view)
+            )
+        return cls.from_intervals(intervals4, intervals6)
+
+    @classmethod
+    def union_tagged(cls, indexes: List['ReputationIndex']) -> 'ReputationIndex':
+        """
+        Merge per-feed indexes, tagging each interval with the feeds listing it.
+
+        Bit ``i`` of an interval tag stands for ``indexes[i]``.
+
+        Args:
+            indexes: One index per feed (at most MAX_TAGGED_FEEDS)
+        """
+        if len(indexes) > MAX_TAGGED_FEEDS:
+            raise ValueError(f"At most {MAX_TAGGED_FEEDS} feeds can be tagged")
+        keys4: List[int] = []
+        keys6: List[int] = []
+        for bit, index in enumerate(indexes):
+            start = 64 | bit
+            keys4.extend(key for first, last in zip(index.firsts4, index.lasts4)
+                         for key in (first << 7 | start, (last + 1) << 7 | bit))
+            keys6.extend(key for first, last in zip(index._firsts6_view, index._lasts6_view)
+                         for key in (first << 7 | start, (last + 1) << 7 | bit))
+        if np is not None and keys4:
+            firsts4, lasts4, tags4 = _sweep4_numpy(np.fromiter(keys4, dtype=np.uint64, count=len(keys4)))
+        else:
+            firsts, lasts, tags = _sweep(keys4)
+            firsts4, lasts4, tags4 = array('I', firsts), array('I', lasts), array('Q', tags)
+        firsts, lasts, tags = _sweep(keys6)
+        return cls(
+            firsts4, lasts4,
+            (array('Q', (v >> 64 for v in firsts)), array('Q', (v & _MASK64 for v in firsts))),
+            (array('Q', (v >> 64 for v in lasts)), array('Q', (v & _MASK64 for v in lasts))),
+            tags4, array('Q', tags),
+        )
+
+    def select(self, bit: int) -> 'ReputationIndex':
+        """
+        Extract the intervals of one feed from a tagged index.
+
+        Args:
+            bit: Position of the feed in the list passed to union_tagged
+        """
+        mask = 1 << bit
+        intervals4 = [
+            first << 32 | last
+            for first, last, tag in zip(self.firsts4, self.lasts4, self.tags4 or ())
+            if tag & mask
+        ]
+        intervals6 = [
+            first << 128 | last
+            for first, last, tag in zip(self._firsts6_view, self._lasts6_view, self.tags6 or ())
+            if tag & mask
+        ]
+        return self.from_intervals(intervals4, intervals6)
+
+    def save(self, path: str, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Write the index to a binary cache file (atomically).
+
+        Layout: a fixed header, the JSON metadata, then the IPv4 bounds and
+        tags followed by the IPv6 bounds and tags, each array 8-byte aligned,
+        in native byte order.
+
+        Args:
+            path: Destination file
+            metadata: JSON serializable data stored with the index
+        """
+        n4, n6 = len(self.firsts4), len(self.firsts6[0])
+        tags4 = self.tags4 if self.tags4 is not None else array('Q', bytes(8 * n4))
+        tags6 = self.tags6 if self.tags6 is not None else array('Q', bytes(8 * n6))
+        meta = json.dumps(metadata or {}).encode('utf-8')
+        meta += b' ' * (-len(meta) % 8)
+        parts = [
+            _CACHE_HEADER.pack(CACHE_MAGIC, sys.byteorder.encode('ascii').ljust(8), n4, n6, len(meta)),
+            meta,
+        ]
+        for values, typecode in ((self.firsts4, 'I'), (self.lasts4, 'I'), (tags4, 'Q'),
+                                 (self.firsts6[0], 'Q'), (self.firsts6[1], 'Q'),
+                                 (self.lasts6[0], 'Q'), (self.lasts6[1], 'Q'), (tags6, 'Q')):
+            data = _to_bytes(values, typecode)
+            parts.append(data + b'\0' * (-len(data) % 8))
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for part in parts:
+                    f.write(part)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> Tuple['ReputationIndex', Dict[str, Any]]:
+        """
+        Open a cache file written by save() without copying it.
+
+        The arrays of the returned index are memoryviews over a read-only
+        mapping of the file.
+
+        Args:
+            path: Cache file
+
+        Returns:
+            tuple: (index, metadata)
+
+        Raises:
+            ValueError: If the file is not a valid cache for this machine
+            OSError: If the file cannot be read
+        """
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _CACHE_HEADER.size:
+                raise ValueError("Truncated reputation cache")
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, byteorder, n4, n6, meta_len = _CACHE_HEADER.unpack_from(mapping, 0)
+        if magic != CACHE_MAGIC or byteorder.strip().decode('ascii', 'replace') != sys.byteorder:
+            raise ValueError("Not a reputation cache for this machine")
+        offset = _CACHE_HEADER.size
+        metadata = json.loads(bytes(mapping[offset:offset + meta_len]).decode('utf-8') or '{}')
+        offset += meta_len
+
+        view = memoryview(mapping)
+        arrays = []
+        for count, itemsize, fmt in ((n4, 4, 'I'), (n4, 4, 'I'), (n4, 8, 'Q'),
+                                     (n6, 8, 'Q'), (n6, 8, 'Q'), (n6, 8, 'Q'), (n6, 8, 'Q'), (n6, 8, 'Q')):
+            length = count * itemsize
+            if offset + length > size:
+                raise ValueError("Truncated reputation cache")
+            arrays.append(view[offset:offset + length].cast(fmt))
+            offset += length + (-length % 8)
+        firsts4, lasts4, tags4, f6_high, f6_low, l6_high, l6_low, tags6 = arrays
+        index = cls(firsts4, lasts4, (f6_high, f6_low), (l6_high, l6_low), tags4, tags6)
+        index._mapping = mapping
+        return index, metadata
+
+    def feeds_for(self, address) -> int:
+        """
+        Return the feed bitmask of the interval covering an address.
+
+        Returns:
+            int: The tag, 1 for a covered address in an untagged index, 0 if not covered
+        """
+        if isinstance(address, str):
+            try:
+                version, value = (6, _pack6(address)) if ':' in address else (4, _pack4(address))
+            except (OSError, ValueError):
+                return 0
+            if value < 0:
+                return 0
+        else:
+            version, value = address.version, int(address)
+        if version == 4:
+            position = bisect_right(self.firsts4, value) - 1
+            if position < 0 or value > self.lasts4[position]:
+                return 0
+            return self.tags4[position] if self.tags4 is not None else 1
+        position = bisect_right(self._firsts6_view, value) - 1
+        if position < 0 or value > self._lasts6_view[position]:
+            return 0
+        return self.tags6[position] if self.tags6 is not None else 1
+
+    def __len__(self) -> int:
+        """Number of disjoint intervals."""
+        return len(self.firsts4) + len(self.firsts6[0])
+
+    def num_addresses(self) -> int:
+        """Number of addresses covered by the index."""
+        total = sum(last - first + 1 for first, last in zip(self.firsts4, self.lasts4))
+        return total + sum(last - first + 1 for first, last in zip(self._firsts6_view, self._lasts6_view))
+
+    def contains_int(self, version: int, value: int) -> bool:
+        """Check a packed address of the given IP version."""
+        if version == 4:
+            position = bisect_right(self.firsts4, value) - 1
+            return position >= 0 and value <= self.lasts4[position]
+        position = bisect_right(self._firsts6_view, value) - 1
+        return position >= 0 and value <= self._lasts6_view[position]
+
+    def __contains__(self, address) -> bool:
+        """
+        Check whether an address is covered.
+
+        Args:
+            address: Address string or ipaddress object
+        """
+        if isinstance(address, str):
+            try:
+                if ':' in address:
+                    return self.contains_int(6, _pack6(address))
+                value = _pack4(address)
+                return value >= 0 and self.contains_int(4, value)
+            except (OSError, ValueError):
+                return False
+        if isinstance(address, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+            return self.contains_int(address.version, int(address))
+        return False
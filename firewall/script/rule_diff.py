@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Incremental ruleset diff engine.
+
+Rules generated by TuxFw carry an nftables comment of the form
+``tuxfw:<rule id>#<n>:<digest>``, where ``n`` is the index of the nftables
+rule generated from the configured rule (direction 'both' yields two) and
+``digest`` is a short hash of its expression list. Comparing the desired
+rules with the live ruleset by that key gives the minimal set of add,
+replace and delete commands, so a reload costs O(changes) instead of a
+flush-and-rebuild of the whole ruleset.
+
+nftables evaluates a chain in order, so new rules are inserted before the
+next rule that is already live (or appended when none follows), giving the
+same order as a full rebuild. If the rules that stay in place are in a
+different order than configured, the diff is flagged ``reordered`` and the
+caller has to rebuild the ruleset instead.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Any
+
+RULE_COMMENT_PREFIX = "tuxfw:"
+
+
+def rule_digest(expr: List[Dict[str, Any]]) -> str:
+    """Return a short, stable digest of an nftables expression list."""
+    encoded = json.dumps(expr, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+
+def make_rule_comment(rule_id: str, index: int, expr: List[Dict[str, Any]]) -> str:
+    """Build the comment used to recognise a generated rule in the live ruleset."""
+    return f"{RULE_COMMENT_PREFIX}{rule_id}#{index}:{rule_digest(expr)}"
+
+
+def parse_rule_comment(comment: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    Split a generated rule comment into its key and digest.
+
+    Returns:
+        tuple: (``"<rule id>#<n>"``, digest), or None for rules not created by TuxFw
+    """
+    if not comment or not comment.startswith(RULE_COMMENT_PREFIX):
+        return None
+    key, sep, digest = comment[len(RULE_COMMENT_PREFIX):].rpartition(":")
+    if not sep or not key:
+        return None
+    return key, digest
+
+
+def _location(rule: Dict[str, Any]) -> Tuple[str, str, str]:
+    return rule.get("family", "ip"), rule.get("table", ""), rule.get("chain", "")
+
+
+@dataclass
+class RuleDiff:
+    """
+    Operations needed to turn the live ruleset into the desired one
+
+    ``add`` is in configuration order; a rule carrying a ``handle`` is
+    inserted before that live rule, others are appended to their chain.
+    """
+    add: List[Dict[str, Any]] = field(default_factory=list)
+    replace: List[Dict[str, Any]] = field(default_factory=list)
+    delete: List[Dict[str, Any]] = field(default_factory=list)
+    # Live rules are in a different order than configured
+    reordered: bool = False
+
+    def __len__(self) -> int:
+        return len(self.add) + len(self.replace) + len(self.delete)
+
+    def is_empty(self) -> bool:
+        return len(self) == 0
+
+    def to_commands(self) -> List[Dict[str, Any]]:
+        """Return the diff as nftables JSON commands (deletes first)."""
+        commands = [{"delete": {"rule": rule}} for rule in self.delete]
+        commands.extend({"replace": {"rule": rule}} for rule in self.replace)
+        commands.extend(
+            {"insert": {"rule": rule}} if "handle" in rule else {"add": {"rule": rule}}
+            for rule in self.add
+        )
+        return commands
+
+
+def compute_rule_diff(desired: List[Dict[str, Any]], live: List[Dict[str, Any]]) -> RuleDiff:
+    """
+    Compare desired rules with the live rules and return the needed operations.
+
+    Args:
+        desired: nftables rule objects (family/table/chain/expr/comment) whose
+            comment was built with make_rule_comment
+        live: Rule objects as listed by nftables, including their ``handle``.
+            Rules without a TuxFw comment are left untouched.
+
+    Returns:
+        RuleDiff: The add, replace and delete operations
+    """
+    diff = RuleDiff()
+    position = {id(rule): index for index, rule in enumerate(live)}
+
+    live_by_key: Dict[str, Dict[str, Any]] = {}
+    for rule in live:
+        parsed = parse_rule_comment(rule.get("comment"))
+        if parsed is None:
+            continue
+        key = parsed[0]
+        if key in live_by_key:
+            # Duplicate of an already seen rule: drop it
+            diff.delete.append(_delete_spec(rule))
+        else:
+            live_by_key[key] = rule
+
+    # Desired rules in order, with the live rule kept in its place (or None)
+    placed: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]] = []
+    for rule in desired:
+        parsed = parse_rule_comment(rule.get("comment"))
+        current = live_by_key.pop(parsed[0], None) if parsed is not None else None
+        if current is not None and _location(current) != _location(rule):
+            diff.delete.append(_delete_spec(current))
+            current = None
+        placed.append((rule, current))
+        if current is None:
+            continue
+        if parse_rule_comment(current.get("comment"))[1] != parsed[1]:
+            diff.replace.append(dict(rule, handle=current["handle"]))
+
+    # Kept rules must already be in configuration order within each chain
+    last_position: Dict[Tuple[str, str, str], int] = {}
+    for rule, current in placed:
+        if current is None:
+            continue
+        location = _location(rule)
+        if position[id(current)] < last_position.get(location, -1):
+            diff.reordered = True
+        last_position[location] = position[id(current)]
+
+    # New rules go before the next kept rule of their chain
+    next_handle: Dict[Tuple[str, str, str], Any] = {}
+    added: List[Dict[str, Any]] = []
+    for rule, current in reversed(placed):
+        location = _location(rule)
+        if current is not None:
+            next_handle[location] = current["handle"]
+        elif location in next_handle:
+            added.append(dict(rule, handle=next_handle[location]))
+        else:
+            added.append(rule)
+    diff.add = added[::-1]
+
+    # Whatever is left in the live set is no longer configured
+    diff.delete.extend(_delete_spec(rule) for rule in live_by_key.values())
+    return diff
+
+
+def _delete_spec(rule: Dict[str, Any]) -> Dict[str, Any]:
+    family, table, chain = _location(rule)
+    return {"family": family, "table": table, "chain": chain, "handle": rule["handle"]}
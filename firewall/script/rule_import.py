@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Streaming reader for rule export files.
+
+Exports are JSON objects with a ``rules`` array (as written by
+FirewallManager.export_rules) or a bare array of rules. The reader decodes
+one rule at a time from fixed-size chunks with ``JSONDecoder.raw_decode``,
+so memory stays bounded by the chunk size plus the largest single rule,
+instead of holding the whole document text and its parsed tree at once.
+"""
+
+import codecs
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Iterator, List, Optional, Tuple
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class RuleStreamReader:
+    """Incrementally decode the rules of an export file"""
+
+    def __init__(self, fp: BinaryIO, chunk_size: int = 64 * 1024):
+        """
+        Args:
+            fp: File object opened in binary mode
+            chunk_size: Number of bytes read at a time
+        """
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8-sig')()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Append the next chunk to the buffer, dropping what was consumed."""
+        if self._eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        self.bytes_read += len(chunk)
+        if not chunk:
+            self._eof = True
+        self._buf = self._buf[self._pos:] + self._text.decode(chunk, final=self._eof)
+        self._pos = 0
+        return bool(chunk)
+
+    def _peek(self) -> str:
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, char: str):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' in rules file, found '{found or 'EOF'}'")
+        self._pos += 1
+
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A value ending exactly at the buffer end may be a truncated number
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _array(self) -> Iterator[Any]:
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            separator = self._peek()
+            self._pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError(f"Unexpected '{separator or 'EOF'}' in rules array")
+
+    def __iter__(self) -> Iterator[Any]:
+        """
+        Yield the entries of the rules array one by one.
+
+        Raises:
+            ValueError: If the document has no ``rules`` array
+        """
+        first = self._peek()
+        if first == '[':
+            yield from self._array()
+            return
+        self._expect('{')
+        found = False
+        while self._peek() != '}':
+            key = self._value()
+            self._expect(':')
+            if key == 'rules' and self._peek() == '[':
+                found = True
+                yield from self._array()
+            else:
+                self._value()
+            if self._peek() == ',':
+                self._pos += 1
+        if not found:
+            raise ValueError("Invalid rules file format: no 'rules' array")
+
+
+def iter_rule_chunks(fp: BinaryIO, chunk_rules: int = 1000,
+                     progress_callback: Optional[Callable[[int, int], None]] = None) -> Iterator[list]:
+    """
+    Read the rules of an export file in lists of at most ``chunk_rules``.
+
+    Args:
+        fp: File object opened in binary mode
+        chunk_rules: Maximum number of rules per chunk
+        progress_callback: Called after each chunk with (rules read, bytes read)
+
+    Yields:
+        list: Raw rule entries as decoded from the file
+    """
+    reader = RuleStreamReader(fp)
+    chunk = []
+    count = 0
+    for entry in reader:
+        chunk.append(entry)
+        if len(chunk) >= chunk_rules:
+            count += len(chunk)
+            yield chunk
+            chunk = []
+            if progress_callback:
+                progress_callback(count, reader.bytes_read)
+    if chunk:
+        count += len(chunk)
+        yield chunk
+    if progress_callback:
+        progress_callback(count, reader.bytes_read)
+
+
+@dataclass
+class ImportResult:
+    """Outcome of a rule import; true only if every rule was applied and saved"""
+    applied: int = 0
+    failed: int = 0
+    # Entries of the file that are not rule objects
+    skipped: int = 0
+    saved: bool = True
+    # (applied, failed) rules of each chunk, in file order
+    chunks: List[Tuple[int, int]] = field(default_factory=list)
+
+    @property
+    def partial(self) -> bool:
+        """Some rules were applied, others failed"""
+        return bool(self.applied and self.failed)
+
+    def __bool__(self) -> bool:
+        return self.saved and not self.failed
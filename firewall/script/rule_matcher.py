@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compiled matcher for configured firewall rules.
+
+A RuleMatcher is built once from the rules of the current profile and
+answers "which rule would match this connection" without walking the rule
+list. Every dimension (protocol, direction, address family, interface,
+connection state, source/destination port and address) is indexed
+separately and returns a bitmask of candidate rules: bit ``i`` stands for
+the ``i``-th enabled rule in configuration order. The masks are AND-ed and
+the lowest set bit is the first matching rule.
+
+The address parsing and family selection are shared with the nftables
+rule compiler in FirewallManager, so a dry run matches what the generated
+rules match.
+"""
+
+import ipaddress
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MAX_PORT = 65535
+WILDCARDS = ('', 'any', 'all', '*')
+
+
+def parse_port_spec(spec: Any) -> List[Tuple[int, int]]:
+    """
+    Parse a port specification into inclusive intervals.
+
+    Accepts single ports (``"80"``), ranges (``"1000-2000"``) and comma
+    separated combinations of both (``"22,80,8000-8080"``). Invalid items
+    are ignored.
+
+    Args:
+        spec: The port specification (string or int)
+
+    Returns:
+        list: ``(low, high)`` tuples; empty when the spec matches any port
+    """
+    if spec is None:
+        return []
+    intervals = []
+    for item in str(spec).split(','):
+        item = item.strip()
+        if not item:
+            continue
+        low, sep, high = item.partition('-')
+        low, high = low.strip(), high.strip() if sep else low.strip()
+        if not (low.isdigit() and high.isdigit()):
+            continue
+        low, high = int(low), int(high)
+        if low > high:
+            low, high = high, low
+        if 0 <= low and high <= MAX_PORT:
+            intervals.append((low, high))
+    return intervals
+
+
+def parse_networks(spec: Any) -> Optional[List[ipaddress._BaseNetwork]]:
+    """
+    Parse a comma separated address/CIDR list.
+
+    Returns:
+        list: Networks, or None when the spec matches any address
+
+    Raises:
+        ValueError: If an item is not an address or network
+    """
+    text = str(spec or '').strip()
+    if text.lower() in WILDCARDS:
+        return None
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in text.split(',') if item.strip()]
+
+
+def rule_family(rule: Dict[str, Any]) -> str:
+    """nftables family a rule is compiled for: 'ip6', else 'ip' ('any' included, IPv4 only for now)"""
+    return 'ip6' if rule.get('ip_version') == 'ip6' else 'ip'
+
+
+def parse_states(spec: Any) -> List[str]:
+    """Split a connection state list (``"established,related"``) into lower case names"""
+    return [item.strip().lower() for item in str(spec or '').split(',') if item.strip()]
+
+
+def _parse_address(value: Any, label: str) -> Optional[ipaddress._BaseAddress]:
+    if value is None or value == '':
+        return None
+    if isinstance(value, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+        return value
+    try:
+        return ipaddress.ip_address(str(value).strip())
+    except ValueError:
+        raise ValueError(f"Invalid {label} address: {value!r}") from None
+
+
+class _PortIndex:
+    """
+    Interval index over the port space.
+
+    The port boundaries of all rules split 0..65535 into elementary
+    segments; each segment stores the mask of rules covering it, so a
+    lookup is a single bisect.
+    """
+
+    def __init__(self):
+        self._wildcard = 0
+        self._pending: List[Tuple[int, int, int]] = []
+        self._bounds: List[int] = [0]
+        self._masks: List[int] = [0]
+
+    def add(self, bit: int, intervals: List[Tuple[int, int]]):
+        if not intervals:
+            self._wildcard |= bit
+        for low, high in intervals:
+            self._pending.append((low, high, bit))
+
+    def build(self):
+        bounds = {0}
+        for low, high, _ in self._pending:
+            bounds.add(low)
+            if high < MAX_PORT:
+                bounds.add(high + 1)
+        self._bounds = sorted(bounds)
+        self._masks = [0] * len(self._bounds)
+        for low, high, bit in self._pending:
+            first = bisect_right(self._bounds, low) - 1
+            last = bisect_right(self._bounds, high) - 1
+            for i in range(first, last + 1):
+                self._masks[i] |= bit
+        self._pending = []
+
+    def lookup(self, port: Optional[int]) -> int:
+        if port is None:
+            return self._wildcard
+        return self._wildcard | self._masks[bisect_right(self._bounds, port) - 1]
+
+
+class _PrefixTrie:
+    """Binary radix trie of CIDRs; a lookup ORs the masks along the address path."""
+
+    def __init__(self, bits: int):
+        self.bits = bits
+        # Node layout: [child for bit 0, child for bit 1, rule mask]
+        self._root = [None, None, 0]
+
+    def insert(self, network: ipaddress._BaseNetwork, bit: int):
+        node = self._root
+        value = int(network.network_address)
+        for depth in range(network.prefixlen):
+            branch = (value >> (self.bits - 1 - depth)) & 1
+            if node[branch] is None:
+                node[branch] = [None, None, 0]
+            node = node[branch]
+        node[2] |= bit
+
+    def lookup(self, value: int) -> int:
+        node = self._root
+        mask = node[2]
+        for depth in range(self.bits):
+            node = node[(value >> (self.bits - 1 - depth)) & 1]
+            if node is None:
+                break
+            mask |= node[2]
+        return mask
+
+
+class _AddressIndex:
+    """Per-family prefix tries plus the mask of rules matching any address."""
+
+    def __init__(self):
+        self._wildcard = 0
+        self._tries = {4: _PrefixTrie(32), 6: _PrefixTrie(128)}
+
+    def add(self, bit: int, networks: Optional[List[ipaddress._BaseNetwork]]):
+        if networks is None:
+            self._wildcard |= bit
+            return
+        for network in networks:
+            self._tries[network.version].insert(network, bit)
+
+    def lookup(self, address: Optional[ipaddress._BaseAddress]) -> int:
+        if address is None:
+            return self._wildcard
+        return self._wildcard | self._tries[address.version].lookup(int(address))
+
+
+class _InterfaceIndex:
+    """Interface names (exact, or prefix with a trailing ``*`` as in nftables)"""
+
+    def __init__(self):
+        self._wildcard = 0
+        self._names: Dict[str, int] = {}
+        self._prefixes: List[Tuple[str, int]] = []
+
+    def add(self, bit: int, name: str):
+        if not name:
+            self._wildcard |= bit
+        elif name.endswith('*'):
+            self._prefixes.append((name[:-1], bit))
+        else:
+            self._names[name] = self._names.get(name, 0) | bit
+
+    def lookup(self, name: Optional[str]) -> int:
+        # Without an interface only rules not bound to one can match
+        if not name:
+            return self._wildcard
+        mask = self._wildcard | self._names.get(name, 0)
+        for prefix, bit in self._prefixes:
+            if name.startswith(prefix):
+                mask |= bit
+        return mask
+
+
+class RuleMatcher:
+    """
+    Compiled view of a rule list answering 5-tuple match queries.
+
+    Only enabled rules are compiled. Rules whose address fields cannot be
+    parsed, or hold addresses of another family than the rule, are left
+    out, since nftables would reject them as well.
+    """
+
+    def __init__(self, rules: Iterable[Dict[str, Any]]):
+        """
+        Compile a rule list.
+
+        Args:
+            rules: Rules as returned by FirewallConfig.get_rules
+        """
+        self.rules: List[Dict[str, Any]] = []
+        self.skipped: List[Dict[str, Any]] = []
+        self._protocols: Dict[str, int] = {}
+        self._any_protocol = 0
+        self._directions = {'in': 0, 'out': 0}
+        self._families = {4: 0, 6: 0}
+        self._any_state = 0
+        self._states: Dict[str, int] = {}
+        self._interfaces = _InterfaceIndex()
+        self._sports = _PortIndex()
+        self._dports = _PortIndex()
+        self._sources = _AddressIndex()
+        self._destinations = _AddressIndex()
+
+        for rule in rules:
+            if not rule.get('enabled', True):
+                continue
+            version = 6 if rule_family(rule) == 'ip6' else 4
+            try:
+                sources = parse_networks(rule.get('source_ip'))
+                destinations = parse_networks(rule.get('destination_ip') or rule.get('dest_ip'))
+            except ValueError:
+                self.skipped.append(rule)
+                continue
+            if any(net.version != version for net in (sources or []) + (destinations or [])):
+                self.skipped.append(rule)
+                continue
+
+            bit = 1 << len(self.rules)
+            self.rules.append(rule)
+
+            protocol = str(rule.get('protocol') or '').lower()
+            if protocol in WILDCARDS:
+                self._any_protocol |= bit
+            else:
+                self._protocols[protocol] = self._protocols.get(protocol, 0) | bit
+
+            direction = str(rule.get('direction') or 'in').lower()
+            for key in ('in', 'out'):
+                if direction in (key, 'both'):
+                    self._directions[key] |= bit
+
+            self._families[version] |= bit
+            self._interfaces.add(bit, str(rule.get('interface') or '').strip())
+            states = parse_states(rule.get('state'))
+            if not states:
+                self._any_state |= bit
+            for state in states:
+                self._states[state] = self._states.get(state, 0) | bit
+
+            self._sports.add(bit, parse_port_spec(rule.get('source_port')))
+            self._dports.add(bit, parse_port_spec(rule.get('port') or rule.get('dest_port')))
+            self._sources.add(bit, sources)
+            self._destinations.add(bit, destinations)
+
+        self._sports.build()
+        self._dports.build()
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _candidates(self, proto: str, direction: str, src: Any, sport: Optional[int],
+                    dst: Any, dport: Optional[int], state: Optional[str], iface: Optional[str]) -> int:
+        src = _parse_address(src, 'source')
+        dst = _parse_address(dst, 'destination')
+        if src is not None and dst is not None and src.version != dst.version:
+            raise ValueError(f"Source {src} and destination {dst} are of different address families")
+
+        mask = self._directions.get(str(direction).lower(), 0)
+        if not mask:
+            return 0
+        address = src or dst
+        if address is not None:
+            mask &= self._families[address.version]
+        mask &= self._any_protocol | self._protocols.get(str(proto).lower(), 0)
+        if mask and state:
+            mask &= self._any_state | self._states.get(state.lower(), 0)
+        if mask:
+            mask &= self._interfaces.lookup(iface)
+        if mask:
+            mask &= self._dports.lookup(dport)
+        if mask:
+            mask &= self._sports.lookup(sport)
+        if mask:
+            mask &= self._sources.lookup(src)
+        if mask:
+            mask &= self._destinations.lookup(dst)
+        return mask
+
+    def match(self, proto: str, direction: str, src: Any = None, sport: Optional[int] = None,
+              dst: Any = None, dport: Optional[int] = None, state: Optional[str] = 'new',
+              iface: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return the first rule (in configuration order) matching a connection.
+
+        Args:
+            proto: Transport protocol ('tcp', 'udp', ...)
+            direction: 'in' or 'out'
+            src: Source address (string or ipaddress object)
+            sport: Source port, or None when not applicable
+            dst: Destination address
+            dport: Destination port, or None when not applicable
+            state: Connection tracking state of the packet ('new',
+                'established', ...); None ignores the rules' state match
+            iface: Input (direction 'in') or output interface; rules bound
+                to an interface only match when it is given
+
+        Returns:
+            dict: The matching rule, or None if no rule matches
+
+        Raises:
+            ValueError: If an address is malformed
+        """
+        mask = self._candidates(proto, direction, src, sport, dst, dport, state, iface)
+        if not mask:
+            return None
+        return self.rules[(mask & -mask).bit_length() - 1]
+
+    def match_all(self, proto: str, direction: str, src: Any = None, sport: Optional[int] = None,
+                  dst: Any = None, dport: Optional[int] = None, state: Optional[str] = 'new',
+                  iface: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return every rule matching a connection, in configuration order (see match)."""
+        mask = self._candidates(proto, direction, src, sport, dst, dport, state, iface)
+        matches = []
+        while mask:
+            low = mask & -mask
+            matches.append(self.rules[low.bit_length() - 1])
+            mask ^= low
+        return matches
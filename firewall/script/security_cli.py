@@ -1,6 +1,7 @@
 # firewall/scripts/security_cli.py
 import argparse
 import asyncio
+import time
 from firewall.script.firewall_manager import FirewallManager
 
 async def main():
@@ -31,25 +32,36 @@ async def main():
     # List blocked IPs
     subparsers.add_parser("list-blocked-ips")
     
+    # Dry-run: which configured rule matches a connection
+    match_parser = subparsers.add_parser("match-rule")
+    match_parser.add_argument("protocol", help="Protocol (tcp, udp, icmp, ...)")
+    match_parser.add_argument("direction", choices=["in", "out"], help="Traffic direction")
+    match_parser.add_argument("src", help="Source address")
+    match_parser.add_argument("dst", help="Destination address")
+    match_parser.add_argument("--sport", type=int, default=None, help="Source port")
+    match_parser.add_argument("--dport", type=int, default=None, help="Destination port")
+    match_parser.add_argument("--state", default="new", help="Connection state (new, established, ...)")
+    match_parser.add_argument("--iface", default=None, help="Input/output interface")
+    
     args = parser.parse_args()
     
     # Initialize firewall manager
     fw = FirewallManager()
     
     if args.command == "block-country":
-        fw.security.geo_blocker.block_country(args.country_code.upper())
+        fw.block_country(args.country_code)
         print(f"Blocked country: {args.country_code.upper()}")
     
     elif args.command == "unblock-country":
-        fw.security.geo_blocker.unblock_country(args.country_code.upper())
+        fw.unblock_country(args.country_code)
         print(f"Unblocked country: {args.country_code.upper()}")
     
     elif args.command == "block-ip":
-        fw.security.block_ip(args.ip, args.duration)
+        fw.block_ip(args.ip, args.duration)
         print(f"Blocked IP {args.ip} for {args.duration} seconds")
     
     elif args.command == "unblock-ip":
-        fw.security.unblock_ip(args.ip)
+        fw.unblock_ip(args.ip)
         print(f"Unblocked IP {args.ip}")
     
     elif args.command == "list-blocked-countries":
@@ -62,6 +74,19 @@ async def main():
         for ip, unblock_time in fw.security.blocked_ips.items():
             time_left = max(0, unblock_time - time.time())
             print(f"  - {ip} (unblocks in {int(time_left)}s)")
+    
+    elif args.command == "match-rule":
+        try:
+            rule = fw.get_rule_matcher().match(
+                args.protocol, args.direction, args.src, args.sport, args.dst, args.dport,
+                state=args.state, iface=args.iface
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        if rule:
+            print(f"Matched rule: {rule.get('name', 'Unnamed')} (ID: {rule.get('id')}, action: {rule.get('action')})")
+        else:
+            print("No rule matches; default policy applies")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,13 +1,22 @@
 # firewall/script/security_utils.py
+import asyncio
+import heapq
 import ipaddress
+import socket
+import threading
 import time
-from collections import defaultdict, deque
+from array import array
+from collections import OrderedDict
 from datetime import datetime, timedelta
 try:  # pragma: no cover - optional dependency
     import requests
 except ImportError:  # pragma: no cover - runtime fallback
     requests = None  # type: ignore
-from typing import Dict, List, Optional, Set, Tuple
+try:  # pragma: no cover - optional dependency
+    import aiohttp  # type: ignore
+except ImportError:  # pragma: no cover - runtime fallback
+    aiohttp = None  # type: ignore
+from typing import Callable, Dict, List, Optional, Set, Tuple
 import json
 import os
 import logging
@@ -19,6 +28,19 @@ try:  # pragma: no cover - optional dependency
 except ImportError:  # pragma: no cover - runtime fallback
     geoip2 = None  # type: ignore
 
+try:  # pragma: no cover - optional dependency (installed with geoip2)
+    import maxminddb  # type: ignore
+except ImportError:  # pragma: no cover - runtime fallback
+    maxminddb = None  # type: ignore
+
+try:  # pragma: no cover - optional dependency
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - runtime fallback
+    np = None  # type: ignore
+
+from firewall.script.reputation_index import MAX_TAGGED_FEEDS, ReputationIndex
+from firewall.script.connection_snapshot import IPV4_MAPPED_PREFIX
+
 logger = logging.getLogger("firewall.security")
 
 class SecurityAction(Enum):
@@ -28,88 +50,420 @@ class SecurityAction(Enum):
     GEO_BLOCK = "geo_block"
     REPUTATION_BLOCK = "reputation_block"
 
+# Compact action codes used by batch checks: SECURITY_ACTIONS[code] is the action
+SECURITY_ACTIONS: Tuple[SecurityAction, ...] = tuple(SecurityAction)
+_ACTION_CODES: Dict[SecurityAction, int] = {action: code for code, action in enumerate(SECURITY_ACTIONS)}
+
 @dataclass
 class RateLimitConfig:
     max_requests: int = 100  # Max requests
     time_window: int = 60    # Time window in seconds
 
 class IPReputationChecker:
-    def __init__(self, update_interval: int = 3600):
-        self.threat_feeds = [
-            "https://www.binarydefense.com/banlist.txt",
-            "https://lists.blocklist.de/lists/ssh.txt",
-            # Add more threat feeds as needed
-        ]
-        self.bad_ips: Set[str] = set()
+    """
+    Threat-feed based IP reputation.
+    
+    Feeds are refreshed in the background (see start()) and fetched
+    concurrently with conditional requests (ETag / If-Modified-Since), so
+    unchanged feeds cost a 304 round trip. Each feed is compiled into a
+    ReputationIndex (CIDR-aware, coalesced integer intervals); a refresh
+    merges them into a new index and swaps it in with a single assignment:
+    is_malicious() never waits for a download and never sees a half-built
+    index.
+    
+    The merged index is persisted to ``cache_path`` (with a per-interval
+    tag of the feeds listing it) and memory-mapped at startup, so a new
+    process flags addresses immediately and processes sharing the file
+    share its pages.
+    """
+    DEFAULT_FEEDS = [
+        "https://www.binarydefense.com/banlist.txt",
+        "https://lists.blocklist.de/lists/ssh.txt",
+        # Add more threat feeds as needed
+    ]
+    DEFAULT_CACHE_PATH = os.path.join("config", "reputation_cache.bin")
+
+    def __init__(self, update_interval: int = 3600, threat_feeds: Optional[List[str]] = None,
+                 timeout: float = 10, cache_path: Optional[str] = DEFAULT_CACHE_PATH):
+        self.threat_feeds = list(threat_feeds or self.DEFAULT_FEEDS)
+        self.index = ReputationIndex()
         self.last_updated: Optional[datetime] = None
         self.update_interval = update_interval
-        self.available = requests is not None
+        self.timeout = timeout
+        self.cache_path = cache_path
+        self.available = aiohttp is not None or requests is not None
+        # url -> (etag, last_modified, index) of the last successful fetch;
+        # the index is None for feeds restored from the cache until needed
+        self._feed_cache: Dict[str, Tuple[Optional[str], Optional[str], Optional[ReputationIndex]]] = {}
+        # url -> tag bit of the feed in the cached index
+        self._cached_bits: Dict[str, int] = {}
+        self._cached_index: Optional[ReputationIndex] = None
+        # The cache lists feeds that are no longer configured
+        self._cache_outdated = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
 
         if not self.available:
             logger.warning(
-                "Requests library not installed. IP reputation updates will be disabled until requests is available."
+                "Neither aiohttp nor requests is installed. IP reputation updates will be disabled until one is available."
             )
+        self._load_cache()
+
+    def _load_cache(self):
+        """Map the persisted index, if there is one"""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            index, metadata = ReputationIndex.load(self.cache_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring reputation cache {self.cache_path}: {e}")
+            return
+        self.index = self._cached_index = index
+        for bit, feed in enumerate(metadata.get('feeds', [])):
+            url = feed.get('url')
+            if url in self.threat_feeds:
+                self._cached_bits[url] = bit
+                self._feed_cache[url] = (feed.get('etag'), feed.get('last_modified'), None)
+            else:
+                self._cache_outdated = True
+        if metadata.get('updated'):
+            self.last_updated = datetime.utcfromtimestamp(metadata['updated'])
+        logger.info(f"Loaded {len(index)} malicious address ranges from {self.cache_path}")
+
+    def _save_cache(self, feeds: List[str]):
+        """Persist the current index with the state of its feeds"""
+        if not self.cache_path:
+            return
+        metadata = {
+            'updated': time.time(),
+            'feeds': [
+                {'url': url, 'etag': self._feed_cache[url][0], 'last_modified': self._feed_cache[url][1]}
+                for url in feeds
+            ],
+        }
+        try:
+            self.index.save(self.cache_path, metadata)
+        except OSError as e:
+            logger.error(f"Failed to write reputation cache {self.cache_path}: {e}")
+
+    def _feed_index(self, url: str) -> Optional[ReputationIndex]:
+        """Return the index of one feed, extracting it from the cached index if needed"""
+        etag, last_modified, index = self._feed_cache[url]
+        if index is None and self._cached_index is not None and url in self._cached_bits:
+            index = self._cached_index.select(self._cached_bits[url])
+            self._feed_cache[url] = (etag, last_modified, index)
+        return index
+
+    @property
+    def bad_ips(self) -> ReputationIndex:
+        """The current index (supports ``ip in bad_ips``)"""
+        return self.index
+
+    def _conditional_headers(self, url: str) -> Dict[str, str]:
+        headers = {}
+        etag, last_modified, _ = self._feed_cache.get(url, (None, None, None))
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    async def _fetch_feed(self, session, url: str) -> Optional[Tuple[Optional[str], Optional[str], ReputationIndex]]:
+        """
+        Fetch one feed.
         
-    async def update_threat_feeds(self):
-        """Update the list of malicious IPs from threat feeds"""
+        Returns:
+            tuple: (etag, last_modified, index), the cached tuple if the feed
+                did not change, or None if the fetch failed
+        """
+        headers = self._conditional_headers(url)
+        try:
+            if session is not None:
+                async with session.get(url, headers=headers) as response:
+                    status = response.status
+                    body = await response.read() if status == 200 else b''
+                    response_headers = response.headers
+            else:
+                # requests fallback, run in a worker thread
+                loop = asyncio.get_running_loop()
+                response = await loop.run_in_executor(
+                    None, lambda: requests.get(url, headers=headers, timeout=self.timeout)
+                )
+                status, body, response_headers = response.status_code, response.content, response.headers
+        except Exception as e:
+            logger.error(f"Failed to fetch threat feed {url}: {e}")
+            return None
+
+        if status == 304 and url in self._feed_cache:
+            return self._feed_cache[url]
+        if status != 200:
+            logger.warning(f"Threat feed {url} returned HTTP {status}")
+            return None
+        index = ReputationIndex.from_text(body.decode('utf-8', errors='replace'))
+        return response_headers.get('ETag'), response_headers.get('Last-Modified'), index
+
+    async def refresh(self) -> bool:
+        """
+        Fetch all feeds concurrently and swap in the new set of malicious IPs.
+        
+        Feeds that fail keep the index of their last successful fetch.
+        
+        Returns:
+            bool: True if every feed was fetched (or unchanged), False otherwise
+        """
         if not self.available:
-            return
+            return False
 
+        if aiohttp is not None:
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                results = await asyncio.gather(*(self._fetch_feed(session, url) for url in self.threat_feeds))
+        else:
+            results = await asyncio.gather(*(self._fetch_feed(None, url) for url in self.threat_feeds))
+
+        changed = False
+        for url, result in zip(self.threat_feeds, results):
+            if result is not None and result is not self._feed_cache.get(url):
+                self._feed_cache[url] = result
+                changed = True
+        self.last_updated = datetime.utcnow()
+        if not changed and not self._cache_outdated:
+            logger.info("Threat feeds unchanged")
+            return all(result is not None for result in results)
+
+        feeds = [url for url in self.threat_feeds if url in self._feed_cache][:MAX_TAGGED_FEEDS]
+        indexes = [self._feed_index(url) for url in feeds]
+        feeds = [url for url, index in zip(feeds, indexes) if index is not None]
+        index = ReputationIndex.union_tagged([index for index in indexes if index is not None])
+        self.index = index
+        # Every feed now has its own index; release the mapped cache
+        self._cached_index = None
+        self._cached_bits = {}
+        self._cache_outdated = False
+        logger.info(f"Updated threat feeds with {len(index)} malicious address ranges")
+        self._save_cache(feeds)
+        return all(result is not None for result in results)
+
+    async def update_threat_feeds(self):
+        """Refresh the threat feeds if the update interval has passed"""
         current_time = datetime.utcnow()
         if (self.last_updated is None or 
             (current_time - self.last_updated).total_seconds() > self.update_interval):
-            try:
-                for feed in self.threat_feeds:
-                    response = requests.get(feed, timeout=10)
-                    if response.status_code == 200:
-                        self.bad_ips.update(
-                            line.strip() for line in response.text.splitlines() 
-                            if line.strip() and not line.startswith('#')
-                        )
-                self.last_updated = current_time
-                logger.info(f"Updated threat feeds with {len(self.bad_ips)} malicious IPs")
-            except Exception as e:
-                logger.error(f"Failed to update threat feeds: {e}")
+            await self.refresh()
+
+    def start(self):
+        """Start refreshing the threat feeds every update_interval in a background thread"""
+        if not self.available or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="threat-feeds", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the background refresher"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _refresh_loop(self):
+        loop = asyncio.new_event_loop()
+        try:
+            # A fresh cache does not need to be refreshed right away
+            if self.last_updated is not None:
+                age = (datetime.utcnow() - self.last_updated).total_seconds()
+                self._stop_event.wait(max(0.0, self.update_interval - age))
+            while not self._stop_event.is_set():
+                try:
+                    loop.run_until_complete(self.refresh())
+                except Exception as e:
+                    logger.error(f"Failed to update threat feeds: {e}")
+                self._stop_event.wait(self.update_interval)
+        finally:
+            loop.close()
 
     def is_malicious(self, ip: str) -> bool:
-        """Check if an IP is in the malicious IP list"""
-        return ip in self.bad_ips
+        """Check if an IP is covered by the malicious address ranges"""
+        return ip in self.index
+
+class _WindowCounter:
+    """Two-bucket sliding window counter for one (ip, endpoint) key"""
+    __slots__ = ('window_start', 'current', 'previous', 'last_seen')
+
+    def __init__(self, window_start: float):
+        self.window_start = window_start
+        self.current = 0
+        self.previous = 0
+        self.last_seen = window_start
 
 class RateLimiter:
-    def __init__(self, config: Optional[Dict[str, RateLimitConfig]] = None):
+    """
+    Sliding-window-counter rate limiter with bounded memory.
+    
+    Each (ip, endpoint) key keeps two counters (current and previous
+    window) instead of one timestamp per request; the request rate is
+    estimated as ``previous * overlap + current``. Keys are kept in LRU
+    order: keys idle for two windows are dropped, and once ``max_keys``
+    keys are tracked the least recently seen one is evicted.
+    """
+    DEFAULT_MAX_KEYS = 100000
+
+    def __init__(self, config: Optional[Dict[str, RateLimitConfig]] = None,
+                 max_keys: int = DEFAULT_MAX_KEYS):
         self.config = config or {
             "default": RateLimitConfig()
         }
-        self.requests: Dict[str, Dict[str, deque[float]]] = defaultdict(
-            lambda: defaultdict(deque)
-        )
+        self.max_keys = max_keys
+        self._counters: "OrderedDict[Tuple[str, str], _WindowCounter]" = OrderedDict()
+        self._idle_ttl = 2 * max(cfg.time_window for cfg in self.config.values())
+        self.checks = 0
+        self.hits = 0
+        self.limited = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expire(self, now: float):
+        """Drop keys idle for longer than two windows (oldest first)."""
+        counters = self._counters
+        while counters:
+            key, counter = next(iter(counters.items()))
+            if now - counter.last_seen <= self._idle_ttl:
+                break
+            del counters[key]
+            self.expirations += 1
 
-    def is_rate_limited(self, ip: str, endpoint: str = "default") -> bool:
-        """Check if an IP has exceeded the rate limit for a specific endpoint"""
+    def is_rate_limited(self, ip: str, endpoint: str = "default", now: Optional[float] = None,
+                        count: int = 1) -> bool:
+        """
+        Check if an IP has exceeded the rate limit for a specific endpoint
+        
+        Args:
+            ip: Client address
+            endpoint: Rate limit configuration to use
+            now: Monotonic timestamp (defaults to time.monotonic())
+            count: Number of requests to record at once; the key is limited
+                if recording all of them would exceed the limit
+        """
         if endpoint not in self.config:
             endpoint = "default"
             
         config = self.config[endpoint]
-        now = time.time()
+        window = config.time_window
+        if now is None:
+            now = time.monotonic()
+        self.checks += 1
+        self._expire(now)
+        
+        key = (ip, endpoint)
+        counter = self._counters.get(key)
+        if counter is None:
+            if len(self._counters) >= self.max_keys:
+                self._counters.popitem(last=False)
+                self.evictions += 1
+            counter = self._counters[key] = _WindowCounter(now)
+        else:
+            self.hits += 1
+            self._counters.move_to_end(key)
+        counter.last_seen = now
         
-        # Remove old requests outside the time window
-        while (self.requests[ip][endpoint] and 
-               now - self.requests[ip][endpoint][0] > config.time_window):
-            self.requests[ip][endpoint].popleft()
+        # Roll the windows forward
+        elapsed = now - counter.window_start
+        if elapsed >= window:
+            windows = int(elapsed // window)
+            counter.previous = counter.current if windows == 1 else 0
+            counter.current = 0
+            counter.window_start += windows * window
+            elapsed -= windows * window
         
         # Check if rate limit exceeded
-        if len(self.requests[ip][endpoint]) >= config.max_requests:
+        estimate = counter.previous * (1.0 - elapsed / window) + counter.current
+        if estimate + count - 1 >= config.max_requests:
+            self.limited += 1
             return True
             
         # Record this request
-        self.requests[ip][endpoint].append(now)
+        counter.current += count
         return False
 
+    def reset(self, ip: Optional[str] = None):
+        """Forget the counters of one IP, or of every IP when ip is None"""
+        if ip is None:
+            self._counters.clear()
+            return
+        for key in [key for key in self._counters if key[0] == ip]:
+            del self._counters[key]
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get limiter statistics
+        
+        Returns:
+            dict: tracked keys, capacity, evictions (capacity and idle),
+                checks, limited requests and the key hit rate
+        """
+        return {
+            'tracked_keys': len(self._counters),
+            'max_keys': self.max_keys,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'checks': self.checks,
+            'limited': self.limited,
+            'hit_rate': self.hits / self.checks if self.checks else 0.0,
+        }
+
 class GeoIPBlocker:
-    def __init__(self, geoip_db_path: str = None):
+    """
+    Country based blocking on top of a MaxMind GeoIP database.
+    
+    Lookups go through an LRU cache with a TTL that also remembers
+    addresses without a country (private ranges, unknown networks), so
+    hosts seen on every monitor tick cost one database walk per TTL. With
+    ``precompile`` the blocked countries are expanded once into a sorted
+    interval table (by scanning the database in a background thread) and
+    checks become a binary search.
+    
+    The database is opened memory-mapped (``mode='mmap'``) or loaded into
+    memory (``mode='memory'``). start_watching() polls the file and, when
+    it is replaced, opens the new database and compiles its table in the
+    background before swapping both in; lookups keep using the old reader
+    until the swap, and it is closed after a short grace period.
+    """
+    DEFAULT_CACHE_SIZE = 65536
+    DEFAULT_CACHE_TTL = 3600
+    DEFAULT_WATCH_INTERVAL = 60
+    # Seconds an old reader stays open after a swap, for lookups still using it
+    RETIRE_DELAY = 5
+    MODES = ('mmap', 'memory', 'auto')
+
+    def __init__(self, geoip_db_path: str = None, cache_size: int = DEFAULT_CACHE_SIZE,
+                 cache_ttl: float = DEFAULT_CACHE_TTL, precompile: bool = False,
+                 mode: str = 'mmap', watch_interval: float = DEFAULT_WATCH_INTERVAL):
         self.geoip_db = None
+        self.geoip_db_path = geoip_db_path
         self.blocked_countries: Set[str] = set()
         self.available = geoip2 is not None
+        self.mode = mode if mode in self.MODES else 'mmap'
+        
+        # Hot reload: (mtime_ns, inode, size) of the loaded file
+        self.watch_interval = watch_interval
+        self._db_stat: Optional[Tuple[int, int, int]] = None
+        self._failed_stat: Optional[Tuple[int, int, int]] = None
+        self._watch_thread: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
+        self._reload_callbacks: List[Callable[[], None]] = []
+        
+        # ip -> (country code or None, expiry on the monotonic clock)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        # Compiled interval table of the blocked countries
+        self.precompile = precompile
+        self._compiled: Optional[ReputationIndex] = None
+        self._compile_generation = 0
 
         if not self.available:
             logger.warning(
@@ -119,8 +473,8 @@ class GeoIPBlocker:
 
         try:
             if geoip_db_path and os.path.exists(geoip_db_path):
-                self.geoip_db = geoip2.database.Reader(geoip_db_path)  # type: ignore[attr-defined]
-                logger.info("GeoIP database loaded successfully")
+                self.geoip_db, self._db_stat = self._open_database(geoip_db_path)
+                logger.info(f"GeoIP database loaded successfully ({self.mode} mode)")
             else:
                 logger.warning("GeoIP database path not provided or file missing. GeoIP blocking disabled.")
                 self.available = False
@@ -128,91 +482,535 @@ class GeoIPBlocker:
             logger.error(f"Failed to load GeoIP database: {e}")
             self.available = False
 
+    @staticmethod
+    def _file_signature(path: str) -> Tuple[int, int, int]:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
+    def _open_database(self, path: str):
+        """
+        Open a GeoIP database in the configured mode.
+        
+        Returns:
+            tuple: (reader, file signature taken before opening)
+        """
+        signature = self._file_signature(path)
+        if maxminddb is not None:
+            mode = {
+                'mmap': maxminddb.MODE_MMAP,
+                'memory': maxminddb.MODE_MEMORY,
+                'auto': maxminddb.MODE_AUTO,
+            }[self.mode]
+            reader = geoip2.database.Reader(path, mode=mode)  # type: ignore[attr-defined]
+        else:
+            reader = geoip2.database.Reader(path)  # type: ignore[attr-defined]
+        return reader, signature
+
+    def check_for_update(self) -> bool:
+        """
+        Reload the database if the file changed (mtime, inode or size).
+        
+        Returns:
+            bool: True if a new database was swapped in
+        """
+        if geoip2 is None or not self.geoip_db_path:
+            return False
+        try:
+            signature = self._file_signature(self.geoip_db_path)
+        except OSError:
+            return False
+        # An unchanged file that already failed to open is not retried
+        if signature == self._db_stat or signature == self._failed_stat:
+            return False
+        return self.reload()
+
+    def reload(self) -> bool:
+        """
+        Open the database file again and swap it in.
+        
+        The new reader and, with precompile, its compiled table are built
+        before the swap, so lookups never wait for the reload. A file that
+        cannot be opened (e.g. still being copied) is retried on the next check.
+        
+        Returns:
+            bool: True if the new database is in use
+        """
+        generation = self._compile_generation
+        try:
+            reader, signature = self._open_database(self.geoip_db_path)
+        except Exception as e:
+            logger.warning(f"Could not reload GeoIP database {self.geoip_db_path}: {e}")
+            try:
+                self._failed_stat = self._file_signature(self.geoip_db_path)
+            except OSError:
+                self._failed_stat = None
+            return False
+        compiled = None
+        if self.precompile and self.blocked_countries:
+            compiled = self._build_table(reader)
+        
+        old = self.geoip_db
+        self.geoip_db = reader
+        if generation == self._compile_generation:
+            self._compiled = compiled
+        else:
+            # The block list changed while the table was built
+            self._invalidate_compiled()
+        self._db_stat = signature
+        self.available = True
+        self.clear_cache()
+        logger.info(f"GeoIP database reloaded from {self.geoip_db_path}")
+        
+        if old is not None:
+            timer = threading.Timer(self.RETIRE_DELAY, old.close)
+            timer.daemon = True
+            timer.start()
+        for callback in self._reload_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in GeoIP reload callback: {e}")
+        return True
+
+    def register_reload_callback(self, callback: Callable[[], None]):
+        """
+        Register a callback for database reloads
+        
+        Args:
+            callback: Function called after a new database was swapped in
+                (from the watcher thread), e.g. to reload kernel country sets
+        """
+        self._reload_callbacks.append(callback)
+
+    def start_watching(self):
+        """Poll the database file for changes in a background thread"""
+        if geoip2 is None or not self.geoip_db_path or self.watch_interval <= 0:
+            return
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=self._watch_loop, name="geoip-watch", daemon=True)
+        self._watch_thread.start()
+
+    def stop_watching(self, timeout: float = 5.0):
+        """Stop the file watcher"""
+        self._watch_stop.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join(timeout)
+            self._watch_thread = None
+
+    def _watch_loop(self):
+        while not self._watch_stop.wait(self.watch_interval):
+            try:
+                self.check_for_update()
+            except Exception as e:
+                logger.error(f"GeoIP database watch failed: {e}")
+
     def block_country(self, country_code: str):
         """Add a country to the block list"""
         self.blocked_countries.add(country_code.upper())
+        self._invalidate_compiled()
 
     def unblock_country(self, country_code: str):
         """Remove a country from the block list"""
         self.blocked_countries.discard(country_code.upper())
+        self._invalidate_compiled()
+
+    def _invalidate_compiled(self):
+        """Drop the compiled table and rebuild it in the background"""
+        self._compile_generation += 1
+        self._compiled = None
+        if self.precompile and self.available and self.geoip_db and self.blocked_countries:
+            threading.Thread(
+                target=self._compile, args=(self._compile_generation,),
+                name="geoip-compile", daemon=True
+            ).start()
+
+    def _build_table(self, db) -> Optional[ReputationIndex]:
+        """Build the interval table of the blocked countries from a database reader"""
+        try:
+            intervals4: List[int] = []
+            intervals6: List[int] = []
+            for networks in self.country_networks(set(self.blocked_countries), db).values():
+                for net in networks:
+                    first, last = int(net.network_address), int(net.broadcast_address)
+                    if net.version == 4:
+                        intervals4.append(first << 32 | last)
+                    else:
+                        intervals6.append(first << 128 | last)
+            return ReputationIndex.from_intervals(intervals4, intervals6)
+        except Exception as e:
+            logger.error(f"Failed to compile GeoIP block list: {e}")
+            return None
+
+    def _compile(self, generation: int):
+        """Build the interval table for the current database (runs in a worker thread)"""
+        db = self.geoip_db
+        compiled = self._build_table(db)
+        if compiled is None:
+            return
+        # Discard the table if the block list or the database changed while it was built
+        if generation == self._compile_generation and db is self.geoip_db:
+            self._compiled = compiled
+            logger.info(f"Compiled GeoIP block list: {len(compiled)} ranges")
+
+    def compile_blocklist(self) -> bool:
+        """
+        Build the compiled interval table now, in the calling thread.
+        
+        Returns:
+            bool: True if the compiled table is in use
+        """
+        self.precompile = True
+        self._compile_generation += 1
+        if self.available and self.geoip_db and self.blocked_countries:
+            self._compile(self._compile_generation)
+        return self._compiled is not None
+
+    def _lookup_country(self, ip: str) -> Optional[str]:
+        # Keep one reader for the whole lookup; a reload may swap it meanwhile
+        db = self.geoip_db
+        try:
+            code = db.country(ip).country.iso_code
+            return code.upper() if code else None
+        except ValueError:
+            # Not an IP address
+            return None
+        except Exception as e:
+            # AddressNotFoundError for private and unassigned ranges is expected
+            if type(e).__name__ != "AddressNotFoundError":
+                logger.debug(f"GeoIP lookup failed for {ip}: {e}")
+            return None
+
+    def country_of(self, ip: str) -> Optional[str]:
+        """
+        Return the country code of an IP, using the lookup cache.
+        
+        Returns:
+            str: ISO country code, or None if unknown
+        """
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(ip)
+            if entry is not None and entry[1] > now:
+                self._cache.move_to_end(ip)
+                self.cache_hits += 1
+                return entry[0]
+            self.cache_misses += 1
+        
+        code = self._lookup_country(ip)
+        with self._cache_lock:
+            self._cache[ip] = (code, now + self.cache_ttl)
+            self._cache.move_to_end(ip)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return code
+
+    def clear_cache(self):
+        """Forget all cached lookups"""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def get_cache_stats(self) -> Dict[str, float]:
+        """
+        Get lookup cache statistics
+        
+        Returns:
+            dict: cached entries, hits, misses, hit rate and compiled ranges
+        """
+        lookups = self.cache_hits + self.cache_misses
+        compiled = self._compiled
+        return {
+            'entries': len(self._cache),
+            'max_entries': self.cache_size,
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_rate': self.cache_hits / lookups if lookups else 0.0,
+            'compiled_ranges': len(compiled) if compiled is not None else 0,
+        }
+
+    def country_networks(self, country_codes, db=None) -> Dict[str, List[ipaddress._BaseNetwork]]:
+        """
+        Expand country codes into the networks assigned to them.
+
+        The MMDB is scanned once for all requested countries and the networks
+        of each country are coalesced into the smallest list of CIDRs.
+
+        Args:
+            country_codes: Iterable of 2-letter country codes
+            db: Database reader to scan (defaults to the one in use)
+
+        Returns:
+            dict: country code -> list of IPv4/IPv6 networks
+        """
+        codes = {code.upper() for code in country_codes}
+        found: Dict[str, List[ipaddress._BaseNetwork]] = {code: [] for code in codes}
+        db = db or self.geoip_db
+        if not codes or not db:
+            return found
+
+        reader = getattr(db, "_db_reader", None)
+        try:
+            for network, record in reader:
+                code = ((record or {}).get("country") or {}).get("iso_code")
+                if code in found:
+                    found[code].append(network)
+        except TypeError:
+            logger.warning("Installed maxminddb cannot iterate the GeoIP database; country CIDRs unavailable")
+            return found
+
+        return {
+            code: [
+                net
+                for version in (4, 6)
+                for net in ipaddress.collapse_addresses(n for n in nets if n.version == version)
+            ]
+            for code, nets in found.items()
+        }
 
     def is_country_blocked(self, ip: str) -> bool:
         """Check if an IP belongs to a blocked country"""
         if not self.available or not self.geoip_db or not self.blocked_countries:
             return False
-            
-        try:
-            response = self.geoip_db.country(ip)
-            return response.country.iso_code.upper() in self.blocked_countries
-        except Exception as e:
-            logger.error(f"GeoIP lookup failed for {ip}: {e}")
-            return False
+        
+        compiled = self._compiled
+        if compiled is not None:
+            return ip in compiled
+        return self.country_of(ip) in self.blocked_countries
+
+class _KnockState:
+    """Progress of one source through the knock automaton"""
+    __slots__ = ('node', 'deadline')
+
+    def __init__(self, node: int, deadline: float):
+        self.node = node
+        self.deadline = deadline
 
 class PortKnocking:
-    def __init__(self, sequence: List[int] = None, window: int = 10):
-        self.sequence = sequence or [1000, 2000, 3000]  # Default knock sequence
+    """
+    Port knocking with one or more named knock sequences.
+    
+    The sequences are compiled into a single automaton (Aho-Corasick over
+    port numbers), so each knock is one dictionary lookup and a source only
+    stores its automaton node and the deadline of its current attempt.
+    Sources that are not part-way through a sequence are not stored at all,
+    attempts expire ``window`` seconds after their first knock, and at most
+    ``max_sources`` attempts are tracked (the oldest is evicted first).
+    """
+    DEFAULT_MAX_SOURCES = 100000
+
+    def __init__(self, sequence: List[int] = None, window: int = 10,
+                 sequences: Optional[Dict[str, List[int]]] = None,
+                 max_sources: int = DEFAULT_MAX_SOURCES):
+        """
+        Args:
+            sequence: Knock sequence registered as "default" when sequences is not given
+            window: Time window in seconds for a whole knock sequence
+            sequences: Named knock sequences (e.g. one per service)
+            max_sources: Maximum number of sources tracked at once
+        """
+        if sequences is None:
+            sequences = {"default": sequence or [1000, 2000, 3000]}  # Default knock sequence
+        self.sequences: Dict[str, List[int]] = {}
         self.window = window  # Time window in seconds for the knock sequence
-        self.sequence_length = len(self.sequence)
-        self.knock_attempts: Dict[str, List[Tuple[float, int]]] = {}
+        self.max_sources = max_sources
+        # ip -> state, in deadline order (an attempt moves to the end when it starts)
+        self._sources: "OrderedDict[str, _KnockState]" = OrderedDict()
+        self.knocks = 0
+        self.matches = 0
+        self.evictions = 0
+        self.expirations = 0
+        for name, ports in sequences.items():
+            self.sequences[name] = [int(port) for port in ports]
+        self._compile()
+
+    @property
+    def sequence(self) -> List[int]:
+        """The default knock sequence"""
+        return self.sequences.get("default") or next(iter(self.sequences.values()), [])
+
+    def add_sequence(self, name: str, ports: List[int]):
+        """Add or replace a named knock sequence (attempts in progress are reset)"""
+        if not ports:
+            raise ValueError("A knock sequence needs at least one port")
+        self.sequences[name] = [int(port) for port in ports]
+        self._compile()
+
+    def remove_sequence(self, name: str):
+        """Remove a named knock sequence (attempts in progress are reset)"""
+        if self.sequences.pop(name, None) is not None:
+            self._compile()
+
+    def _compile(self):
+        """Build the knock automaton of all sequences"""
+        goto: List[Dict[int, int]] = [{}]
+        depth = [0]
+        match: List[Optional[str]] = [None]
+        for name, ports in self.sequences.items():
+            node = 0
+            for port in ports:
+                nxt = goto[node].get(port)
+                if nxt is None:
+                    nxt = goto[node][port] = len(goto)
+                    goto.append({})
+                    depth.append(depth[node] + 1)
+                    match.append(None)
+                node = nxt
+            match[node] = name
+
+        # Breadth-first: complete every node's transitions over the knock
+        # ports using the transitions of its longest proper suffix
+        alphabet = {port for ports in self.sequences.values() for port in ports}
+        transitions: List[Dict[int, int]] = [dict() for _ in goto]
+        transitions[0] = {port: goto[0].get(port, 0) for port in alphabet}
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for node in queue:
+            suffix = transitions[fail[node]]
+            if match[node] is None:
+                match[node] = match[fail[node]]
+            for port in alphabet:
+                child = goto[node].get(port)
+                if child is None:
+                    transitions[node][port] = suffix[port]
+                else:
+                    transitions[node][port] = child
+                    fail[child] = suffix[port] if node else 0
+                    queue.append(child)
+        # Root transitions on non-knock ports are implicit (stay at the root)
+        self._transitions = transitions
+        self._depth = depth
+        self._match = match
+        self._sources.clear()
+
+    def _expire(self, now: float):
+        """Drop attempts whose window has passed (oldest first)"""
+        sources = self._sources
+        while sources:
+            ip, state = next(iter(sources.items()))
+            if state.deadline >= now:
+                break
+            del sources[ip]
+            self.expirations += 1
+
+    def match_knock(self, ip: str, port: int, now: Optional[float] = None) -> Optional[str]:
+        """
+        Record a port knock and return the sequence it completes
         
+        Args:
+            ip: Source address
+            port: Knocked port
+            now: Monotonic timestamp (defaults to time.monotonic())
+            
+        Returns:
+            str: Name of the completed sequence, or None
+        """
+        if now is None:
+            now = time.monotonic()
+        self.knocks += 1
+        self._expire(now)
+
+        state = self._sources.get(ip)
+        node = state.node if state is not None and state.deadline >= now else 0
+        node = self._transitions[node].get(port, 0)
+        if node == 0:
+            if state is not None:
+                del self._sources[ip]
+            return None
+
+        if state is None:
+            if len(self._sources) >= self.max_sources:
+                self._sources.popitem(last=False)
+                self.evictions += 1
+            state = self._sources[ip] = _KnockState(node, now + self.window)
+        else:
+            state.node = node
+            if self._depth[node] == 1:
+                # A new attempt starts: its window runs from this knock
+                state.deadline = now + self.window
+                self._sources.move_to_end(ip)
+
+        name = self._match[node]
+        if name is not None:
+            self.matches += 1
+        return name
+
     def add_knock(self, ip: str, port: int) -> bool:
-        """Record a port knock attempt"""
-        now = time.time()
-        
-        # Clean up old knocks
-        if ip in self.knock_attempts:
-            self.knock_attempts[ip] = [
-                (t, p) for t, p in self.knock_attempts[ip] 
-                if now - t <= self.window
-            ]
-        
-        # Add new knock
-        if ip not in self.knock_attempts:
-            self.knock_attempts[ip] = []
-        self.knock_attempts[ip].append((now, port))
+        """Record a port knock attempt; True if it completes a knock sequence"""
+        return self.match_knock(ip, port) is not None
+
+    def reset(self, ip: Optional[str] = None):
+        """Forget the knock progress of one IP, or of every IP when ip is None"""
+        if ip is None:
+            self._sources.clear()
+        else:
+            self._sources.pop(ip, None)
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get port knocking statistics
         
-        # Check if sequence matches
-        return self._check_sequence(ip)
-    
-    def _check_sequence(self, ip: str) -> bool:
-        """Check if the knock sequence matches the required sequence"""
-        if ip not in self.knock_attempts:
-            return False
-            
-        ports = [p for _, p in self.knock_attempts[ip]]
-        if len(ports) < self.sequence_length:
-            return False
-            
-        # Check if the last N ports match our sequence
-        return ports[-self.sequence_length:] == self.sequence
+        Returns:
+            dict: tracked sources, capacity, evictions (capacity and expiry),
+                sequences, knocks and completed sequences
+        """
+        return {
+            'tracked_sources': len(self._sources),
+            'max_sources': self.max_sources,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'sequences': len(self.sequences),
+            'knocks': self.knocks,
+            'matches': self.matches,
+        }
+
+def _unpack_address(value: int) -> str:
+    """Format a packed 128-bit address (IPv4 as ::ffff:a.b.c.d) as a string"""
+    value = int(value)
+    if value >> 32 == IPV4_MAPPED_PREFIX >> 32:
+        return socket.inet_ntoa((value & 0xFFFFFFFF).to_bytes(4, 'big'))
+    return str(ipaddress.IPv6Address(value))
 
 class EnhancedSecurity:
-    def __init__(self, geoip_db_path: str = None):
+    # Longest sleep of the expiry thread, so wall clock changes are noticed
+    MAX_EXPIRY_WAIT = 60.0
+    # Block duration for sources over the rate limit (seconds)
+    RATE_LIMIT_BLOCK_SECONDS = 300
+
+    def __init__(self, geoip_db_path: str = None, geoip_precompile: bool = False, geoip_mode: str = 'mmap'):
         self.rate_limiter = RateLimiter()
-        self.geo_blocker = GeoIPBlocker(geoip_db_path)
+        self.geo_blocker = GeoIPBlocker(geoip_db_path, precompile=geoip_precompile, mode=geoip_mode)
         self.ip_reputation = IPReputationChecker()
         self.port_knocking = PortKnocking()
         self.blocked_ips: Dict[str, float] = {}  # IP -> unblock_time
         
+        # Min-heap of (unblock_time, ip); entries superseded by a later
+        # block or an unblock no longer match blocked_ips and are skipped
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._expiry_cond = threading.Condition()
+        self._expiry_thread: Optional[threading.Thread] = None
+        self._expiry_stop = False
+        self._unblock_callbacks: List[Callable[[List[str]], None]] = []
+        # Persists and enforces blocks created by the checks (see set_block_handler)
+        self._block_handler: Optional[Callable[[List[str], int], object]] = None
+        
     async def check_security(self, ip: str, port: int = None) -> SecurityAction:
         """Check all security measures for an IP"""
-        # Check if IP is temporarily blocked
-        if ip in self.blocked_ips:
-            if time.time() < self.blocked_ips[ip]:
-                return SecurityAction.BLOCK
-            del self.blocked_ips[ip]
+        # Check if IP is temporarily blocked (expired blocks are removed by the expiry thread)
+        blocked_until = self.blocked_ips.get(ip)
+        if blocked_until is not None and time.time() < blocked_until:
+            return SecurityAction.BLOCK
         
         # Check rate limiting
         if self.rate_limiter.is_rate_limited(ip):
-            self.blocked_ips[ip] = time.time() + 300  # Block for 5 minutes
+            self._block_sources([ip])
             return SecurityAction.RATE_LIMIT
             
         # Check GeoIP blocking
         if self.geo_blocker.is_country_blocked(ip):
             return SecurityAction.GEO_BLOCK
             
-        # Check IP reputation (async update if needed)
-        await self.ip_reputation.update_threat_feeds()
+        # Check IP reputation (feeds are refreshed in the background)
         if self.ip_reputation.is_malicious(ip):
             return SecurityAction.REPUTATION_BLOCK
             
@@ -224,10 +1022,204 @@ class EnhancedSecurity:
             
         return SecurityAction.ALLOW
 
+    def check_security_batch(self, ips, ports=None):
+        """
+        Check all security measures for a whole connection snapshot
+        
+        Connections are grouped by address, so the rate limiter, block list,
+        GeoIP and reputation checks run once per distinct address (the
+        rate limiter records every connection of the address in one
+        update). Threat feeds are not refreshed here; the current feed data
+        is used.
+        
+        Args:
+            ips: Sequence (or NumPy array) of addresses, as strings or 128-bit
+                integers with IPv4 as ::ffff:a.b.c.d (see
+                ConnectionSnapshot.remote_addresses)
+            ports: Optional sequence of destination ports, aligned with ips;
+                when given, the port knocking check applies as in check_security
+                
+        Returns:
+            Array of action codes (uint8, NumPy if available, else array('B'));
+            SECURITY_ACTIONS[code] is the SecurityAction of each connection
+        """
+        if np is not None and isinstance(ips, np.ndarray):
+            # Packed address columns: group with a sort instead of hashing
+            unique, inverse, counts = np.unique(ips, return_inverse=True, return_counts=True)
+            unique = unique.tolist()
+            counts = counts.tolist()
+        else:
+            positions: Dict[object, int] = {}
+            inverse = [positions.setdefault(ip, len(positions)) for ip in ips]
+            unique = list(positions)
+            counts = [0] * len(unique)
+            for index in inverse:
+                counts[index] += 1
+
+        now = time.time()
+        monotonic_now = time.monotonic()
+        allow = _ACTION_CODES[SecurityAction.ALLOW]
+        codes = [allow] * len(unique)
+        rate_limited: List[str] = []
+        for index, ip in enumerate(unique):
+            key = ip if isinstance(ip, str) else _unpack_address(ip)
+            blocked_until = self.blocked_ips.get(key)
+            if blocked_until is not None and now < blocked_until:
+                codes[index] = _ACTION_CODES[SecurityAction.BLOCK]
+                continue
+            if self.rate_limiter.is_rate_limited(key, now=monotonic_now, count=counts[index]):
+                rate_limited.append(key)
+                codes[index] = _ACTION_CODES[SecurityAction.RATE_LIMIT]
+            elif self.geo_blocker.is_country_blocked(key):
+                codes[index] = _ACTION_CODES[SecurityAction.GEO_BLOCK]
+            elif self.ip_reputation.is_malicious(key):
+                codes[index] = _ACTION_CODES[SecurityAction.REPUTATION_BLOCK]
+        if rate_limited:
+            self._block_sources(rate_limited)
+
+        if np is not None:
+            result = np.asarray(codes, dtype=np.uint8)[np.asarray(inverse, dtype=np.intp)]
+        else:
+            result = array('B', (codes[index] for index in inverse))
+
+        # Port knocking decides connections that passed every other check
+        if ports is not None:
+            block = _ACTION_CODES[SecurityAction.BLOCK]
+            for position, port in enumerate(ports):
+                if port and result[position] == allow:
+                    ip = unique[inverse[position]]
+                    key = ip if isinstance(ip, str) else _unpack_address(ip)
+                    if not self.port_knocking.add_knock(key, int(port)):
+                        result[position] = block
+        return result
+
+    def set_block_handler(self, handler: Optional[Callable[[List[str], int], object]]):
+        """
+        Route blocks created by the checks (rate limiting) through a handler
+        
+        Args:
+            handler: Function receiving (ips, duration in seconds) that blocks
+                the addresses, e.g. FirewallManager.block_ips so the blocks
+                are journaled and loaded into the kernel sets; None keeps
+                them in memory only
+        """
+        self._block_handler = handler
+
+    def _block_sources(self, ips: List[str]):
+        """Block sources over the rate limit for RATE_LIMIT_BLOCK_SECONDS"""
+        duration = self.RATE_LIMIT_BLOCK_SECONDS
+        if self._block_handler is not None:
+            try:
+                if self._block_handler(ips, duration) is not False:
+                    return
+            except Exception as e:
+                logger.error(f"Error in block handler: {e}")
+        # No handler, or it failed: at least block in memory
+        until = time.time() + duration
+        for ip in ips:
+            self.block_ip_until(ip, until)
+
     def block_ip(self, ip: str, duration: int = 3600):
         """Block an IP for the specified duration (in seconds)"""
-        self.blocked_ips[ip] = time.time() + duration
+        self.block_ip_until(ip, time.time() + duration)
+
+    def block_ip_until(self, ip: str, until: float):
+        """Block an IP until the given epoch time"""
+        with self._expiry_cond:
+            self.blocked_ips[ip] = until
+            heap = self._expiry_heap
+            heapq.heappush(heap, (until, ip))
+            if len(heap) > 2 * len(self.blocked_ips) + 64:
+                # Mostly superseded entries: rebuild from the live blocks
+                heap[:] = [(deadline, key) for key, deadline in self.blocked_ips.items()]
+                heapq.heapify(heap)
+            if heap[0] == (until, ip):
+                # New earliest expiry: wake the expiry thread to shorten its wait
+                self._expiry_cond.notify()
 
     def unblock_ip(self, ip: str):
         """Unblock an IP"""
-        self.blocked_ips.pop(ip, None)
\ No newline at end of file
+        with self._expiry_cond:
+            self.blocked_ips.pop(ip, None)
+
+    def get_blocked_ips(self) -> Dict[str, float]:
+        """Return a snapshot of the blocked IPs and their unblock times"""
+        with self._expiry_cond:
+            return dict(self.blocked_ips)
+
+    def register_unblock_callback(self, callback: Callable[[List[str]], None]):
+        """
+        Register a callback for expired blocks
+        
+        Args:
+            callback: Function receiving the list of IPs whose block expired;
+                called from the expiry thread
+        """
+        self._unblock_callbacks.append(callback)
+
+    def _next_expiry(self) -> Optional[float]:
+        """Drop superseded heap entries and return the earliest unblock time (lock held)"""
+        heap = self._expiry_heap
+        while heap and self.blocked_ips.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def expire_blocks(self, now: Optional[float] = None) -> List[str]:
+        """
+        Remove the blocks that are due and notify the unblock callbacks
+        
+        Args:
+            now: Current epoch time (defaults to time.time())
+            
+        Returns:
+            list: IPs whose block expired
+        """
+        now = time.time() if now is None else now
+        expired: List[str] = []
+        with self._expiry_cond:
+            heap = self._expiry_heap
+            while True:
+                deadline = self._next_expiry()
+                if deadline is None or deadline > now:
+                    break
+                _, ip = heapq.heappop(heap)
+                del self.blocked_ips[ip]
+                expired.append(ip)
+        if expired:
+            for callback in self._unblock_callbacks:
+                try:
+                    callback(expired)
+                except Exception as e:
+                    logger.error(f"Error in unblock callback: {e}")
+        return expired
+
+    def start_expiry(self):
+        """Start removing expired blocks on time in a background thread"""
+        with self._expiry_cond:
+            if self._expiry_thread is not None and self._expiry_thread.is_alive():
+                return
+            self._expiry_stop = False
+            self._expiry_thread = threading.Thread(target=self._expiry_loop, name="block-expiry", daemon=True)
+            self._expiry_thread.start()
+
+    def stop_expiry(self, timeout: float = 5.0):
+        """Stop the expiry thread"""
+        with self._expiry_cond:
+            self._expiry_stop = True
+            self._expiry_cond.notify()
+            thread, self._expiry_thread = self._expiry_thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def _expiry_loop(self):
+        while True:
+            with self._expiry_cond:
+                if self._expiry_stop:
+                    return
+                deadline = self._next_expiry()
+                # Sleep until the earliest expiry, or until a block is added
+                delay = None if deadline is None else deadline - time.time()
+                if delay is None or delay > 0:
+                    self._expiry_cond.wait(None if delay is None else min(delay, self.MAX_EXPIRY_WAIT))
+                    continue
+            self.expire_blocks()
\ No newline at end of file
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Tests for the pid -> process name cache of NetworkMonitor"""
+
+import os
+
+import pytest
+
+from firewall.script import network_monitor
+from firewall.script.network_monitor import ProcessNameCache
+
+pytestmark = pytest.mark.skipif(not os.path.isdir('/proc/self'), reason="needs /proc")
+
+
+@pytest.fixture
+def stat_reads(monkeypatch):
+    """Count the /proc/<pid>/stat reads made by the cache"""
+    reads = []
+    read_start_time = network_monitor._proc_start_time
+
+    def counting(pid):
+        reads.append(pid)
+        return read_start_time(pid)
+
+    monkeypatch.setattr(network_monitor, '_proc_start_time', counting)
+    return reads
+
+
+def test_start_time_checked_once_per_pid_per_tick(stat_reads):
+    cache = ProcessNameCache()
+    pid = os.getpid()
+
+    # First tick: the miss reads the start time around the process read,
+    # further sockets of the same pid reuse the entry without a stat read
+    name = cache.name(pid, now=1.0)
+    misses = len(stat_reads)
+    for _ in range(10):
+        assert cache.name(pid, now=1.0) == name
+    assert len(stat_reads) == misses
+
+    # Second tick: one check, then hits again
+    for _ in range(10):
+        assert cache.name(pid, now=2.0) == name
+    assert len(stat_reads) == misses + 1
+
+    stats = cache.get_stats()
+    assert stats['misses'] == 1
+    assert stats['hits'] == 20
+
+
+def test_reused_pid_is_read_again_on_next_tick(monkeypatch):
+    cache = ProcessNameCache()
+    pid = os.getpid()
+    cache.name(pid, now=1.0)
+
+    monkeypatch.setattr(network_monitor, '_proc_start_time', lambda pid: b'0')
+    cache.name(pid, now=2.0)
+
+    stats = cache.get_stats()
+    assert stats['invalidations'] == 1
+    assert stats['misses'] == 2